@@ -0,0 +1,5 @@
+"""
+ローカルに生成した合成ドキュメントサイトに対してクローラーの性能を計測するベンチマーク。
+
+実行例: python -m benchmarks.run --pages 100 1000 --variant static js --fetch-mode auto http
+"""
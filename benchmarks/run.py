@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+from src.crawler import DocsCrawler
+from src.extractor import ContentExtractor
+from src.fetcher import FETCH_MODES
+from src.frontier import Frontier
+from src.url_manager import UrlManager
+from .synthetic_site import VARIANTS, SyntheticSite, serve_site
+
+# RSS のサンプリング間隔（秒）
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+def percentile(values, q: float) -> Optional[float]:
+    """
+    最近傍順位法でパーセンタイルを求めます。値がなければ None。
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(values) -> dict:
+    """
+    レイテンシ（秒）の一覧を件数と p50 / p95（ミリ秒）にまとめます。
+    """
+    to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "count": len(values),
+        "p50_ms": to_ms(percentile(values, 50)),
+        "p95_ms": to_ms(percentile(values, 95)),
+    }
+
+
+def current_rss() -> int:
+    """
+    現在のプロセスの常駐メモリ量（バイト）を返します。/proc がない環境ではピーク値で代用します。
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return _maxrss_bytes(resource.RUSAGE_SELF)
+
+
+def _maxrss_bytes(who) -> int:
+    # ru_maxrss は Linux ではKB、macOS ではバイト単位
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+async def _run_with_rss_sampling(coro) -> int:
+    """
+    コルーチンを実行しながら RSS を定期的に計測し、そのピーク値を返します。
+    """
+    peak = current_rss()
+    done = asyncio.Event()
+
+    async def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, current_rss())
+            try:
+                await asyncio.wait_for(done.wait(), RSS_SAMPLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    sampler = asyncio.create_task(sample())
+    try:
+        await coro
+    finally:
+        done.set()
+        await sampler
+    return max(peak, current_rss())
+
+
+def bench_crawl(site: SyntheticSite, fetch_mode: str, concurrency: int, workers: Optional[int]) -> dict:
+    """
+    合成サイトを DocsCrawler でクロールし、スループット・ステージ別レイテンシ・メモリ・出力量を返します。
+    """
+    with tempfile.TemporaryDirectory() as tmpdir, serve_site(site) as start_url:
+        output_file = os.path.join(tmpdir, "bench.md")
+        crawler = DocsCrawler(
+            start_url,
+            output_file,
+            max_concurrent=concurrency,
+            # 開始ページ（目次）の分を含める
+            max_pages=site.pages + 1,
+            extraction_workers=workers,
+            fetch_mode=fetch_mode,
+            rate_limit=0,
+            use_sitemaps=False,
+            respect_robots=False,
+        )
+        crawler._log_summary = lambda: None
+
+        started = time.perf_counter()
+        peak_rss = asyncio.run(_run_with_rss_sampling(crawler.run()))
+        elapsed = time.perf_counter() - started
+
+        pages = len(crawler.url_manager.visited)
+        return {
+            "pages_crawled": pages,
+            "elapsed_sec": round(elapsed, 3),
+            "pages_per_sec": round(pages / elapsed, 2) if elapsed > 0 else None,
+            "output_bytes": os.path.getsize(output_file),
+            "peak_rss_bytes": peak_rss,
+            # 終了済みの子プロセス（抽出ワーカー）のうち最大のもの
+            "peak_child_rss_bytes": _maxrss_bytes(resource.RUSAGE_CHILDREN),
+            # 抽出は抽出ワーカー内での変換時間、submit は抽出キューが空くまでの待ち時間
+            "stages": crawler.metrics.report()["stages"],
+        }
+
+
+def bench_extract(site: SyntheticSite) -> dict:
+    """
+    ContentExtractor 単体の変換速度を計測します（ネットワークと並列化の影響を除いた値）。
+    """
+    extractor = ContentExtractor()
+    latencies = []
+    output_bytes = 0
+    started = time.perf_counter()
+    for path, html in site.iter_pages():
+        page_started = time.perf_counter()
+        markdown = extractor.extract(html, path)
+        latencies.append(time.perf_counter() - page_started)
+        output_bytes += len(markdown.encode("utf-8"))
+    elapsed = time.perf_counter() - started
+    return {
+        "pages": site.pages,
+        "elapsed_sec": round(elapsed, 3),
+        "pages_per_sec": round(site.pages / elapsed, 2) if elapsed > 0 else None,
+        "output_bytes": output_bytes,
+        "latency": summarize_latencies(latencies),
+    }
+
+
+def synthetic_hrefs(base: str, urls: int) -> Iterator[str]:
+    """
+    urls 件の異なるページへのリンクを、正規化で同一視される表記揺れ
+    （フラグメント・トラッキング用パラメータ）付きで1件につき3通り返します。
+    """
+    for i in range(urls):
+        url = f"{base}{SyntheticSite.path_for(i)}"
+        yield url
+        yield f"{url}#section-{i % 7}"
+        yield f"{url}?utm_source=bench&utm_medium=link-{i % 5}"
+
+
+def _fill_frontier(hrefs, base: str):
+    manager = UrlManager(f"{base}/docs/", max_pages=len(hrefs))
+    frontier = Frontier(f"{base}/docs/")
+    for href in hrefs:
+        canonical = manager.canonicalize(href)
+        if canonical is not None and manager.add_discovered(canonical):
+            frontier.push(canonical)
+    return manager, frontier
+
+
+def _fill_baseline(hrefs):
+    # 以前の実装: フラグメントのみ除去し、URLの文字列を集合と (優先度, 投入順, URL) のキューで保持する
+    discovered = set()
+    queue = []
+    seq = itertools.count()
+    for href in hrefs:
+        normalized = urlparse(href)._replace(fragment="").geturl()
+        if normalized not in discovered:
+            discovered.add(normalized)
+            heapq.heappush(queue, (0.0, next(seq), normalized))
+    return discovered, queue
+
+
+def bench_frontier(urls: int) -> dict:
+    """
+    URLの正規化・発見済み判定（checks/sec）と、URL1件あたりのメモリ量を計測します。
+    メモリ量はフロンティアに積んだ時点と、全URLを取り出して訪問済みにした時点（クロール完了後）の2つです。
+    比較のため、URLの文字列をそのまま保持する以前の実装での値も計測します。
+    """
+    base = "https://docs.example.com"
+    hrefs = list(synthetic_hrefs(base, urls))
+
+    started = time.perf_counter()
+    manager, frontier = _fill_frontier(hrefs, base)
+    elapsed = time.perf_counter() - started
+    del manager, frontier
+
+    started = time.perf_counter()
+    discovered, queue = _fill_baseline(hrefs)
+    baseline_elapsed = time.perf_counter() - started
+    del discovered, queue
+
+    tracemalloc.start()
+    try:
+        manager, frontier = _fill_frontier(hrefs, base)
+        unique = len(frontier)
+        # 正規化結果のキャッシュは件数に上限があり、URL数に比例しないため除く
+        manager.cache.clear()
+        frontier_bytes = tracemalloc.get_traced_memory()[0]
+        while not frontier.empty():
+            manager.mark_visited(frontier.pop())
+        visited_bytes = tracemalloc.get_traced_memory()[0]
+        del manager, frontier
+
+        tracemalloc.clear_traces()
+        discovered, queue = _fill_baseline(hrefs)
+        baseline_unique = len(discovered)
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "hrefs": len(hrefs),
+        "unique_urls": unique,
+        "checks_per_sec": round(len(hrefs) / elapsed, 1) if elapsed > 0 else None,
+        "bytes_per_url": round(frontier_bytes / unique, 1),
+        "visited_bytes_per_url": round(visited_bytes / unique, 1),
+        "baseline": {
+            "unique_urls": baseline_unique,
+            "checks_per_sec": round(len(hrefs) / baseline_elapsed, 1) if baseline_elapsed > 0 else None,
+            "bytes_per_url": round(baseline_bytes / baseline_unique, 1),
+        },
+    }
+
+
+# ディスパッチのベンチマークで、実行中のタスク数を数える間隔（ページ数）
+TASK_SAMPLE_EVERY = 64
+
+
+async def _baseline_dispatch(crawler, crawl, max_concurrent: int):
+    # 以前の実装: フロンティアのURLごとにタスクを作り、セマフォで同時実行数だけを制限する
+    semaphore = asyncio.Semaphore(max_concurrent)
+    tasks = set()
+    created = 0
+
+    async def fetch(url):
+        async with semaphore:
+            # ページ数の上限と取得済みの判定は、タスクが実行枠を得てから行う
+            if not crawler.url_manager.can_crawl(url):
+                return
+            crawler.url_manager.mark_visited(url)
+            await crawl(url)
+
+    while True:
+        while True:
+            url = await crawler.frontier_backend.lease()
+            if url is None:
+                break
+            tasks.add(asyncio.create_task(fetch(url)))
+            created += 1
+        if not tasks:
+            break
+        _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    return created
+
+
+def bench_dispatch(urls: int, concurrency: int, max_pages: Optional[int] = None) -> dict:
+    """
+    urls 件のURLを積んだフロンティアを、取得・抽出を省いたページ処理で空にするまでの
+    スケジューラーのオーバーヘッド（1ページあたりの時間）と、同時に存在したタスク数を計測します。
+    max_pages がフロンティアより少ない場合は、上限に達してから終了するまでの後始末も含みます。
+    比較のため、URLごとにタスクを作る以前の実装での値も計測します。
+    """
+    base = "https://docs.example.com"
+    max_pages = urls if max_pages is None else max_pages
+
+    def run(dispatch) -> dict:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            crawler = DocsCrawler(f"{base}/docs/", os.path.join(tmpdir, "bench.md"),
+                                  max_concurrent=concurrency, max_pages=max_pages, extraction_workers=0,
+                                  rate_limit=0, use_sitemaps=False, respect_robots=False, print_summary=False)
+            crawler.frontier.push_many([f"{base}{SyntheticSite.path_for(i)}" for i in range(urls)])
+            crawled = 0
+            peak_tasks = 0
+
+            async def crawl(url, retry=False, reserved=False):
+                nonlocal crawled, peak_tasks
+                crawled += 1
+                if crawled % TASK_SAMPLE_EVERY == 1:
+                    peak_tasks = max(peak_tasks, len(asyncio.all_tasks()))
+                # 取得の代わりにイベントループへ1度制御を戻す
+                await asyncio.sleep(0)
+                await crawler.frontier_backend.complete(url)
+
+            async def main():
+                started = time.perf_counter()
+                created = await dispatch(crawler, crawl)
+                return time.perf_counter() - started, created
+
+            elapsed, created = asyncio.run(main())
+            crawler.journal.close()
+            return {
+                "pages_crawled": crawled,
+                "elapsed_sec": round(elapsed, 3),
+                "us_per_page": round(elapsed / crawled * 1e6, 1) if crawled else None,
+                # イベントループ上のタスク数（計測しているタスク自身を含む）
+                "peak_tasks": peak_tasks,
+                "tasks_created": created,
+            }
+
+    async def dispatch(crawler, crawl):
+        crawler.crawl_page = crawl
+        await crawler.process_queue()
+        return crawler.dispatcher.workers
+
+    return {
+        "urls": urls,
+        "max_pages": max_pages,
+        "concurrency": concurrency,
+        **run(dispatch),
+        "baseline": run(lambda crawler, crawl: _baseline_dispatch(crawler, crawl, concurrency)),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Docs2Notebook Crawler ベンチマーク")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100],
+                        help="合成サイトのページ数（複数指定可） [デフォルト: 100]")
+    parser.add_argument("--variant", choices=VARIANTS, nargs="+", default=["static"],
+                        help="static: サーバーサイド描画、js: JavaScriptで描画 [デフォルト: static]")
+    parser.add_argument("--fetch-mode", choices=FETCH_MODES, nargs="+", default=["auto"],
+                        help="計測する取得方式（複数指定可） [デフォルト: auto]")
+    parser.add_argument("--concurrency", type=int, default=5, help="並列リクエスト数の上限 [デフォルト: 5]")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="抽出ワーカープロセス数（0でイベントループ上で抽出） [デフォルト: CPUコア数]")
+    parser.add_argument("--fan-out", type=int, default=8, help="1ページあたりのリンク数 [デフォルト: 8]")
+    parser.add_argument("--code-blocks", type=int, default=3, help="1ページあたりのコードブロック数 [デフォルト: 3]")
+    parser.add_argument("--table-rows", type=int, default=10, help="1ページあたりの表の行数 [デフォルト: 10]")
+    parser.add_argument("--seed", type=int, default=0, help="ページ内容を生成する乱数のシード [デフォルト: 0]")
+    parser.add_argument("--skip-extract", action="store_true", help="抽出単体のベンチマークを省略します")
+    parser.add_argument("--frontier-urls", type=int, default=100000,
+                        help="URLの正規化とフロンティアのベンチマークで扱うURL数（0で省略） [デフォルト: 100000]")
+    parser.add_argument("--dispatch-urls", type=int, default=10000,
+                        help="ディスパッチのベンチマークでフロンティアに積むURL数（0で省略） [デフォルト: 10000]")
+    parser.add_argument("--output", help="結果のJSONを書き出すファイル（省略時は標準出力）")
+    parser.add_argument("--verbose", action="store_true", help="クローラーのログを表示します")
+    return parser.parse_args(argv)
+
+
+def run_benchmarks(args) -> dict:
+    """
+    指定された全ての組み合わせでベンチマークを実行し、結果をまとめて返します。
+    """
+    results = {"runs": [], "extract": []}
+    if args.frontier_urls:
+        results["frontier"] = bench_frontier(args.frontier_urls)
+        print(f"frontier urls={args.frontier_urls}: {results['frontier']['checks_per_sec']} checks/sec, "
+              f"{results['frontier']['bytes_per_url']} bytes/url", file=sys.stderr)
+    if args.dispatch_urls:
+        # ページ数の上限をフロンティアの半分にして、上限に達した後の後始末も計測する
+        results["dispatch"] = bench_dispatch(args.dispatch_urls, args.concurrency, args.dispatch_urls // 2)
+        print(f"dispatch urls={args.dispatch_urls}: {results['dispatch']['us_per_page']} us/page, "
+              f"peak {results['dispatch']['peak_tasks']} tasks "
+              f"(baseline {results['dispatch']['baseline']['peak_tasks']} tasks)", file=sys.stderr)
+    for pages in args.pages:
+        site_options = dict(pages=pages, fan_out=args.fan_out, code_blocks=args.code_blocks,
+                            table_rows=args.table_rows, seed=args.seed)
+        if not args.skip_extract:
+            extract = bench_extract(SyntheticSite(**site_options))
+            results["extract"].append(extract)
+            print(f"extract pages={pages}: {extract['pages_per_sec']} pages/sec", file=sys.stderr)
+
+        for variant in args.variant:
+            for fetch_mode in args.fetch_mode:
+                scenario = {"pages": pages, "variant": variant, "fetch_mode": fetch_mode,
+                            "concurrency": args.concurrency, "workers": args.workers,
+                            "fan_out": args.fan_out}
+                if variant == "js" and fetch_mode == "http":
+                    # HTTPのみでは本文が描画されないため計測の意味がない
+                    print("skip: variant=js は fetch_mode=http では描画できません", file=sys.stderr)
+                    continue
+                crawl = bench_crawl(SyntheticSite(variant=variant, **site_options), fetch_mode,
+                                    args.concurrency, args.workers)
+                results["runs"].append({"scenario": scenario, "crawl": crawl})
+                print(f"crawl pages={pages} variant={variant} fetch_mode={fetch_mode}: "
+                      f"{crawl['pages_per_sec']} pages/sec", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        # クローラーのページ単位のログを抑制する
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith("src"):
+                logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = run_benchmarks(args)
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
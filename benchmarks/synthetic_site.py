@@ -0,0 +1,155 @@
+import contextlib
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+VARIANTS = ("static", "js")
+
+WORDS = (
+    "crawler", "browser", "request", "response", "context", "session", "document", "module",
+    "parameter", "option", "network", "latency", "throughput", "cache", "worker", "queue",
+    "ドキュメント", "ページ", "設定", "処理", "変換", "取得", "出力", "検索",
+)
+
+
+class SyntheticSite:
+    """
+    指定ページ数の合成ドキュメントサイト。
+
+    各ページは見出し・段落・コードブロック・表を含み、fan_out 本の他ページへのリンクと
+    次のページへのリンクを持ちます（全ページが開始URLから到達可能）。
+    ページ内容は seed とページ番号から決定的に生成されるため、メモリには保持しません。
+    variant="js" の場合は、本文をJavaScriptで描画する空のHTML（SPAの殻）を返します。
+    """
+    def __init__(self, pages: int, fan_out: int = 8, code_blocks: int = 3, table_rows: int = 10,
+                 paragraphs: int = 6, variant: str = "static", seed: int = 0):
+        if variant not in VARIANTS:
+            raise ValueError(f"未対応のバリアントです: {variant}")
+        self.pages = pages
+        self.fan_out = fan_out
+        self.code_blocks = code_blocks
+        self.table_rows = table_rows
+        self.paragraphs = paragraphs
+        self.variant = variant
+        self.seed = seed
+
+    @staticmethod
+    def path_for(index: int) -> str:
+        return f"/docs/section-{index // 100}/page-{index}"
+
+    def index_for(self, path: str) -> Optional[int]:
+        """
+        パスに対応するページ番号を返します。存在しないページの場合は None。
+        """
+        if path in ("/docs/", "/docs"):
+            return -1
+        prefix, _, tail = path.rpartition("/page-")
+        if not tail.isdigit() or not prefix.startswith("/docs/section-"):
+            return None
+        index = int(tail)
+        if index >= self.pages or self.path_for(index) != path:
+            return None
+        return index
+
+    def render(self, path: str) -> Optional[str]:
+        """
+        パスに対応するページのHTMLを返します。存在しない場合は None。
+        """
+        index = self.index_for(path)
+        if index is None:
+            return None
+        main = self._render_index() if index < 0 else self._render_page(index)
+        nav = '<nav><a href="/docs/">Home</a></nav>'
+        if self.variant == "static":
+            body = f"{nav}<main>{main}</main><footer>synthetic docs</footer>"
+        else:
+            body = ('<div id="root"></div><script>'
+                    f'document.getElementById("root").innerHTML = {json.dumps(nav + "<main>" + main + "</main>")};'
+                    '</script>')
+        return f"<!DOCTYPE html><html><head><title>Synthetic Docs</title></head><body>{body}</body></html>"
+
+    def _render_index(self) -> str:
+        links = "".join(f'<li><a href="{self.path_for(i)}">Page {i}</a></li>'
+                        for i in range(min(self.pages, max(self.fan_out, 1))))
+        intro = "ベンチマーク用に生成された合成ドキュメントサイトです。各ページには見出し・段落・コードブロック・表が含まれます。" * 3
+        return f"<h1>Synthetic Docs</h1><p>{intro}</p><ul>{links}</ul>"
+
+    def _render_page(self, index: int) -> str:
+        rng = random.Random(self.seed * 1_000_003 + index)
+        sentence = lambda n: " ".join(rng.choice(WORDS) for _ in range(n)) + "."
+        parts = [f"<h1>Page {index}</h1>"]
+
+        for p in range(self.paragraphs):
+            if p % 2 == 0:
+                parts.append(f"<h2>Section {index}.{p}</h2>")
+            parts.append(f"<p>{sentence(rng.randint(20, 60))}</p>")
+
+        for b in range(self.code_blocks):
+            lines = "\n".join(
+                f'<span class="line-number">{n + 1}</span>value_{b}_{n} = compute("{rng.choice(WORDS)}", {n})'
+                for n in range(rng.randint(10, 40))
+            )
+            parts.append(f'<pre><code class="language-python">{lines}</code></pre>')
+
+        if self.table_rows:
+            rows = "".join(
+                f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(0, 9999)}</td><td>{sentence(6)}</td></tr>"
+                for _ in range(self.table_rows)
+            )
+            parts.append(f"<table><thead><tr><th>Name</th><th>Value</th><th>Description</th></tr></thead>"
+                         f"<tbody>{rows}</tbody></table>")
+
+        targets = {index + 1} if index + 1 < self.pages else set()
+        for _ in range(self.fan_out):
+            targets.add(rng.randrange(self.pages))
+        links = "".join(f'<li><a href="{self.path_for(t)}">Page {t}</a></li>' for t in sorted(targets))
+        parts.append(f"<h2>Related</h2><ul>{links}</ul>")
+        return "".join(parts)
+
+    def iter_pages(self) -> Iterator[tuple]:
+        """
+        (URLパス, HTML) を全ページ分返します（抽出のみのベンチマーク用）。
+        """
+        for index in range(self.pages):
+            path = self.path_for(index)
+            yield path, self.render(path)
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        html = self.server.site.render(self.path)
+        if html is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_site(site: SyntheticSite) -> Iterator[str]:
+    """
+    合成サイトをローカルのHTTPサーバーで配信し、そのベースURL（開始URL）を返します。
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+    server.daemon_threads = True
+    server.site = site
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/docs/"
+    finally:
+        server.shutdown()
+        server.server_close()
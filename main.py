@@ -1,23 +1,395 @@
+import argparse
 import asyncio
 import logging
 import signal
 import sys
 from pathlib import Path
 from urllib.parse import urlparse
+from src.batch import BatchRunner, load_manifest
+from src.canonicalizer import TRACKING_PARAMS, TRAILING_SLASH_MODES, CanonicalRules
 from src.crawler import DocsCrawler
+from src.dedup import DEDUP_MODES
+from src.extractor import ExtractionRules
+from src.fetcher import FETCH_MODES
+from src.frontier import FRONTIER_ORDERS
+from src.frontier_backend import DEFAULT_LEASE_TIMEOUT, create_frontier_backend, default_worker_id
+from src.merge import merge_outputs
+from src.output_writer import OUTPUT_ORDERS
+from src.resource_policy import DEFAULT_ALLOWED_TYPES, DEFAULT_DENIED_DOMAINS, ResourcePolicy
+from src.retry_policy import RetryPolicy
 from src.logger import setup_logger
 
 # ロガーのセットアップ
 logger = setup_logger()
 
 def signal_handler(sig, frame):
-    print("\n中断されました。終了します。")
+    print("\n中断されました。終了します。（--resume を付けて再実行すると続きから再開できます）")
     sys.exit(0)
 
-# SIGTSTP (Ctrl+Z) をハンドルして終了させる
+# SIGTSTP (Ctrl+Z) をハンドルして終了させる（クロール中は run_interruptible() が取り消しに置き換える）
 signal.signal(signal.SIGTSTP, signal_handler)
 
+async def run_interruptible(coroutine):
+    """
+    コルーチンを実行し、SIGTSTP (Ctrl+Z) を受け取った場合はタスクを取り消して止めます。
+    シグナルハンドラーの中で終了すると、ジャーナルのバッファなどを書き込む finally 節が実行されないためです。
+    取り消された場合は asyncio.CancelledError を送出します。
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(coroutine)
+    loop.add_signal_handler(signal.SIGTSTP, task.cancel)
+    try:
+        return await task
+    finally:
+        loop.remove_signal_handler(signal.SIGTSTP)
+
+def parse_args():
+    """
+    対話入力では設定しない高度なオプションをコマンドライン引数から読み取ります。
+    """
+    parser = argparse.ArgumentParser(description="Docs2Notebook Crawler")
+    parser.add_argument(
+        "--fetch-mode",
+        choices=FETCH_MODES,
+        default="auto",
+        help="ページ取得方式 (auto: HTTP優先でJSが必要な場合のみブラウザ / http: HTTPのみ / browser: 常にブラウザ)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="ページキャッシュの保存先。指定すると再実行時に変更のないページの描画と抽出を省略します",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=512,
+        help="ページキャッシュの最大サイズ (MB)。超えた分は古いものから削除します [デフォルト: 512]",
+    )
+    parser.add_argument(
+        "--resource-types",
+        default=",".join(DEFAULT_ALLOWED_TYPES),
+        help="ブラウザ描画時に読み込むリソースタイプ (カンマ区切り、all で無制限) "
+             f"[デフォルト: {','.join(DEFAULT_ALLOWED_TYPES)}]",
+    )
+    parser.add_argument(
+        "--allow-domains",
+        default="",
+        help="ブラウザ描画時にリクエストを許可するドメイン (カンマ区切り)。指定すると対象サイトとこれら以外のドメインを遮断します",
+    )
+    parser.add_argument(
+        "--block-domains",
+        default="",
+        help="既定のトラッカー一覧に加えて遮断するドメイン (カンマ区切り)",
+    )
+    parser.add_argument(
+        "--ready-selector",
+        default=None,
+        help="ブラウザ描画時に、この CSS セレクタの要素が現れた時点で描画完了とみなします "
+             "(未指定の場合は本文のテキスト量が変化しなくなるまで待機)",
+    )
+    parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=10.0,
+        help="描画完了を待つ最大秒数 [デフォルト: 10]",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=2.0,
+        help="同一ホストへの1秒あたりの最大リクエスト数 (0で無制限) [デフォルト: 2]",
+    )
+    parser.add_argument(
+        "--rate-burst",
+        type=int,
+        default=1,
+        help="同一ホストへ連続して送れるリクエスト数の上限 (トークンバケットの容量) [デフォルト: 1]",
+    )
+    parser.add_argument(
+        "--browsers",
+        type=int,
+        default=1,
+        help="起動するブラウザプロセス数。複数にすると1つがクラッシュしても他のプロセスで処理を続けます [デフォルト: 1]",
+    )
+    parser.add_argument(
+        "--context-max-pages",
+        type=int,
+        default=100,
+        help="ブラウザコンテキストを作り直すまでに処理するページ数 [デフォルト: 100]",
+    )
+    parser.add_argument(
+        "--context-memory-mb",
+        type=int,
+        default=512,
+        help="ページのJSヒープがこの値 (MB) を超えたらコンテキストを作り直します (0で無効) [デフォルト: 512]",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=2,
+        help="タイムアウトや一時的なエラー (5xx・接続エラー) で失敗したページを再試行する回数。間隔は指数的に延ばします [デフォルト: 2]",
+    )
+    parser.add_argument(
+        "--page-timeout",
+        type=float,
+        default=30.0,
+        help="ページの読み込みのタイムアウト (秒) の初期値。ホストごとに読み込み時間のp95から調整します [デフォルト: 30]",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=5,
+        help="失敗がこの回数続いたホストへのリクエストを一時的に止めます (0で無効) [デフォルト: 5]",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=30.0,
+        help="失敗が続いたホストへのリクエストを止める秒数 (続けて止めるたびに2倍) [デフォルト: 30]",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        default=None,
+        help="処理中のページ (取得から抽出まで) が保持するHTMLの合計がこの値 (MB) を超えている間は、新しいページの取得を始めません",
+    )
+    parser.add_argument(
+        "--rss-limit-mb",
+        type=float,
+        default=None,
+        help="このプロセスのRSSがこの値 (MB) を超えている間は、新しいページの取得を始めません (Linuxのみ)",
+    )
+    parser.add_argument(
+        "--max-page-mb",
+        type=float,
+        default=None,
+        help="1ページのHTMLの上限 (MB)。超えたページは以降を省略した目印を入れて切り詰めます (ブラウザではシリアライズ前に縮めます)",
+    )
+    parser.add_argument(
+        "--no-sitemap",
+        action="store_true",
+        help="robots.txt とサイトマップ (sitemap.xml) からURLを事前に収集しません",
+    )
+    parser.add_argument(
+        "--ignore-robots",
+        action="store_true",
+        help="robots.txt の Disallow / Crawl-delay を無視します",
+    )
+    parser.add_argument(
+        "--drop-params",
+        default="",
+        help="URLから除去するクエリパラメータ (カンマ区切り、* でワイルドカード)。"
+             f"既定のトラッキング用パラメータ ({','.join(TRACKING_PARAMS)}) に追加されます",
+    )
+    parser.add_argument(
+        "--keep-params",
+        default=None,
+        help="URLに残すクエリパラメータ (カンマ区切り)。指定するとそれ以外のパラメータは全て除去します",
+    )
+    parser.add_argument(
+        "--trailing-slash",
+        choices=TRAILING_SLASH_MODES,
+        default="keep",
+        help="URLの末尾のスラッシュの扱い。keep: そのまま、strip: 除く、add: 拡張子のないパスに付ける [デフォルト: keep]",
+    )
+    parser.add_argument(
+        "--strip-index",
+        action="store_true",
+        help="URLの末尾の index.html / index.htm を除き、ディレクトリのURLと同一視します",
+    )
+    parser.add_argument(
+        "--lowercase-path",
+        action="store_true",
+        help="URLのパスを小文字に揃えます (大文字小文字を区別しないサーバー向け)",
+    )
+    parser.add_argument(
+        "--ignore-canonical",
+        action="store_true",
+        help="ページ内の <link rel=\"canonical\"> による正規URLの指定を無視します",
+    )
+    parser.add_argument(
+        "--html-parser",
+        choices=("auto", "lxml", "html.parser"),
+        default="auto",
+        help="本文抽出に使うHTMLパーサー。auto: lxml がインストールされていれば lxml、なければ html.parser [デフォルト: auto]",
+    )
+    parser.add_argument(
+        "--noise-tags",
+        default="",
+        help="本文から除去するタグ (カンマ区切り)。既定の script,style,nav,footer,iframe,noscript に追加されます",
+    )
+    parser.add_argument(
+        "--frontier-order",
+        choices=FRONTIER_ORDERS,
+        default="fifo",
+        help="クロールする順序。fifo: 発見順、depth: URLの階層が浅い順、path: URLのパス順 [デフォルト: fifo]",
+    )
+    parser.add_argument(
+        "--frontier-backend",
+        default="memory",
+        help="クロール待ちURLと取得ページ数の管理先。memory: このプロセス内のみ、sqlite:<パス>: 同じマシンの複数プロセスで共有、"
+             "redis://<ホスト>:<ポート>/<DB>[#<名前空間>]: 複数のマシンで共有 (redis パッケージが必要) [デフォルト: memory]",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=None,
+        help="共有フロンティアでのこのワーカーの名前。出力ファイル名にも付きます [デフォルト: <ホスト名>-<プロセスID>]",
+    )
+    parser.add_argument(
+        "--lease-timeout",
+        type=float,
+        default=DEFAULT_LEASE_TIMEOUT,
+        help=f"共有フロンティアで借りたURLの完了報告がこの秒数を過ぎても届かなければ、他のワーカーに回します [デフォルト: {DEFAULT_LEASE_TIMEOUT:.0f}]",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="FILE",
+        default=None,
+        help="複数のワーカーの出力ファイルを1つにまとめます。最初に出力先、続けてまとめる出力ファイルを指定します "
+             "(例: --merge all.md docs.worker-a.md docs.worker-b.md)",
+    )
+    parser.add_argument(
+        "--output-order",
+        choices=OUTPUT_ORDERS,
+        default="discovery",
+        help="出力ファイル内のページの順序。discovery: 開始URLからの幅優先順、path: URLのパス階層順 [デフォルト: discovery]",
+    )
+    parser.add_argument(
+        "--output-buffer-mb",
+        type=int,
+        default=16,
+        help="順番待ちのページをメモリに保持する上限 (MB)。超えた分は一時ファイルに退避します [デフォルト: 16]",
+    )
+    parser.add_argument(
+        "--toc",
+        action="store_true",
+        help="出力ファイルの末尾に目次 (各ページの見出しとURL) を追加します",
+    )
+    parser.add_argument(
+        "--shard-max-mb",
+        type=float,
+        default=None,
+        help="出力ファイル1つあたりの上限サイズ (MB)。超えると name_001.md, name_002.md ... に分割します (ページの途中では分割しません)",
+    )
+    parser.add_argument(
+        "--shard-max-words",
+        type=int,
+        default=None,
+        help="出力ファイル1つあたりの上限単語数 (空白区切り)。超えると次のファイルに分割します",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="near",
+        help="本文が重複するページを出力しない判定方式。near: 完全一致に加えて SimHash で類似ページも判定、"
+             "exact: 完全一致のみ、off: 判定しない [デフォルト: near]",
+    )
+    parser.add_argument(
+        "--dedup-prune-links",
+        action="store_true",
+        help="重複と判定されたページ内のリンクをたどりません",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="クロール中のメトリクスを http://127.0.0.1:<PORT>/metrics (Prometheus形式) で公開します",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="MANIFEST",
+        default=None,
+        help="マニフェスト (.toml / .yaml) に書かれた複数のサイトを対話入力なしでまとめてクロールします。"
+             "このとき他のオプションは使われません",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="出力ファイルと同じ場所のジャーナルから、中断したクロールを続きから再開します",
+    )
+    return parser.parse_args()
+
+def _split_csv(value: str) -> list:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+def build_resource_policy(args, target_url: str) -> ResourcePolicy:
+    """
+    コマンドライン引数からリソース制御ポリシーを組み立てます。
+    """
+    allowed_types = None if args.resource_types.strip() == "all" else _split_csv(args.resource_types)
+    allow_domains = _split_csv(args.allow_domains)
+    if allow_domains:
+        # 対象サイト自身のドメインは常に許可する
+        allow_domains.append(urlparse(target_url).hostname or "")
+    deny_domains = list(DEFAULT_DENIED_DOMAINS) + _split_csv(args.block_domains)
+    return ResourcePolicy(allowed_types=allowed_types, allow_domains=allow_domains, deny_domains=deny_domains)
+
+def build_canonical_rules(args) -> CanonicalRules:
+    """
+    コマンドライン引数からURLの正規化ルールを組み立てます。
+    """
+    keep_params = tuple(_split_csv(args.keep_params)) if args.keep_params is not None else None
+    return CanonicalRules(
+        drop_params=TRACKING_PARAMS + tuple(_split_csv(args.drop_params)),
+        keep_params=keep_params,
+        trailing_slash=args.trailing_slash,
+        strip_index=args.strip_index,
+        lowercase_path=args.lowercase_path,
+        honor_canonical_link=not args.ignore_canonical,
+    )
+
+def build_extraction_rules(args) -> ExtractionRules:
+    """
+    コマンドライン引数から本文抽出のルールを組み立てます。
+    """
+    defaults = ExtractionRules()
+    return ExtractionRules(
+        noise_tags=defaults.noise_tags + tuple(_split_csv(args.noise_tags)),
+        parser=None if args.html_parser == "auto" else args.html_parser,
+    )
+
+def run_batch(manifest_path: str):
+    """
+    マニフェストに書かれた全サイトを、共有のブラウザプールで並行してクロールします。
+    """
+    try:
+        manifest = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        logger.error(f"マニフェストを読み込めませんでした: {e}")
+        sys.exit(1)
+    runner = BatchRunner(manifest)
+    try:
+        report = asyncio.run(run_interruptible(runner.run()))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n中断されました。終了します。（各サイトに resume = true を設定して再実行すると続きから再開できます）")
+        sys.exit(130)
+    runner.print_summary(report)
+    if report["sites_failed"]:
+        sys.exit(1)
+
+def run_merge(files: list):
+    """
+    複数のワーカーの出力ファイルを1つにまとめます。
+    """
+    if len(files) < 2:
+        logger.error("--merge には出力先と、まとめる出力ファイルを1つ以上指定してください")
+        sys.exit(1)
+    try:
+        pages = merge_outputs(files[1:], files[0])
+    except (OSError, ValueError) as e:
+        logger.error(f"出力ファイルをまとめられませんでした: {e}")
+        sys.exit(1)
+    print(f"{pages} ページを {files[0]} にまとめました。")
+
 def main():
+    args = parse_args()
+    if args.merge:
+        run_merge(args.merge)
+        return
+    if args.batch:
+        run_batch(args.batch)
+        return
     try:
         print("=== 📝 Docs2Notebook Crawler 設定 ===")
         print("各項目を設定してください（Enterでデフォルト値を使用）")
@@ -88,6 +460,11 @@ def main():
                 output_filename = "merged_docs.md"
         except Exception:
             output_filename = "merged_docs.md"
+        worker_id = None
+        if args.frontier_backend != "memory":
+            # 同じ出力先を使う他のワーカーと出力ファイルが衝突しないよう、ワーカー名を付ける
+            worker_id = args.worker_id or default_worker_id()
+            output_filename = f"{Path(output_filename).stem}.{worker_id}.md"
         output_file_path = output_dir / output_filename
         
         # 設定確認表示
@@ -97,22 +474,76 @@ def main():
         print(f"  出力先     : {output_file_path}")
         print(f"  最大ページ : {max_pages}")
         print(f"  並列数     : {concurrency}")
+        print(f"  取得モード : {args.fetch_mode}")
+        if args.cache_dir:
+            print(f"  キャッシュ : {args.cache_dir}")
+        if args.resume:
+            print("  再開モード : 有効")
+        if worker_id:
+            print(f"  フロンティア: {args.frontier_backend} (ワーカー: {worker_id})")
+        limits = [f"{label} {value:g} MB" for label, value in (
+            ("処理中HTML", args.memory_budget_mb), ("RSS", args.rss_limit_mb), ("1ページ", args.max_page_mb)) if value]
+        if limits:
+            print(f"  メモリ上限 : {' / '.join(limits)}")
         print("="*30 + "\n")
 
+        # ブラウザ描画時のリソース制御
+        resource_policy = build_resource_policy(args, target_url)
+
         # クローラーの初期化
+        frontier_backend = create_frontier_backend(
+            args.frontier_backend,
+            max_pages=max_pages,
+            order=args.frontier_order,
+            lease_timeout=args.lease_timeout,
+            worker_id=worker_id,
+        )
         crawler = DocsCrawler(
             start_url=target_url, 
             output_file=str(output_file_path), 
             max_concurrent=concurrency,
-            max_pages=max_pages
+            max_pages=max_pages,
+            fetch_mode=args.fetch_mode,
+            cache_dir=args.cache_dir,
+            cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+            resume=args.resume,
+            resource_policy=resource_policy,
+            ready_selector=args.ready_selector,
+            ready_timeout=args.ready_timeout,
+            rate_limit=args.rate_limit,
+            rate_burst=args.rate_burst,
+            browser_processes=args.browsers,
+            context_max_pages=args.context_max_pages,
+            context_memory_limit_mb=args.context_memory_mb or None,
+            use_sitemaps=not args.no_sitemap,
+            respect_robots=not args.ignore_robots,
+            metrics_port=args.metrics_port,
+            output_order=args.output_order,
+            output_buffer_bytes=args.output_buffer_mb * 1024 * 1024,
+            output_toc=args.toc,
+            shard_max_bytes=int(args.shard_max_mb * 1024 * 1024) if args.shard_max_mb else None,
+            shard_max_words=args.shard_max_words,
+            memory_budget_bytes=int(args.memory_budget_mb * 1024 * 1024) if args.memory_budget_mb else None,
+            rss_limit_bytes=int(args.rss_limit_mb * 1024 * 1024) if args.rss_limit_mb else None,
+            max_page_bytes=int(args.max_page_mb * 1024 * 1024) if args.max_page_mb else None,
+            retry_policy=RetryPolicy(max_attempts=max(0, args.max_retries) + 1),
+            page_timeout=args.page_timeout,
+            breaker_threshold=args.breaker_threshold,
+            breaker_cooldown=args.breaker_cooldown,
+            dedup=args.dedup,
+            dedup_prune_links=args.dedup_prune_links,
+            canonical_rules=build_canonical_rules(args),
+            frontier_order=args.frontier_order,
+            extraction_rules=build_extraction_rules(args),
+            frontier_backend=frontier_backend,
         )
         
         # 実行
-        asyncio.run(crawler.run())
+        asyncio.run(run_interruptible(crawler.run()))
         
         print("🎉 完了しました！")
-    except (KeyboardInterrupt, EOFError):
-        print("\n中断されました。終了します。")
+    except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+        print("\n中断されました。終了します。（--resume を付けて再実行すると続きから再開できます）")
     except Exception as e:
         logger.error(f"予期しないエラーが発生しました: {e}")
 
@@ -0,0 +1,273 @@
+import asyncio
+import contextlib
+import json
+import time
+import tomllib
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+from .canonicalizer import CanonicalRules
+from .crawler import DocsCrawler
+from .fetcher import FETCH_MODES
+from .logger import setup_logger
+from .page_pool import FairPagePool, PagePool
+from .resource_policy import ResourcePolicy
+
+logger = setup_logger(__name__)
+
+
+@dataclass
+class SiteJob:
+    """
+    バッチで実行する1サイト分の設定。
+
+    scope はクロール対象とするパスのプレフィックスで、省略時は開始URLのパス配下です。
+    output を省略した場合は、マニフェストの output_dir に <name>.md として出力します。
+    """
+    url: str
+    name: str = ""
+    scope: Optional[str] = None
+    output: Optional[str] = None
+    max_pages: int = 100
+    concurrency: int = 5
+    fetch_mode: str = "auto"
+    rate_limit: float = 2.0
+    use_sitemaps: bool = True
+    respect_robots: bool = True
+    frontier_order: str = "fifo"
+    output_order: str = "discovery"
+    dedup: str = "near"
+    drop_params: List[str] = field(default_factory=list)
+    cache_dir: Optional[str] = None
+    resume: bool = False
+
+    def __post_init__(self):
+        if not self.url.startswith(("http://", "https://")):
+            raise ValueError(f"サイトのURLは http:// または https:// で始まる必要があります: {self.url}")
+        if self.fetch_mode not in FETCH_MODES:
+            raise ValueError(f"不明な取得モードです: {self.fetch_mode} (指定可能: {', '.join(FETCH_MODES)})")
+        if not self.name:
+            parsed = urlparse(self.url)
+            self.name = f"{parsed.netloc}{parsed.path}".strip("/").replace("/", "_").replace(":", "_")
+
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).netloc
+
+
+@dataclass
+class BatchManifest:
+    """
+    バッチ実行のマニフェスト。
+
+    browsers / pool_size は全サイトで共有するブラウザプールの大きさ、max_sites は同時にクロールするサイト数です。
+    report を省略した場合は output_dir に batch_report.json として出力します。
+    """
+    sites: List[SiteJob]
+    output_dir: str = "output"
+    max_sites: int = 4
+    browsers: int = 1
+    pool_size: int = 8
+    report: Optional[str] = None
+
+    @property
+    def report_path(self) -> Path:
+        return Path(self.report) if self.report else Path(self.output_dir) / "batch_report.json"
+
+    def output_path(self, job: SiteJob) -> Path:
+        return Path(job.output) if job.output else Path(self.output_dir) / f"{job.name}.md"
+
+
+def _build(cls, values: dict, where: str):
+    known = {f.name for f in fields(cls)}
+    unknown = sorted(set(values) - known)
+    if unknown:
+        raise ValueError(f"{where} に未対応の項目があります: {', '.join(unknown)}")
+    try:
+        return cls(**values)
+    except TypeError as e:
+        # 必須項目（url など）の不足
+        raise ValueError(f"{where} の設定が不正です: {e}")
+
+
+def parse_manifest(data: dict) -> BatchManifest:
+    """
+    読み込んだマニフェスト（[batch] / [defaults] / [[sites]]）から BatchManifest を組み立てます。
+    各サイトの設定は [defaults] の値を上書きします。
+    """
+    defaults = data.get("defaults", {})
+    sites = data.get("sites") or []
+    if not sites:
+        raise ValueError("マニフェストにサイト ([[sites]]) が1つもありません")
+    jobs = [_build(SiteJob, {**defaults, **site}, f"sites[{i}]") for i, site in enumerate(sites)]
+
+    names = [job.name for job in jobs]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"サイト名が重複しています (name で区別してください): {', '.join(duplicated)}")
+    return _build(BatchManifest, {**data.get("batch", {}), "sites": jobs}, "[batch]")
+
+
+def load_manifest(path: str) -> BatchManifest:
+    """
+    TOML (.toml) または YAML (.yaml / .yml) のマニフェストを読み込みます。
+    YAML を使う場合は PyYAML が必要です。
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == ".toml":
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    elif suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML のマニフェストを読み込むには PyYAML が必要です (pip install pyyaml)")
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    else:
+        raise ValueError(f"未対応のマニフェストの形式です (.toml / .yaml / .yml): {path}")
+    return parse_manifest(data)
+
+
+class BatchRunner:
+    """
+    マニフェストに書かれた複数のサイトを、非対話で並行してクロールするクラス。
+
+    ブラウザは全サイトで1つのプール（FairPagePool）を共有し、作業枠はホスト間で順番に割り当てます。
+    ブラウザを使うサイトが1つもなければ、Playwright 自体を起動しません。
+    1つのサイトが失敗しても他のサイトのクロールは続け、全サイトの結果をまとめたレポートを書き出します。
+    """
+    def __init__(self, manifest: BatchManifest):
+        self.manifest = manifest
+        self.resource_policy = ResourcePolicy()
+        self.shared_pool: Optional[FairPagePool] = None
+        self.results = {}
+
+    def _build_crawler(self, job: SiteJob) -> DocsCrawler:
+        output_file = self.manifest.output_path(job)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        return DocsCrawler(
+            start_url=job.url,
+            output_file=str(output_file),
+            max_concurrent=job.concurrency,
+            max_pages=job.max_pages,
+            fetch_mode=job.fetch_mode,
+            cache_dir=job.cache_dir,
+            resume=job.resume,
+            resource_policy=self.resource_policy,
+            rate_limit=job.rate_limit,
+            use_sitemaps=job.use_sitemaps,
+            respect_robots=job.respect_robots,
+            output_order=job.output_order,
+            dedup=job.dedup,
+            canonical_rules=CanonicalRules(drop_params=CanonicalRules().drop_params + tuple(job.drop_params)),
+            frontier_order=job.frontier_order,
+            scope_path=job.scope,
+            page_pool=self.shared_pool.lease(job.host) if self.shared_pool is not None else None,
+            print_summary=False,
+        )
+
+    async def _run_site(self, job: SiteJob, slots: asyncio.Semaphore):
+        async with slots:
+            started = time.perf_counter()
+            result = {"url": job.url, "output": str(self.manifest.output_path(job))}
+            crawler = None
+            try:
+                crawler = self._build_crawler(job)
+                logger.info(f"サイトのクロールを開始します: {job.name} ({job.url})")
+                await crawler.run()
+                result["status"] = "completed"
+            except Exception as e:
+                logger.error(f"サイトのクロールに失敗しました: {job.name}: {e}")
+                result["status"] = "failed"
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["elapsed_sec"] = round(time.perf_counter() - started, 3)
+            if crawler is not None:
+                result.update(self._site_stats(crawler))
+            self.results[job.name] = result
+
+    def _site_stats(self, crawler: DocsCrawler) -> dict:
+        stats = {
+            "pages_crawled": len(crawler.url_manager.visited),
+            "outputs": [str(path) for path in crawler.output_sink.paths],
+            "metrics_report": f"{crawler.output_file}.metrics.json",
+        }
+        if crawler.dedup is not None:
+            stats["duplicates"] = crawler.dedup.duplicates
+        if crawler.aliases:
+            stats["canonical_aliases"] = len(crawler.aliases)
+        if crawler.failed_pages:
+            # 再試行しても取得できなかったページ → 理由
+            stats["failed_pages"] = dict(crawler.failed_pages)
+        return stats
+
+    async def run(self) -> dict:
+        """
+        全サイトをクロールし、レポートの内容を返します。
+        """
+        started = time.perf_counter()
+        uses_browser = any(job.fetch_mode != "http" for job in self.manifest.sites)
+        playwright_cm = async_playwright() if uses_browser else contextlib.nullcontext()
+        async with playwright_cm as p:
+            if p is not None:
+                # ブラウザは最初にブラウザを必要とするサイトが現れた時点で起動する
+                self.shared_pool = FairPagePool(PagePool(
+                    p,
+                    size=self.manifest.pool_size,
+                    browsers=self.manifest.browsers,
+                    on_new_context=self.resource_policy.install,
+                ))
+            slots = asyncio.Semaphore(max(1, self.manifest.max_sites))
+            try:
+                await asyncio.gather(*(self._run_site(job, slots) for job in self.manifest.sites))
+            finally:
+                if self.shared_pool is not None:
+                    await self.shared_pool.close()
+
+        report = self._report(time.perf_counter() - started)
+        report_path = self.manifest.report_path
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info(f"バッチの実行レポートを書き出しました: {report_path}")
+        return report
+
+    def _report(self, elapsed: float) -> dict:
+        sites = {job.name: self.results.get(job.name, {"url": job.url, "status": "not_run"})
+                 for job in self.manifest.sites}
+        report = {
+            "elapsed_sec": round(elapsed, 3),
+            "sites_total": len(sites),
+            "sites_failed": sum(1 for site in sites.values() if site["status"] != "completed"),
+            "pages_crawled": sum(site.get("pages_crawled", 0) for site in sites.values()),
+            "sites": sites,
+            "manifest": {key: value for key, value in asdict(self.manifest).items() if key != "sites"},
+        }
+        if self.shared_pool is not None:
+            pool = self.shared_pool.pool
+            report["browser_pool"] = {
+                "browsers_launched": pool.browsers_launched,
+                "contexts_created": pool.contexts_created,
+                # ホストごとに割り当てた作業枠の回数
+                "leases_by_host": dict(self.shared_pool.granted),
+            }
+        return report
+
+    def print_summary(self, report: dict):
+        """
+        全サイトの結果を標準出力に表示します（ログ形式ではない）。
+        """
+        print("\n" + "-" * 40)
+        print(f"📦 バッチ実行サマリー ({report['elapsed_sec']:.1f} 秒)")
+        print("-" * 40)
+        for name, site in report["sites"].items():
+            mark = "✅" if site["status"] == "completed" else "❌"
+            line = f"{mark} {name}: {site.get('pages_crawled', 0)} ページ → {site.get('output', '-')}"
+            if "error" in site:
+                line += f" ({site['error']})"
+            print(line)
+        print("-" * 40)
+        print(f"成功 {report['sites_total'] - report['sites_failed']} / {report['sites_total']} サイト、"
+              f"合計 {report['pages_crawled']} ページ")
+        print(f"実行レポート: {self.manifest.report_path}")
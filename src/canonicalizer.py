@@ -0,0 +1,105 @@
+import fnmatch
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import SplitResult, urlsplit
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 既定で除去するトラッキング用のクエリパラメータ（* はワイルドカード）
+TRACKING_PARAMS = ("utm_*", "fbclid", "gclid", "msclkid", "_ga", "_gl", "mc_cid", "mc_eid")
+
+# keep: そのまま / strip: 末尾のスラッシュを除く / add: 拡張子のないパスの末尾にスラッシュを付ける
+TRAILING_SLASH_MODES = ("keep", "strip", "add")
+
+INDEX_FILES = ("index.html", "index.htm")
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+@dataclass
+class CanonicalRules:
+    """
+    URLの正規化ルール。
+
+    フラグメントの除去・スキームとホストの小文字化・既定ポートの除去は常に行います。
+    drop_params に一致するクエリパラメータは除去し、keep_params を指定した場合はそれ以外を全て除去します。
+    honor_canonical_link はページ内の <link rel="canonical"> に従うかどうかで、クローラーが参照します。
+    """
+    drop_params: Tuple[str, ...] = TRACKING_PARAMS
+    keep_params: Optional[Tuple[str, ...]] = None
+    sort_params: bool = True
+    trailing_slash: str = "keep"
+    strip_index: bool = False
+    lowercase_path: bool = False
+    honor_canonical_link: bool = True
+
+    def __post_init__(self):
+        if self.trailing_slash not in TRAILING_SLASH_MODES:
+            raise ValueError(f"未対応の末尾スラッシュの扱いです: {self.trailing_slash}")
+
+
+class UrlCanonicalizer:
+    """
+    CanonicalRules に従ってURLを正規化するクラス。URLの分解は1回だけ行います。
+    """
+    def __init__(self, rules: Optional[CanonicalRules] = None):
+        self.rules = rules or CanonicalRules()
+        # ワイルドカードを含まないパターンは集合で照合する
+        self.drop_exact = {p for p in self.rules.drop_params if not _is_pattern(p)}
+        self.drop_patterns = [p for p in self.rules.drop_params if _is_pattern(p)]
+        self.keep = set(self.rules.keep_params) if self.rules.keep_params is not None else None
+
+    def split(self, url: str) -> SplitResult:
+        """
+        URLを分解し、ルールを適用した構成要素を返します。
+        """
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower()
+        default_port = DEFAULT_PORTS.get(scheme)
+        if default_port and netloc.endswith(f":{default_port}"):
+            netloc = netloc[:-len(default_port) - 1]
+        return SplitResult(scheme, netloc, self._path(parts.path, netloc), self._query(parts.query), "")
+
+    def canonicalize(self, url: str) -> str:
+        """
+        正規化したURLを返します。
+        """
+        return self.split(url).geturl()
+
+    def _path(self, path: str, netloc: str) -> str:
+        rules = self.rules
+        if not path:
+            return "/" if netloc else path
+        if rules.lowercase_path:
+            path = path.lower()
+        if rules.strip_index:
+            head, _, tail = path.rpartition("/")
+            if tail.lower() in INDEX_FILES:
+                path = head + "/"
+        if rules.trailing_slash == "strip" and len(path) > 1 and path.endswith("/"):
+            path = path.rstrip("/") or "/"
+        elif rules.trailing_slash == "add" and not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+            path += "/"
+        return path
+
+    def _query(self, query: str) -> str:
+        if not query:
+            return query
+        # 値の再エンコードによる表記揺れを避けるため、パラメータは元の表記のまま扱う
+        params = [p for p in query.split("&") if p and self._keeps(p.split("=", 1)[0])]
+        if self.rules.sort_params:
+            params.sort()
+        return "&".join(params)
+
+    def _keeps(self, name: str) -> bool:
+        if self.keep is not None:
+            return name in self.keep
+        if name in self.drop_exact:
+            return False
+        return not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.drop_patterns)
+
+
+def _is_pattern(value: str) -> bool:
+    return any(c in value for c in "*?[")
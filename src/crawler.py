@@ -1,116 +1,854 @@
 import asyncio
-import random
+import contextlib
 import time
-from playwright.async_api import async_playwright
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+import httpx
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError, async_playwright
 from .logger import setup_logger
-from .extractor import ContentExtractor
+from .canonicalizer import CanonicalRules
+from .dedup import DuplicateIndex, Fingerprint, fingerprint
+from .dispatcher import PageDispatcher
+from .extraction_stage import ExtractionStage
+from .extractor import ExtractionRules, extraction_key
+from .fetcher import LINK_SCRIPT, HybridFetcher, PageLink
+from .frontier import Frontier
+from .frontier_backend import FrontierBackend, MemoryFrontierBackend
+from .journal import COMPLETED, DISCOVERED, DUPLICATE, IN_FLIGHT, CrawlJournal
+from .memory_budget import TRIM_SCRIPT, TRUNCATION_MARKER, MemoryBudget, current_rss, peak_rss, truncate_html
+from .metrics import CrawlMetrics, MetricsServer
+from .output_sink import ShardedOutputSink
+from .output_writer import OrderedOutputWriter
+from .page_cache import PageCache, content_hash
+from .page_pool import PagePool
+from .rate_limiter import (
+    THROTTLE_STATUSES,
+    AdaptiveConcurrency,
+    HostRateLimiter,
+    ThrottledError,
+    parse_retry_after,
+)
+from .readiness import RenderReadiness
+from .resource_policy import ResourcePolicy
+from .retry_policy import CircuitBreaker, CircuitOpenError, HostTimeouts, RetryPolicy, RetryQueue, TransientError
+from .sitemap import ROBOTS_AGENT, SitemapSeeder
 from .url_manager import UrlManager
 
 logger = setup_logger(__name__)
 
+# Retry-After が返されなかった場合にホストへのリクエストを止める秒数
+DEFAULT_THROTTLE_PAUSE = 5.0
+# 制限を受けたURLを再投入する上限回数
+MAX_THROTTLE_RETRIES = 5
+
+# 共有フロンティアで、今すぐ処理できるURLがない間に他のワーカーの進捗を確認する間隔（秒）
+FRONTIER_POLL_INTERVAL = 0.5
+
 class DocsCrawler:
     """
     指定されたベースURLから開始し、同一ドメイン内のドキュメントページをクロールするクラス。
     """
-    def __init__(self, start_url: str, output_file: str, max_concurrent: int = 5, max_pages: int = 20):
+    def __init__(self, start_url: str, output_file: str, max_concurrent: int = 5, max_pages: int = 20,
+                 extraction_workers: int | None = None, extraction_queue_size: int | None = None,
+                 fetch_mode: str = "auto", cache_dir: str | None = None,
+                 cache_max_bytes: int = 512 * 1024 * 1024, resume: bool = False,
+                 resource_policy: ResourcePolicy | None = None, ready_selector: str | None = None,
+                 ready_timeout: float = 10.0, rate_limit: float = 2.0, rate_burst: int = 1,
+                 browser_processes: int = 1, context_max_pages: int = 100,
+                 context_memory_limit_mb: int | None = 512, use_sitemaps: bool = True,
+                 respect_robots: bool = True, metrics_port: int | None = None,
+                 output_order: str = "discovery", output_buffer_bytes: int = 16 * 1024 * 1024,
+                 output_toc: bool = False, shard_max_bytes: int | None = None,
+                 shard_max_words: int | None = None, dedup: str = "near",
+                 dedup_prune_links: bool = False, canonical_rules: CanonicalRules | None = None,
+                 frontier_order: str = "fifo", extraction_rules: ExtractionRules | None = None,
+                 scope_path: str | None = None, page_pool=None, print_summary: bool = True,
+                 frontier_backend: FrontierBackend | None = None, memory_budget_bytes: int | None = None,
+                 rss_limit_bytes: int | None = None, max_page_bytes: int | None = None,
+                 retry_policy: RetryPolicy | None = None, page_timeout: float = 30.0,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30.0):
         self.output_file = output_file
         self.max_concurrent = max_concurrent
         
         # URL管理とコンテンツ抽出の委譲
-        self.url_manager = UrlManager(start_url, max_pages)
-        self.extractor = ContentExtractor()
+        # 抽出はプロセスプールで行い、ブラウザ描画と並行して全コアを使う
+        # extraction_workers=None ならCPUコア数、0 ならイベントループ上で直接抽出
+        # URLの正規化ルール（クエリパラメータ・末尾スラッシュ・index.html など）は canonical_rules で指定する
+        # 本文抽出のルール（ノイズとするタグ・本文とするタグ・HTMLパーサー）は extraction_rules で指定する
+        # クロール対象の範囲は開始URLのパス配下（scope_path を指定した場合はそのパス配下）
+        self.url_manager = UrlManager(start_url, max_pages, rules=canonical_rules, scope_path=scope_path)
         
-        self.queue = asyncio.Queue()
-        # 結果をメモリに保持せず、直接ファイルに書き込むためのロック
-        self.file_lock = asyncio.Lock()
-
-    def _get_random_sleep_time(self) -> float:
-        """1.0秒から3.0秒の間のランダムな数値を返します。"""
-        return random.uniform(1.0, 3.0)
+        # ステージ別の所要時間・カウンタ・ゲージ（metrics_port 指定時はHTTPで公開する）
+        self.metrics = CrawlMetrics()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        
+        self.extraction_stage = ExtractionStage(
+            self._on_page_extracted,
+            workers=extraction_workers,
+            queue_size=extraction_queue_size,
+            metrics=self.metrics,
+            on_failure=self._on_extraction_failed,
+            rules=extraction_rules,
+            # 重複判定に使う本文の指紋は、イベントループを止めないよう抽出ワーカーで計算する
+            fingerprints=dedup != "off",
+        )
+        
+        # HTTPを優先し、JavaScriptが必要なページのみブラウザで描画する
+        self.fetcher = HybridFetcher(
+            self.url_manager.base_path,
+            mode=fetch_mode,
+            max_connections=max_concurrent,
+            max_page_bytes=max_page_bytes,
+        )
+        
+        # 処理中のページが保持するHTMLの合計（memory_budget_bytes）とプロセスのRSS（rss_limit_bytes）の上限
+        # 上限を超えている間は新しいページの取得を始めない。max_page_bytes を超えるページは切り詰める
+        self.memory_budget = MemoryBudget(memory_budget_bytes, rss_limit_bytes)
+        self.max_page_bytes = max_page_bytes
+        self.truncated_pages = []
+        
+        # 再クロール用のページキャッシュ（cache_dir 指定時のみ有効）
+        # 抽出器やルールが変わった場合は、キャッシュ済みのMarkdownを使わずに抽出し直す
+        self.page_cache = PageCache(cache_dir, cache_max_bytes, extraction_key(extraction_rules)) if cache_dir else None
+        
+        # ブラウザで描画する際に読み込むリソースの制御
+        # 未指定の場合は document / script / xhr / fetch / stylesheet のみを許可する
+        self.resource_policy = resource_policy or ResourcePolicy()
+        
+        # 描画完了の検出（networkidle と固定の待機時間の代わり）
+        self.readiness = RenderReadiness(selector=ready_selector, timeout=ready_timeout)
+        
+        # ホストごとのリクエストレート制限（リクエスト/秒、0で無効）と、
+        # レイテンシ・制限状況に応じて max_concurrent まで並列数を増減させるコントローラ
+        self.rate_limiter = HostRateLimiter(rate=rate_limit, burst=rate_burst)
+        self.concurrency = AdaptiveConcurrency(maximum=max_concurrent)
+        self.throttle_attempts = {}
+        
+        # タイムアウトや一時的なエラーで失敗したページは、間隔を空けて再試行する（新しいURLとは別のキューで待たせる）
+        # タイムアウトはホストごとの読み込み時間のp95から決め、失敗が続くホストへのリクエストは一時的に止める
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_queue = RetryQueue()
+        self.timeouts = HostTimeouts(initial=page_timeout)
+        self.breaker = CircuitBreaker(threshold=breaker_threshold, cooldown=breaker_cooldown)
+        # URL → 失敗した回数（再試行待ちのもの）
+        self.failures = {}
+        # 再試行しても取得できなかったURL → 最後の失敗の理由
+        self.failed_pages = {}
+        # キューを処理するワーカー（process_queue() で作成）
+        self.dispatcher = None
+        
+        # ページとコンテキストを使い回すプール（ブラウザは必要になった時点で起動する）
+        # page_pool を渡した場合は、複数サイトで共有するそのプールを使い、起動も終了もしない
+        self.browser_processes = browser_processes
+        self.context_max_pages = context_max_pages
+        self.context_memory_limit_mb = context_memory_limit_mb
+        self.shared_pool = page_pool
+        self.page_pool = page_pool
+        self.print_summary = print_summary
+        
+        # 発見・処理中・完了したURLを記録し、中断後の再開（resume）に使うジャーナル
+        self.resume = resume
+        self.journal = CrawlJournal(f"{output_file}.journal")
+        
+        # robots.txt とサイトマップによるフロンティアの事前投入
+        self.use_sitemaps = use_sitemaps
+        self.respect_robots = respect_robots
+        
+        # クロール待ちのURLの優先度付きキュー
+        # サイトマップの lastmod が新しいページほど先に処理する（同順位は frontier_order の順）
+        start = urlparse(self.url_manager.start_url)
+        self.frontier = Frontier(f"{start.scheme}://{start.netloc}{self.url_manager.base_path}", order=frontier_order)
+        # frontier_backend（SQLite / Redis）を渡した場合は、複数のワーカーでフロンティアとページ数の上限を共有する
+        # このとき url_manager の集合は、このワーカーが既に扱ったURLを覚えておくためだけに使う
+        self.frontier_backend = frontier_backend if frontier_backend is not None else MemoryFrontierBackend(self.frontier)
+        self.frontier_stats = {}
+        self.resumed = False
+        # <link rel="canonical"> で別のURLを正規URLとしていたため出力しなかったURL → 正規URL
+        self.aliases = {}
+        
+        self.metrics.register_gauge("queue_depth", lambda: len(self.frontier_backend))
+        self.metrics.register_gauge("in_flight_pages", lambda: self.concurrency.in_flight)
+        self.metrics.register_gauge("concurrency_limit", lambda: self.concurrency.current_limit)
+        self.metrics.register_gauge("extraction_queue_depth", lambda: self.extraction_stage.queue.qsize())
+        self.metrics.register_gauge("pages_visited", lambda: len(self.url_manager.visited))
+        self.metrics.register_gauge("retry_queue_depth", lambda: len(self.retry_queue))
+        self.metrics.register_gauge("circuit_open_hosts", lambda: len(self.breaker.open_hosts()))
+        self.metrics.register_gauge("in_flight_html_bytes", lambda: self.memory_budget.in_flight_bytes)
+        self.metrics.register_gauge("peak_in_flight_html_bytes", lambda: self.memory_budget.peak_in_flight_bytes)
+        self.metrics.register_gauge("rss_bytes", current_rss)
+        self.metrics.register_gauge("peak_rss_bytes", peak_rss)
+        self.metrics.register_gauge("peak_children_rss_bytes", lambda: peak_rss(children=True))
+        
+        # ファイルへの書き込みは専用タスクでまとめて行い、上限に達したら次のファイル（シャード）へ切り替える
+        self.output_sink = ShardedOutputSink(
+            output_file,
+            max_shard_bytes=shard_max_bytes,
+            max_shard_words=shard_max_words,
+            toc=output_toc,
+            on_written=self._on_page_written,
+            metrics=self.metrics,
+        )
+        # 完了順ではなく発見順（またはパス順）でページを並べ替えるライター
+        # 順番待ちのページは output_buffer_bytes を超えると一時ファイルに退避する
+        self.output = OrderedOutputWriter(
+            self.output_sink,
+            order=output_order,
+            buffer_bytes=output_buffer_bytes,
+        )
+        # 抽出ステージに渡したなど、出力待ちになっているURL
+        self.handed_off = set()
+        self.metrics.register_gauge("reorder_buffer_bytes", lambda: self.output.buffered_bytes)
+        self.metrics.register_gauge("reorder_spill_bytes", lambda: self.output.spill_size)
+        self.metrics.register_gauge("write_pending_bytes", lambda: self.output_sink.pending_bytes)
+        
+        # 抽出済みの本文が既存のページと同じ（または非常に似ている）ページは出力せず、別名として記録する
+        # dedup_prune_links=True の場合は、重複ページのリンクもたどらない（抽出の完了を待ってからリンクを追加する）
+        self.dedup = None if dedup == "off" else DuplicateIndex(max_distance=3 if dedup == "near" else None)
+        self.dedup_prune_links = dedup_prune_links and self.dedup is not None
+        self.link_gates = {}
+        if self.dedup is not None:
+            self.metrics.register_gauge("dedup_ratio", lambda: self.dedup.ratio)
 
-    async def crawl_page(self, context, url):
+    async def crawl_page(self, url, retry: bool = False, reserved: bool = False):
         """
         単一のページをクロールし、コンテンツを抽出して新しいリンクを見つけます。
+        結果（レイテンシ・制限・タイムアウト）は並列数コントローラへ伝えます。
+        タイムアウトや一時的なエラーで失敗したページは、再試行の上限まで再試行のキューに入れます。
+        reserved=True はディスパッチャーから渡されたURLで、ページ数の枠の確保（_reserve()）とサーキットブレーカーの確認、
+        取得開始前の待機（_admit()）を済ませています。retry=True は再試行のキューから取り出したURLです。
         """
-        if not self.url_manager.can_crawl(url):
-            return
+        if retry:
+            logger.info(f"再試行中 ({self._attempt(url)} 回目): {url}")
+        else:
+            if not reserved and not await self._reserve(url):
+                return
+            logger.info(f"クロール中: {url}")
+        
+        requeued = False
+        with self.metrics.page(url):
+            if not reserved:
+                await self._admit(url)
+            try:
+                if not reserved:
+                    # 失敗が続いているホストへはリクエストしない（ディスパッチャー経由では取り出す時点で確認済み）
+                    self.breaker.check(url)
+                started = time.perf_counter()
+                await self._fetch_page(url)
+                elapsed = time.perf_counter() - started
+                self.concurrency.on_success(elapsed)
+                self.timeouts.observe(url, elapsed)
+                self.breaker.record_success(url)
+                self.failures.pop(url, None)
+                self.metrics.inc("pages_total", result="ok")
+            except CircuitOpenError as e:
+                if e.gave_up:
+                    self._record_failed(url, str(e))
+                else:
+                    # 止めている間の待機は試行回数に数えない
+                    self._schedule_retry(url, e.retry_after, reason="circuit_open")
+                    requeued = True
+            except ThrottledError as e:
+                logger.warning(f"サーバーから制限を受けました {url}: {e}")
+                self.rate_limiter.pause(url, e.retry_after if e.retry_after is not None else DEFAULT_THROTTLE_PAUSE)
+                self.concurrency.on_throttle()
+                self.breaker.release(url)
+                self.metrics.inc("pages_total", result="throttled")
+                requeued = await self._requeue_throttled(url)
+            except (asyncio.TimeoutError, httpx.TimeoutException, PlaywrightTimeoutError) as e:
+                logger.error(f"タイムアウト {url}: {e}")
+                self.concurrency.on_error()
+                self.breaker.record_failure(url)
+                self.metrics.inc("pages_total", result="timeout")
+                self.metrics.inc("errors_total", stage="crawl", type=type(e).__name__)
+                requeued = self._retry_or_fail(url, f"タイムアウト ({type(e).__name__})", reason="timeout")
+            except (TransientError, PlaywrightError) as e:
+                # 5xx・接続の切断・ナビゲーションの失敗（net::ERR_*）など、時間をおけば成功しうるもの
+                logger.error(f"一時的なエラー {url}: {e}")
+                self.breaker.record_failure(url)
+                self.metrics.inc("pages_total", result="error")
+                self.metrics.inc("errors_total", stage="crawl", type=type(e).__name__)
+                requeued = self._retry_or_fail(url, f"{type(e).__name__}: {e}", reason="transient")
+            except Exception as e:
+                logger.error(f"Error crawling {url}: {e}")
+                self.breaker.release(url)
+                self.metrics.inc("pages_total", result="error")
+                self.metrics.inc("errors_total", stage="crawl", type=type(e).__name__)
+                self._record_failed(url, f"{type(e).__name__}: {e}")
 
+        if url not in self.handed_off:
+            # 抽出ステージに渡していない（または抽出が済んだ）ページは、HTMLを保持していない
+            await self.memory_budget.release(url)
+        if not requeued:
+            await self.frontier_backend.complete(url)
+            # リンクを取得できなかったページも記録し、出力順の確定が止まらないようにする
+            self.output.record_links(url, [])
+            if url not in self.handed_off:
+                # 出力がないことが確定したページで、後続ページの書き出しが止まらないようにする
+                self.output.skip(url)
+
+    async def _admit(self, url: str):
+        """
+        取得を始める前に待機します。処理中のHTMLやRSSが上限を超えている間は待ち、
+        ホストごとのトークンバケットでリクエスト開始レートを制限します。
+        ディスパッチャーからは並列数の実行枠を確保する前に呼ばれるため、待っている間は実行枠を占有しません。
+        """
+        with self.metrics.span("memory_wait"):
+            await self.memory_budget.admit(url)
+        with self.metrics.span("rate_wait"):
+            await self.rate_limiter.acquire(url)
+
+    async def _reserve(self, url: str) -> bool:
+        """
+        URLを訪問済みにして、ページ数の枠を1つ確保します。確保できた場合は True を返します。
+        取得済みのURLは完了として、枠が残っていないURLはフロンティアへ返却して、False を返します。
+        """
+        if url in self.url_manager.visited:
+            # 期限切れで戻ってきた、このワーカーが取得済みのURL
+            await self.frontier_backend.complete(url)
+            return False
+        if self.url_manager.limit_reached():
+            # 枠が空いたとき（制限を受けたページが返却されたときなど）に取り直せるよう、フロンティアに残す
+            await self.frontier_backend.requeue(url)
+            return False
         self.url_manager.mark_visited(url)
-        logger.info(f"クロール中: {url}")
-        
-        page = await context.new_page()
+        self.journal.record_in_flight(url)
+        return True
+
+    async def _give_up(self, url: str, message: str):
+        """
+        ホストへのリクエストを諦めたURLを、取得できなかったページとして完了します。
+        出力ライターには飛ばすページとして伝え、後続のページの書き出しを止めないようにします。
+        """
+        self._record_failed(url, message)
+        await self.frontier_backend.complete(url)
+        self.output.record_links(url, [])
+        self.output.skip(url)
+
+    def _attempt(self, url: str) -> int:
+        """
+        URLの次の試行が何回目かを返します。
+        """
+        return self.failures.get(url, 0) + 1
+
+    def _retry_or_fail(self, url: str, message: str, reason: str) -> bool:
+        """
+        失敗したURLを、再試行の上限まで再試行のキューに入れます。入れた場合は True を返します。
+        既に抽出ステージへ渡したページは、出力が重複しないよう再試行しません。
+        """
+        failures = self._attempt(url)
+        self.failures[url] = failures
+        if url in self.handed_off or not self.retry_policy.should_retry(failures):
+            self._record_failed(url, message)
+            return False
+        delay = self.retry_policy.delay(failures)
+        logger.warning(f"{delay:.1f} 秒後に再試行します ({failures}/{self.retry_policy.max_attempts - 1}): {url}")
+        self._schedule_retry(url, delay, reason=reason)
+        return True
+
+    def _schedule_retry(self, url: str, delay: float, reason: str):
+        self.retry_queue.push(url, delay)
+        self.metrics.inc("retries_total", reason=reason)
+
+    def _record_failed(self, url: str, message: str):
+        """
+        取得できなかったURLと理由を記録します（サマリーに表示されます）。
+        """
+        attempts = self.failures.pop(url, 0) or 1
+        self.failed_pages[url] = f"{message} ({attempts} 回試行)"
+        self.metrics.inc("pages_failed_total")
+
+    async def _requeue_throttled(self, url: str) -> bool:
+        """
+        制限を受けたURLを、上限回数まで再びキューに戻します。戻した場合は True を返します。
+        """
+        attempts = self.throttle_attempts.get(url, 0) + 1
+        self.throttle_attempts[url] = attempts
+        if attempts > MAX_THROTTLE_RETRIES:
+            logger.error(f"制限が解除されないため諦めます: {url}")
+            return False
+        self.url_manager.unmark_visited(url)
+        await self.frontier_backend.requeue(url)
+        return True
+
+    async def _fetch_page(self, url):
+        """
+        まずHTTPでの取得を試み、JavaScriptが必要な場合のみブラウザで描画します。
+        """
+        # キャッシュ済みのページは、方式に関わらず条件付きリクエストで再検証する
+        entry = self.page_cache.get(url) if self.page_cache else None
+        if entry or self.fetcher.should_try_http(url):
+            static_page = await self._fetch_static(url, entry)
+            if static_page and static_page.not_modified:
+                if await self._replay_cached_page(url, entry):
+                    return
+                # キャッシュ済みのMarkdownを読めなかった場合は、検証ヘッダーなしで取得し直して抽出する
+                logger.warning(f"キャッシュ済みのMarkdownを読み込めないため、取得し直します: {url}")
+                static_page = await self._fetch_static(url, None) if self.fetcher.mode != "browser" else None
+            if static_page and self.fetcher.mode != "browser":
+                # 静的HTMLをそのまま抽出ステージへ渡す
+                hrefs = self._link_urls(static_page.links)
+                await self._remember_page(url, static_page.html, hrefs, static_page.content_hash,
+                                          static_page.etag, static_page.last_modified)
+                if self._resolve_canonical(url, static_page.canonical):
+                    await self._submit_for_extraction(url, static_page.html)
+                await self._enqueue_links(url, await self._links_to_follow(url, hrefs))
+                return
+            if not self.fetcher.uses_browser:
+                return
+
+        await self._crawl_with_browser(url)
+
+    async def _fetch_static(self, url, entry):
+        """
+        HTTPでページを取得します。entry を渡した場合は、その検証ヘッダーで条件付きリクエストを送ります。
+        """
+        with self.metrics.span("http"):
+            static_page = await self.fetcher.fetch_static(
+                url,
+                etag=entry.etag if entry else None,
+                last_modified=entry.last_modified if entry else None,
+                known_hash=entry.content_hash if entry else None,
+                timeout=self.timeouts.timeout_for(url, self._attempt(url)),
+            )
+        if static_page and not static_page.not_modified:
+            size = len(static_page.html.encode("utf-8"))
+            self.metrics.inc("bytes_in_total", size, source="http")
+            self.memory_budget.charge(url, size)
+            if static_page.truncated:
+                self._record_truncated(url, "http")
+        return static_page
+
+    async def _crawl_with_browser(self, url):
+        """
+        Playwrightでページを描画し、コンテンツとリンクを取得します。
+        """
+        with self.metrics.span("pool_acquire"):
+            slot = await self.page_pool.acquire()
+        page = slot.page
+        self.resource_policy.track(page)
+        broken = True
         try:
-            # ページに移動し、ネットワークがアイドル状態になるまで待機（SPA対応）
-            await page.goto(url, wait_until="networkidle", timeout=30000)
-            
-            # SPAの描画待ちなどのため、ランダムな時間待機
-            await asyncio.sleep(self._get_random_sleep_time())
-            
-            # コンテンツの抽出
-            content = await page.content()
-            markdown = self.extractor.extract(content, url)
+            # DOMの構築を待ってから、本文の描画が落ち着くまで待機（SPA対応）
+            with self.metrics.span("navigate"):
+                timeout = self.timeouts.timeout_for(url, self._attempt(url))
+                response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+            if response is not None and response.status in THROTTLE_STATUSES:
+                raise ThrottledError(response.status, parse_retry_after(response.headers.get("retry-after")))
+            if response is not None and response.status >= 500:
+                raise TransientError(f"HTTP {response.status}")
+            with self.metrics.span("readiness"):
+                readiness = await self.readiness.wait(page)
+            self.metrics.inc("readiness_total", reason=readiness.reason)
+            logger.info(f"描画完了: {url} ({readiness.elapsed * 1000:.0f} ms, {readiness.reason})")
             
-            # 結果を即座にファイルに保存（メモリ節約）
-            await self._save_page_content(markdown)
+            # リンクと正規URL（<link rel="canonical">）の探索
+            # 重複除去とクロール範囲での絞り込みはページ内で済ませ、候補だけを1回の呼び出しで受け取る
+            # 大きすぎるページの切り詰めでナビゲーションなどが消える前に行う
+            with self.metrics.span("links"):
+                found = await page.evaluate(LINK_SCRIPT, {
+                    "host": self.url_manager.domain,
+                    "basePath": self.url_manager.base_path,
+                    "foldCase": self.url_manager.canonicalizer.rules.lowercase_path,
+                })
+            hrefs = self._link_urls([PageLink(*link) for link in found["links"]])
             
-            # リンクの探索
-            hrefs = await page.evaluate('''() => {
-                return Array.from(document.querySelectorAll('a[href]')).map(a => a.href);
-            }''')
+            with self.metrics.span("content"):
+                content = await self._page_content(url, page)
+            size = len(content.encode("utf-8"))
+            self.metrics.inc("bytes_in_total", size, source="browser")
+            self.memory_budget.charge(url, size)
+            self.fetcher.record(url, "browser")
             
-            for href in hrefs:
-                if self.url_manager.add_discovered_url(href):
-                    # 正規化されたURLが返されるわけではないので、add_discovered_url内で正規化しつつ
-                    # 再度取得する必要があるが、add_discovered_urlはboolを返すのみ。
-                    # ここでは normalize してから queue に入れる。
-                    normalized = self.url_manager.normalize_url(href)
-                    if normalized not in self.url_manager.visited:
-                        await self.queue.put(normalized)
-                    
-        except Exception as e:
-            logger.error(f"Error crawling {url}: {e}")
+            if self.page_cache and response is not None:
+                # 再検証用に、描画前のドキュメント本体のハッシュと検証ヘッダーを記録する
+                headers = response.headers
+                await self._remember_page(url, content, hrefs, content_hash(await response.body()),
+                                          headers.get("etag"), headers.get("last-modified"))
+            broken = False
+        finally:
+            stats = self.resource_policy.untrack(page)
+            logger.info(f"リソース: {url} {stats.summary()}")
+            # 途中で失敗したページは状態が不明なので、コンテキストごと作り直す
+            await self.page_pool.release(slot, broken=broken)
+        
+        # ページを返却してから、生HTMLを抽出ステージへ渡す（キューが満杯なら空きが出るまで待機）
+        if self._resolve_canonical(url, found["canonical"]):
+            await self._submit_for_extraction(url, content)
+        await self._enqueue_links(url, await self._links_to_follow(url, hrefs))
+
+    async def _page_content(self, url, page) -> str:
+        """
+        描画済みのページのHTMLを取り出します。max_page_bytes を超えるページは、
+        巨大な文字列がPlaywright経由で渡ってこないよう、シリアライズの前にブラウザ上で切り詰めます。
+        """
+        if self.max_page_bytes is None:
+            return await page.content()
+        noise_tags = (self.extraction_stage.rules or ExtractionRules()).noise_tags
+        trimmed = await page.evaluate(TRIM_SCRIPT, {
+            "maxChars": self.max_page_bytes,
+            "noiseSelector": ", ".join(noise_tags),
+            "marker": TRUNCATION_MARKER,
+        })
+        content = await page.content()
+        # ブラウザ上の大きさは文字数での近似なので、上限を超えた分はここでも切り詰める
+        if trimmed["truncated"] or len(content) > self.max_page_bytes:
+            self._record_truncated(url, "browser")
+            content = truncate_html(content, self.max_page_bytes)
+        return content
+
+    def _record_truncated(self, url: str, source: str):
+        logger.warning(f"ページが上限 ({self.max_page_bytes} バイト) を超えたため切り詰めました: {url}")
+        self.truncated_pages.append(url)
+        self.metrics.inc("pages_truncated_total", source=source)
+
+    def _resolve_canonical(self, url: str, declared: str | None) -> bool:
+        """
+        <link rel="canonical"> で別のURLが正規URLとして指定されたページの扱いを決め、出力する場合は True を返します。
+        正規URLが発見済み（取得済みまたは取得予定）であれば、このページをその別名として記録し出力しません。
+        未発見であれば、正規URLを二重に取得しないよう発見済みとして扱い、このページを出力します。
+        """
+        if not declared or not self.url_manager.canonicalizer.rules.honor_canonical_link:
+            return True
+        canonical = self.url_manager.canonicalize(urljoin(url, declared))
+        if canonical is None or canonical == url:
+            return True
+        if canonical in self.url_manager.discovered:
+            logger.info(f"正規URLが指定されているため出力しません: {url} → {canonical}")
+            self.aliases[url] = canonical
+            self.metrics.inc("duplicates_total", kind="canonical")
+            self.journal.record_duplicate(url, canonical)
+            return False
+        if self.url_manager.add_discovered(canonical):
+            # 正規URLへのリンクは、このページの出力で満たされたものとして出力順の待ち合わせから外す
+            self.journal.record_duplicate(canonical, url)
+            self.output.record_links(canonical, [])
+            self.output.skip(canonical)
+        return True
+
+    async def _submit_for_extraction(self, url, html_content):
+        """
+        生HTMLを抽出ステージへ渡します。キューが満杯の間の待ち時間は submit ステージとして記録します。
+        """
+        self.handed_off.add(url)
+        if self.dedup_prune_links:
+            self.link_gates[url] = asyncio.get_running_loop().create_future()
+        with self.metrics.span("submit"):
+            await self.extraction_stage.submit(url, html_content)
+
+    async def _links_to_follow(self, url, hrefs):
+        """
+        ページからたどるリンクを返します。重複ページのリンクをたどらない設定では、
+        抽出と重複判定が終わるのを待ち、重複だった場合は空のリストを返します。
+        """
+        gate = self.link_gates.get(url)
+        if gate is not None:
+            with self.metrics.span("dedup_wait"):
+                await gate
+            del self.link_gates[url]
+        if self.dedup_prune_links and (url in self.dedup.aliases or url in self.aliases):
+            logger.info(f"重複ページのため、リンクをたどりません: {url}")
+            return []
+        return hrefs
+
+    def _open_link_gate(self, url: str):
+        gate = self.link_gates.get(url)
+        if gate is not None and not gate.done():
+            gate.set_result(None)
+
+    async def _remember_page(self, url, html_content, hrefs, hash_value, etag, last_modified):
+        """
+        取得したページをキャッシュに記録します。Markdownは抽出完了時に追加されます。
+        """
+        if self.page_cache and hash_value:
+            await self.page_cache.store_page(url, html_content, hash_value, etag, last_modified, hrefs)
+
+    async def _replay_cached_page(self, url, entry) -> bool:
+        """
+        変更のなかったページについて、描画と抽出を省略してキャッシュ済みのMarkdownを出力します。
+        """
+        markdown = await self.page_cache.load_markdown(entry)
+        if markdown is None:
+            return False
+        logger.info(f"キャッシュを使用: {url}")
+        self.metrics.inc("cache_hits_total")
+        self.handed_off.add(url)
+        await self._save_page_content(url, markdown)
+        await self._enqueue_links(url, await self._links_to_follow(url, entry.hrefs))
+        return True
+
+    def _link_urls(self, links) -> list:
+        """
+        ページ内のリンクを領域（nav / main など）別に計数し、URLの一覧を返します。
+        """
+        for region, count in Counter(link.region for link in links).items():
+            self.metrics.inc("links_total", count, region=region)
+        return [link.url for link in links]
+
+    async def _enqueue_links(self, url, hrefs):
+        """
+        見つかったリンクのうち、未発見かつクロール対象のものをまとめてキューに追加します。
+        ページ内のクロール対象リンクは、出力順を決めるためにページ内の順序で出力ライターへ記録します。
+        """
+        links = []
+        new_urls = []
+        # ナビゲーションなどで同じリンクが何度も現れるため、正規化の前に重複を除く
+        for href in dict.fromkeys(hrefs):
+            canonical = self.url_manager.canonicalize(href)
+            if canonical is None:
+                continue
+            if self.url_manager.add_discovered(canonical) and canonical not in self.url_manager.visited:
+                new_urls.append(canonical)
+            if canonical in self.url_manager.discovered:
+                links.append(canonical)
+        if new_urls:
+            # 共有フロンティアでは、他のワーカーが既に発見していたURLは除かれる
+            new_urls = await self.frontier_backend.add(new_urls)
+            self.journal.record_discovered_many(new_urls)
+        self.output.record_links(url, list(dict.fromkeys(links)))
+
+    async def _push(self, url: str, priority: float = 0.0) -> bool:
+        """
+        URLをキューに追加します。priority が小さいほど先に処理されます。
+        共有フロンティアで他のワーカーが既に発見していた場合は False を返します。
+        """
+        return bool(await self.frontier_backend.add([url], priority))
+
+    async def _on_page_extracted(self, url: str, markdown: str, page_fingerprint: Fingerprint | None = None):
+        """
+        抽出ステージから変換結果と本文の指紋を受け取り、出力ライターへ渡します。
+        """
+        if self.page_cache:
+            await self.page_cache.store_markdown(url, markdown)
+        await self._save_page_content(url, markdown, page_fingerprint)
+
+    async def _save_page_content(self, url: str, content: str, page_fingerprint: Fingerprint | None = None):
+        """
+        ページを出力ライターへ渡します。順番が来たページは書き込みタスクへ渡されます。
+        書き込みが追いついていない場合は、書き込み待ちが減るまで待機します。
+        """
+        self.handed_off.discard(url)
+        try:
+            if self.dedup is not None:
+                if page_fingerprint is None:
+                    # キャッシュから出力するページなど、抽出ワーカーを通らなかったページは別スレッドで計算する
+                    page_fingerprint = await asyncio.to_thread(fingerprint, content)
+                with self.metrics.span("dedup"):
+                    match = self.dedup.check(url, content, page_fingerprint)
+                if match is not None:
+                    logger.info(f"重複ページのため出力しません ({match.kind}, 距離 {match.distance}): {url} → {match.canonical}")
+                    self.metrics.inc("duplicates_total", kind=match.kind)
+                    self.journal.record_duplicate(url, match.canonical)
+                    self.output.skip(url)
+                    return
+            with self.metrics.span("write"):
+                self.output.add(url, content)
+                await self.output_sink.wait_for_capacity()
         finally:
-            await page.close()
+            self._open_link_gate(url)
+            await self.memory_budget.release(url)
 
-    async def _save_page_content(self, content: str):
+    async def _on_extraction_failed(self, url: str):
         """
-        スレッドセーフにファイルへ追記します。
+        抽出に失敗したページを出力順の待ち合わせから外します。
         """
-        async with self.file_lock:
-            with open(self.output_file, 'a', encoding='utf-8') as f:
-                f.write(content)
+        self.handed_off.discard(url)
+        self.output.skip(url)
+        self._open_link_gate(url)
+        await self.memory_budget.release(url)
+
+    def _on_page_written(self, url: str, shard: int, offset: int, length: int):
+        """
+        出力ファイルに書き込まれたページの位置をジャーナルに記録します。
+        """
+        self.journal.record_completed(url, offset, length, shard=shard)
+        self.metrics.inc("bytes_out_total", length)
 
     async def run(self):
         """
         クローラーのメイン実行メソッド。
         """
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            
-            # キューを初期化
-            self.queue.put_nowait(self.url_manager.start_url)
-            
-            # 出力ファイルを初期化（空にする）
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                pass
+        await self.frontier_backend.open()
+        try:
+            await self._prepare_output()
+        except BaseException:
+            await self.frontier_backend.close()
+            raise
+        await self.output_sink.start()
+        completed = False
+        try:
+            # HTTPのみのモードではPlaywrightのドライバ自体を起動しない
+            own_browser = self.fetcher.uses_browser and self.shared_pool is None
+            playwright_cm = async_playwright() if own_browser else contextlib.nullcontext()
+            async with playwright_cm as p:
+                if p is not None:
+                    # 画像・フォント・メディアやトラッカーの読み込みは各コンテキストで遮断する
+                    self.page_pool = PagePool(
+                        p,
+                        size=self.max_concurrent,
+                        browsers=self.browser_processes,
+                        context_max_pages=self.context_max_pages,
+                        memory_limit_mb=self.context_memory_limit_mb,
+                        on_new_context=self.resource_policy.install,
+                    )
+                
+                if self.metrics_port is not None:
+                    self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+                    await self.metrics_server.start()
+                
+                # 抽出ステージとHTTPクライアントを起動してからキューの処理を開始
+                await self.extraction_stage.start()
+                await self.fetcher.start()
+                try:
+                    if not self.resumed:
+                        await self._seed_frontier()
+                    await self.process_queue()
+                    completed = True
+                    self.frontier_stats = await self.frontier_backend.stats()
+                finally:
+                    # 抽出待ちのページを全て書き出してから終了する
+                    await self.extraction_stage.close()
+                    await self.fetcher.close()
+                    if self.page_cache:
+                        self.page_cache.save()
+                    if self.page_pool is not None and self.shared_pool is None:
+                        await self.page_pool.close()
+                    if self.metrics_server is not None:
+                        await self.metrics_server.close()
+        finally:
+            # 順番待ちのページを書き出す（目次は最後まで完了した場合のみ追加する）
+            self.output.close()
+            await self.output_sink.close(complete=completed)
+            # 中断された場合でも、バッファ済みの記録を書き込んでから終了する
+            self.journal.close()
+            await self.frontier_backend.close()
+            # 出力ファイルと同じ場所に実行レポートを書き出す
+            self.metrics.write_report(f"{self.output_file}.metrics.json")
             
-            # キューの処理を開始
-            await self.process_queue(context)
+        if self.print_summary:
+            self._log_summary()
 
-            await browser.close()
-            
-        self._log_summary()
+    async def _seed_frontier(self):
+        """
+        robots.txt を読み込み、サイトマップに載っているURLをキューに事前投入します。
+        リンクをたどって見つけるより先に、サイト全体のURLを優先度付きで把握できます。
+        """
+        if not (self.respect_robots or self.use_sitemaps):
+            return
+
+        parsed = urlparse(self.url_manager.start_url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        seeder = SitemapSeeder(self.fetcher.client)
+        robots = await seeder.fetch_robots(origin)
+
+        if self.respect_robots:
+            self.url_manager.robots = robots
+            delay = robots.crawl_delay(ROBOTS_AGENT)
+            if delay:
+                # Crawl-delay を指定レートの上限として扱う
+                rate = 1.0 / float(delay)
+                if self.rate_limiter.rate > 0:
+                    rate = min(rate, self.rate_limiter.rate)
+                self.rate_limiter.set_rate(parsed.netloc, rate)
+                logger.info(f"robots.txt の Crawl-delay に従います: {delay} 秒")
+            if not robots.can_fetch(ROBOTS_AGENT, self.url_manager.start_url):
+                logger.warning(f"開始URLは robots.txt で禁止されています: {self.url_manager.start_url}")
+
+        if not self.use_sitemaps:
+            return
+
+        sitemaps = robots.site_maps() or [
+            f"{origin}/sitemap.xml",
+            f"{origin}{self.url_manager.base_path.rstrip('/')}/sitemap.xml",
+        ]
+        seeded = 0
+        for sitemap_url in dict.fromkeys(sitemaps):
+            async for entry in seeder.iter_entries(sitemap_url):
+                canonical = self.url_manager.canonicalize(entry.url)
+                if canonical is None or not self.url_manager.add_discovered(canonical):
+                    continue
+                # lastmod が新しいものほど優先度を高く（値を小さく）する
+                if not await self._push(canonical, priority=-entry.lastmod if entry.lastmod else 0.0):
+                    continue
+                self.journal.record_discovered(canonical)
+                self.output.register_root(canonical)
+                seeded += 1
+        if seeded:
+            logger.info(f"サイトマップから {seeded} 件のURLを追加しました")
+
+    async def _prepare_output(self):
+        """
+        ジャーナルと出力ファイルを初期化し、キューに開始URLを投入します。
+        resume=True でジャーナルが存在する場合は、前回の状態からフロンティアを復元します。
+        """
+        self.resumed = False
+        resuming = self.resume and self.journal.path.exists()
+        first_shard = self.output_sink.shard_path(0)
+        if resuming and not Path(first_shard).exists():
+            logger.warning(f"出力ファイルが見つからないため、最初からクロールします: {first_shard}")
+            resuming = False
+        self.journal.open(fresh=not resuming)
+
+        if not resuming:
+            if self.resume:
+                logger.warning(f"ジャーナルが見つからないため、最初からクロールします: {self.journal.path}")
+            # 出力ファイル（以前のシャードとマニフェストを含む）を初期化する
+            self.output_sink.reset()
+            self.journal.set_meta("start_url", self.url_manager.start_url)
+            self.journal.record_discovered(self.url_manager.start_url)
+            # 開始URLはサイトマップのURLより先に処理する
+            await self._push(self.url_manager.start_url, priority=float("-inf"))
+            self.output.register_root(self.url_manager.start_url)
+            return
+
+        state = self.journal.load()
+        last_shard = Path(self.output_sink.shard_path(state.output_shard))
+        if not last_shard.exists() or last_shard.stat().st_size < state.output_end:
+            logger.warning("出力ファイルがジャーナルの記録より短いため、完了済みページの一部が失われている可能性があります")
+        if state.start_url and state.start_url != self.url_manager.start_url:
+            logger.warning(f"ジャーナルの開始URL ({state.start_url}) と指定されたURLが異なります")
+
+        # ジャーナルに記録されていない途中までの書き込みを切り捨てる
+        self.output_sink.restore(state.output_shard, state.output_end)
+
+        for url in state.completed:
+            self.url_manager.discovered.add(url)
+            self.url_manager.mark_visited(url)
+            self.output.exclude(url)
+        # 重複と判定済みのURLは再取得しない（出力済みページの指紋は復元しないため、以降の判定は新しいページ同士で行う）
+        for url in state.duplicates:
+            self.url_manager.discovered.add(url)
+            self.url_manager.mark_visited(url)
+            self.output.exclude(url)
+        for url in state.pending:
+            self.url_manager.discovered.add(url)
+            await self._push(url)
+            # 未処理のURLを起点に出力順を決め直す
+            self.output.register_root(url)
+        if not state.completed and not state.pending and not state.duplicates:
+            await self._push(self.url_manager.start_url)
+            self.output.register_root(self.url_manager.start_url)
+        self.resumed = True
+
+        logger.info(f"前回のクロールを再開します: 完了 {len(state.completed)} ページ / 重複 {len(state.duplicates)} ページ / "
+                    f"未処理 {len(state.pending)} ページ")
 
     def _log_summary(self):
         """
         クロール結果のサマリーを標準出力に表示します（ログ形式ではない）。
         """
-        visited = self.url_manager.visited
-        discovered = self.url_manager.discovered
+        # URLの一覧はメモリに保持していないため、ジャーナルから読み出す
+        journal = CrawlJournal(self.journal.path)
+        journal.open()
+        try:
+            urls = journal.urls_by_state()
+        finally:
+            journal.close()
+        visited = urls[IN_FLIGHT] + urls[COMPLETED] + urls[DUPLICATE]
+        uncrawled = urls[DISCOVERED]
         
         crawled_count = len(visited)
-        uncrawled = discovered - visited
         uncrawled_count = len(uncrawled)
         
         # 結果サマリーはloggingではなくprintを使用して、見やすく整形表示する
@@ -129,42 +867,89 @@ class DocsCrawler:
             for url in sorted(uncrawled):
                 print(f"  - {url}")
         print("-" * 40)
-        print(f"結果は {self.output_file} に保存されました。")
+        print(f"終了時の並列数上限: {self.concurrency.current_limit} / {self.max_concurrent}")
+        print("-" * 40)
+        if self.failed_pages:
+            print(f"取得に失敗したページ: {len(self.failed_pages)}")
+            for url, reason in sorted(self.failed_pages.items()):
+                print(f"  - {url}: {reason}")
+            print("-" * 40)
+        self._print_memory_summary()
+        if self.frontier_backend.shared and self.frontier_stats:
+            # 上の一覧はこのワーカーの分のみ。共有フロンティア全体の状態を併記する
+            print("共有フロンティア (全ワーカー): " + " / ".join(f"{k} {v}" for k, v in self.frontier_stats.items()))
+            print("-" * 40)
+        if self.page_pool is not None and self.page_pool.contexts_created:
+            print(f"ブラウザ: 起動 {self.page_pool.browsers_launched} 回 / コンテキスト作成 {self.page_pool.contexts_created} 回")
+            print("-" * 40)
+        if self.resource_policy.total.requests_allowed or self.resource_policy.total.requests_blocked:
+            print(f"ブラウザのリソース: {self.resource_policy.total.summary()}")
+            print("-" * 40)
+        if self.aliases:
+            print(f"正規URL (<link rel=\"canonical\">) の指定により出力しなかったページ: {len(self.aliases)}")
+            for url, canonical in sorted(self.aliases.items()):
+                print(f"  - {url} → {canonical}")
+            print("-" * 40)
+        if self.dedup is not None and self.dedup.checked:
+            print(f"重複ページ: {self.dedup.duplicates} / {self.dedup.checked} ページ "
+                  f"(重複率 {self.dedup.ratio:.1%})")
+            for url, alias_of in sorted(self.dedup.aliases.items()):
+                print(f"  - {url} → {alias_of}")
+            print("-" * 40)
+        if self.page_cache:
+            print(f"キャッシュ再利用: {self.page_cache.hits} ページ / 新規取得: {crawled_count - self.page_cache.hits} ページ")
+            print("-" * 40)
+        print(f"ステージ別の所要時間などの実行レポート: {self.output_file}.metrics.json")
+        if self.output_sink.sharded:
+            print(f"結果は {len(self.output_sink.paths)} 個のファイルに分割して保存されました (対応表: {self.output_sink.manifest_path}):")
+            for path in self.output_sink.paths:
+                print(f"  - {path}")
+        else:
+            print(f"結果は {self.output_file} に保存されました。")
 
-    async def process_queue(self, context):
+    def _print_memory_summary(self):
         """
-        非同期のセマフォを使用して、並行性を制限しながらキュー内のURLを処理します。
+        最大RSSと、処理中のHTMLの最大量・切り詰めたページをサマリーに表示します。
         """
-        sem = asyncio.Semaphore(self.max_concurrent)
-        
-        # 実行中のタスクを追跡
-        tasks = set()
-        
-        async def fetch(url):
-            async with sem:
-                await self.crawl_page(context, url)
-        
-        # 最初のURLを取得
-        if not self.queue.empty():
-            first_url = await self.queue.get()
-            task = asyncio.create_task(fetch(first_url))
-            tasks.add(task)
-        
-        while tasks:
-            # いずれかのタスクが完了するのを待機
-            done, pending_tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-            tasks = pending_tasks
-            
-            for t in done:
-                try:
-                    await t
-                except Exception as e:
-                    logger.error(f"タスクエラー: {e}")
-
-            # キューを空にして新しいタスクを作成
-            while not self.queue.empty():
-                url = self.queue.get_nowait()
-                # ここでの visited チェックは queue に入れる前に行っているが、念のため
-                if url not in self.url_manager.visited:
-                    new_task = asyncio.create_task(fetch(url))
-                    tasks.add(new_task)
+        mb = 1024 * 1024
+        main_rss = peak_rss()
+        if main_rss is not None:
+            line = f"最大RSS: {main_rss / mb:.1f} MB"
+            # 終了済みの子プロセス（抽出ワーカーなど）のうち最大のもの
+            children_rss = peak_rss(children=True)
+            if children_rss:
+                line += f" (子プロセス: 最大 {children_rss / mb:.1f} MB)"
+            print(line)
+        line = f"処理中のHTMLの最大: {self.memory_budget.peak_in_flight_bytes / mb:.1f} MB"
+        if self.memory_budget.limit_bytes is not None:
+            line += f" / 上限 {self.memory_budget.limit_bytes / mb:.1f} MB"
+        if self.memory_budget.enabled:
+            line += f" (上限による取得開始の待機 {self.memory_budget.waits} 回)"
+        print(line)
+        if self.truncated_pages:
+            print(f"上限 ({self.max_page_bytes / mb:.1f} MB) を超えたため切り詰めたページ: {len(self.truncated_pages)}")
+            for url in self.truncated_pages:
+                print(f"  - {url}")
+        print("-" * 40)
+
+    async def process_queue(self):
+        """
+        max_concurrent 個のワーカーで、フロンティアと再試行のキューのURLを処理します。
+        ページ数の枠はURLを取り出す時点で確保し、枠を使い切ったら処理中のページを待って終了します。
+        同時に実行するページ数は、適応的な並列数コントローラで制限します。
+        """
+        self.dispatcher = PageDispatcher(
+            self.frontier_backend,
+            self.retry_queue,
+            self.concurrency,
+            crawl=lambda url, retry: self.crawl_page(url, retry=retry, reserved=True),
+            reserve=self._reserve,
+            admit=self._admit,
+            exhausted=self.url_manager.limit_reached,
+            workers=self.max_concurrent,
+            # 共有フロンティアでは、他のワーカーが処理中のページから新しいURLが見つかるか、期限切れのURLが戻るのを確認する
+            poll_interval=FRONTIER_POLL_INTERVAL,
+            breaker=self.breaker,
+            give_up=self._give_up,
+        )
+        await self.dispatcher.run()
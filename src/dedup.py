@@ -0,0 +1,189 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from .logger import setup_logger
+from .output_sink import SOURCE_PREFIX
+
+logger = setup_logger(__name__)
+
+# off: 判定しない / exact: 本文が完全に一致するページのみ / near: SimHash による類似ページも含める
+DEDUP_MODES = ("off", "exact", "near")
+
+FINGERPRINT_BITS = 64
+
+_TOKEN_RE = re.compile(r"\w+")
+# コードでは記号も意味を持つため、単語に加えて記号も1文字ずつトークンにする
+_CODE_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# フェンスで囲まれたコードブロックとインラインコード
+_CODE_RE = re.compile(r"```.*?```|~~~.*?~~~|`[^`\n]+`", re.S)
+_SPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class Fingerprint:
+    """
+    ページ本文の指紋。exact は正規化した本文のハッシュ、simhash は64ビットの SimHash です。
+    """
+    exact: str
+    simhash: int
+    tokens: int
+
+
+@dataclass
+class DuplicateMatch:
+    """
+    重複と判定されたページの照合結果。kind は "exact" または "near"、distance はハミング距離です。
+    """
+    canonical: str
+    kind: str
+    distance: int = 0
+
+
+def _strip_source(markdown: str) -> str:
+    if markdown.startswith(SOURCE_PREFIX):
+        return markdown.split("\n", 1)[1] if "\n" in markdown else ""
+    return markdown
+
+
+def _segments(markdown: str):
+    """
+    Markdownを (コードかどうか, テキスト) の列に分けます。
+    """
+    position = 0
+    for match in _CODE_RE.finditer(markdown):
+        yield False, markdown[position:match.start()]
+        yield True, match.group()
+        position = match.end()
+    yield False, markdown[position:]
+
+
+def tokenize(markdown: str) -> List[str]:
+    """
+    Markdownから先頭のソースURL行を除き、単語の列を返します。
+    文章は小文字化し、記号や空白・改行の違いを無視します。コードは大文字・小文字を区別し、記号もトークンに含めます。
+    """
+    tokens = []
+    for is_code, text in _segments(_strip_source(markdown)):
+        # コードを囲む ``` や ` は記号として数えない
+        tokens.extend(_CODE_TOKEN_RE.findall(text.strip("`~")) if is_code else _TOKEN_RE.findall(text.lower()))
+    return tokens
+
+
+def normalize(markdown: str) -> str:
+    """
+    完全一致の判定に使う本文を返します。先頭のソースURL行を除き、空白・改行の違いと、文章の大文字・小文字の違いを無視します。
+    """
+    parts = (text if is_code else text.lower() for is_code, text in _segments(_strip_source(markdown)))
+    return _SPACE_RE.sub(" ", "".join(parts)).strip()
+
+
+def simhash(tokens: List[str], shingle_size: int = 3) -> int:
+    """
+    連続する shingle_size 単語（シングル）の集合から64ビットの SimHash を計算します。
+
+    各シングルのハッシュの各ビットを多数決で決めます。ビットごとに全ハッシュを走査する代わりに、
+    バイト位置ごとのバイト値の出現数を数えてから最後にビットへ展開するため、1シングルあたりの処理は8回で済みます。
+    """
+    if len(tokens) < shingle_size:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+
+    byte_counts = [[0] * 256 for _ in range(FINGERPRINT_BITS // 8)]
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=FINGERPRINT_BITS // 8).digest()
+        for position, byte in enumerate(digest):
+            byte_counts[position][byte] += 1
+
+    value = 0
+    for position, counts in enumerate(byte_counts):
+        for bit in range(8):
+            ones = sum(count for byte, count in enumerate(counts) if byte >> bit & 1)
+            if ones * 2 > len(shingles):
+                value |= 1 << (position * 8 + bit)
+    return value
+
+
+def fingerprint(markdown: str) -> Fingerprint:
+    """
+    ページ本文の指紋を計算します。
+    """
+    tokens = tokenize(markdown)
+    exact = hashlib.sha256(normalize(markdown).encode("utf-8")).hexdigest()
+    return Fingerprint(exact, simhash(tokens), len(tokens))
+
+
+class DuplicateIndex:
+    """
+    抽出済みの本文から、同じ内容または非常によく似た内容のページを検出する指紋の索引。
+
+    完全一致は正規化した本文のハッシュで、類似ページは SimHash のハミング距離が max_distance 以下かで判定します。
+    SimHash は max_distance + 1 個のバンドに分けて索引するため（鳩の巣原理により、距離が max_distance 以下なら
+    少なくとも1つのバンドが一致する）、全ページとの比較をせずに候補を絞り込めます。
+    max_distance=None の場合は完全一致のみを判定します。
+    単語数が min_tokens 未満の短いページは、見出しだけのページなどを誤って統合しないよう判定の対象外です。
+    """
+    def __init__(self, max_distance: Optional[int] = 3, min_tokens: int = 20):
+        self.max_distance = max_distance
+        self.min_tokens = min_tokens
+        self.band_count = max_distance + 1 if max_distance is not None else 0
+        self.band_bits = FINGERPRINT_BITS // self.band_count if self.band_count else 0
+
+        self.exact: Dict[str, str] = {}
+        self.bands: List[Dict[int, list]] = [{} for _ in range(self.band_count)]
+        # 重複と判定されたURL → 同じ内容として出力済みのURL
+        self.aliases: Dict[str, str] = {}
+        self.checked = 0
+
+    @property
+    def duplicates(self) -> int:
+        return len(self.aliases)
+
+    @property
+    def ratio(self) -> float:
+        """
+        判定したページのうち重複だったものの割合。
+        """
+        return self.duplicates / self.checked if self.checked else 0.0
+
+    def _band_keys(self, value: int) -> List[int]:
+        mask = (1 << self.band_bits) - 1
+        return [value >> (i * self.band_bits) & mask for i in range(self.band_count)]
+
+    def check(self, url: str, markdown: str, page_fingerprint: Optional[Fingerprint] = None) -> Optional[DuplicateMatch]:
+        """
+        ページが既存のページと重複していれば照合結果を返し、別名として記録します。
+        重複していなければ索引に追加して None を返します。
+        計算済みの指紋（抽出ワーカーで計算したものなど）を page_fingerprint に渡すと、本文からの計算を省略します。
+        """
+        if page_fingerprint is None:
+            page_fingerprint = fingerprint(markdown)
+        if page_fingerprint.tokens < self.min_tokens:
+            return None
+        self.checked += 1
+
+        match = None
+        canonical = self.exact.get(page_fingerprint.exact)
+        if canonical is not None:
+            match = DuplicateMatch(canonical, "exact")
+        elif self.band_count:
+            match = self._find_near(page_fingerprint.simhash)
+
+        if match is not None:
+            self.aliases[url] = match.canonical
+            return match
+
+        self.exact[page_fingerprint.exact] = url
+        for band, key in zip(self.bands, self._band_keys(page_fingerprint.simhash)):
+            band.setdefault(key, []).append((page_fingerprint.simhash, url))
+        return None
+
+    def _find_near(self, value: int) -> Optional[DuplicateMatch]:
+        best = None
+        for band, key in zip(self.bands, self._band_keys(value)):
+            for candidate, url in band.get(key, ()):
+                distance = (candidate ^ value).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best.distance):
+                    best = DuplicateMatch(url, "near", distance)
+        return best
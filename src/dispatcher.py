@@ -0,0 +1,207 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+from .frontier_backend import FrontierBackend
+from .logger import setup_logger
+from .rate_limiter import AdaptiveConcurrency
+from .retry_policy import CircuitBreaker, CircuitOpenError, RetryQueue
+
+logger = setup_logger(__name__)
+
+
+class PageDispatcher:
+    """
+    決まった数のワーカーコルーチンで、フロンティアのURLを優先度順に取り出して処理するディスパッチャー。
+
+    URLごとにタスクを作らないため、フロンティアがどれだけ大きくてもタスク数は workers 個に収まります。
+    ワーカーは再試行の時刻が来たURLを先に、なければ backend.lease() で新しいURLを取り出し、
+    reserve() でページ数の枠を確保できたURLだけを crawl(url, retry) に渡します。枠の確保は取り出しと
+    同じ箇所で行うため、並列に処理していても max_pages を超えて取得を始めることはありません。
+
+    枠を使い切った（exhausted() が True の）間は新しいURLを取り出さず、処理中のページと待機中の再試行が
+    全て終わった時点で全ワーカーを終了します（制限で戻されたページなどで枠が空けば、取り出しを再開します）。
+    実行枠は concurrency で制御し、処理するURLが決まってから確保します。admit を渡した場合は、
+    実行枠を確保する前に admit(url) で取得開始までの待機（レート制限やメモリの上限）を済ませるため、
+    待っている間に実行枠を占有せず、並列数コントローラが観測するレイテンシにも待機が含まれません。
+
+    breaker を渡した場合は、枠を確保する前にホストへのリクエストを止めていないかを確かめます。
+    止めている間は取り出したURLを1件だけ手元に置き、それ以上は取り出さずに止めている時間が過ぎるのを待ちます
+    （クロールするホストは1つのため）。再試行のURLは、止めている時間の分だけ再試行のキューで待たせます。
+    回復の確認に失敗し続けてリクエストを諦めたホストのURLは、取り出したものも再試行を待っていたものも
+    枠を確保せずに give_up(url, 理由) に渡し、取得できなかったページとして完了させます。
+
+    共有フロンティアでは、処理中・再試行待ち・手元に置いているURLの貸し出しの期限を lease_timeout の
+    1/3 ごとに延ばし、長い待機の間に他のワーカーへ回されないようにします。
+    """
+    def __init__(self, backend: FrontierBackend, retry_queue: RetryQueue, concurrency: AdaptiveConcurrency,
+                 crawl: Callable[[str, bool], Awaitable], reserve: Callable[[str], Awaitable[bool]],
+                 exhausted: Callable[[], bool], workers: int, poll_interval: float = 0.5,
+                 breaker: Optional[CircuitBreaker] = None,
+                 give_up: Optional[Callable[[str, str], Awaitable]] = None,
+                 admit: Optional[Callable[[str], Awaitable]] = None):
+        self.backend = backend
+        self.retry_queue = retry_queue
+        self.concurrency = concurrency
+        self.crawl = crawl
+        self.reserve = reserve
+        self.exhausted = exhausted
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.breaker = breaker
+        self.give_up = give_up
+        self.admit = admit
+
+        # リクエストを止めているホストのURLで、借りたまま（枠は確保せずに）止めている時間が過ぎるのを待つもの
+        self.parked: Optional[str] = None
+        self.parked_wait: Optional[float] = None
+        self.abandoned_hosts = set()
+
+        # 処理するURLが決まってから crawl() を終えるまでのURL
+        self.active = set()
+        # 処理するURLが決まってから crawl() を終えるまでのワーカー数
+        self.busy = 0
+        self.peak_busy = 0
+        self.dispatched = 0
+        self.done = False
+        self.changed = asyncio.Condition()
+
+    async def run(self):
+        """
+        ワーカーを起動し、処理するURLがなくなるまで待ちます。
+        """
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.backend.shared:
+            workers.append(asyncio.create_task(self._renew_leases()))
+        try:
+            await asyncio.gather(*workers[:self.workers])
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def held_urls(self) -> List[str]:
+        """
+        このワーカーが借りたまま完了も返却もしていないURLの一覧を返します。
+        """
+        held = list(self.active) + self.retry_queue.urls()
+        if self.parked is not None:
+            held.append(self.parked)
+        return held
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.backend.lease_timeout / 3)
+            try:
+                await self.backend.renew(self.held_urls())
+            except Exception as e:
+                logger.warning(f"URLの貸し出しの期限を延ばせませんでした: {e}")
+
+    async def _worker(self):
+        while True:
+            job = await self._next()
+            if job is None:
+                return
+            url, retry = job
+            try:
+                if self.admit is not None:
+                    await self.admit(url)
+                await self.concurrency.acquire()
+                try:
+                    await self.crawl(url, retry)
+                finally:
+                    await self.concurrency.release()
+            except Exception as e:
+                logger.error(f"タスクエラー: {e}")
+            finally:
+                self.busy -= 1
+                self.active.discard(url)
+                # 処理したページで見つかったURLや、再試行・返却されたURLを待っているワーカーを起こす
+                async with self.changed:
+                    self.changed.notify_all()
+
+    async def _next(self) -> Optional[Tuple[str, bool]]:
+        """
+        次に処理する (URL, 再試行かどうか) を返します。処理するURLがもう現れない場合は None を返します。
+        """
+        while not self.done:
+            url = self.retry_queue.pop_due()
+            if url is not None:
+                blocked = self._check(url)
+                if blocked is None:
+                    return self._dispatch(url, True)
+                if blocked.gave_up:
+                    await self.give_up(url, str(blocked))
+                else:
+                    # 止めている間の待機は試行回数に数えない
+                    self.retry_queue.push(url, blocked.retry_after)
+                continue
+
+            if self.exhausted():
+                if self.parked is not None:
+                    # 枠が空いたときに取り直せるよう、フロンティアに返す
+                    await self.backend.requeue(self.parked)
+                    self.parked = None
+            else:
+                url, self.parked = self.parked, None
+                if url is None:
+                    url = await self.backend.lease()
+                if url is not None:
+                    blocked = self._check(url)
+                    if blocked is None:
+                        if await self.reserve(url):
+                            return self._dispatch(url, False)
+                        if self.breaker is not None:
+                            # 回復の確認に使うはずだったページを処理しないので、次のページで確かめ直す
+                            self.breaker.release(url)
+                    elif blocked.gave_up:
+                        self._abandon(blocked.host)
+                        await self.give_up(url, str(blocked))
+                    else:
+                        self.parked = url
+                        self.parked_wait = blocked.retry_after
+                    if self.parked is None:
+                        continue
+
+            if (self.busy == 0 and not self.retry_queue and self.parked is None
+                    and (self.exhausted() or await self.backend.finished())):
+                self.done = True
+                break
+
+            # 処理中のページが終わるか、再試行の時刻が来るか、止めている時間が過ぎるか、
+            # （共有フロンティアで）他のワーカーの進捗を確認する時刻まで待つ
+            timeout = self.poll_interval
+            for due in (self.retry_queue.next_due_in(), self.parked_wait if self.parked is not None else None):
+                if due is not None:
+                    timeout = min(timeout, due)
+            async with self.changed:
+                try:
+                    await asyncio.wait_for(self.changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+        async with self.changed:
+            self.changed.notify_all()
+        return None
+
+    def _check(self, url: str) -> Optional[CircuitOpenError]:
+        """
+        URLのホストへリクエストしてよければ None を、止めている場合はその理由の例外を返します。
+        """
+        if self.breaker is None:
+            return None
+        try:
+            self.breaker.check(url)
+        except CircuitOpenError as e:
+            return e
+        return None
+
+    def _abandon(self, host: str):
+        if host not in self.abandoned_hosts:
+            self.abandoned_hosts.add(host)
+            logger.warning(f"{host} へのリクエストを諦めたため、残りのURLは取得しません")
+
+    def _dispatch(self, url: str, retry: bool) -> Tuple[str, bool]:
+        self.busy += 1
+        self.active.add(url)
+        self.peak_busy = max(self.peak_busy, self.busy)
+        self.dispatched += 1
+        return url, retry
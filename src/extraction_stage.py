@@ -0,0 +1,187 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, Optional
+from .logger import setup_logger
+from .dedup import Fingerprint, fingerprint
+from .extractor import ContentExtractor, ExtractionRules
+from .metrics import CrawlMetrics
+
+logger = setup_logger(__name__)
+
+# ワーカープロセスごとに1つだけ生成される抽出器
+_worker_extractor: Optional[ContentExtractor] = None
+
+
+def _init_worker(rules: Optional[ExtractionRules] = None):
+    """
+    プロセスプールの各ワーカーで一度だけ呼ばれ、抽出器を初期化します。
+    """
+    global _worker_extractor
+    _worker_extractor = ContentExtractor(rules)
+
+
+def _extract(extractor: ContentExtractor, html_content: str, source_url: str, with_fingerprint: bool) -> tuple:
+    started = time.perf_counter()
+    markdown = extractor.extract(html_content, source_url)
+    page_fingerprint = fingerprint(markdown) if with_fingerprint else None
+    return markdown, page_fingerprint, time.perf_counter() - started
+
+
+def _extract_in_worker(html_content: str, source_url: str, with_fingerprint: bool = False) -> tuple:
+    """
+    ワーカープロセス内でHTMLをMarkdownに変換し、(変換結果, 本文の指紋, 所要時間（秒）) を返します。
+    指紋は with_fingerprint が True の場合のみ計算します（それ以外は None）。
+    """
+    return _extract(_worker_extractor, html_content, source_url, with_fingerprint)
+
+
+class ExtractionStage:
+    """
+    HTML→Markdown変換をイベントループの外（プロセスプール）で実行するパイプラインステージ。
+
+    生HTMLは有界キューを経由して渡されます。変換が追いつかない場合は submit() が
+    待機する（バックプレッシャー）ため、メモリ上に溜まるHTMLの量は一定に保たれます。
+    workers=0 の場合はプロセスプールを使わず、イベントループ上で直接変換します。
+
+    fingerprints=True の場合は、重複判定に使う本文の指紋も変換と同じワーカーで計算し、
+    on_result(url, markdown, fingerprint) に渡します（False の場合は None）。
+    変換または on_result() が失敗したページは on_failure() に渡し、消費タスクは次のページの処理を続けます。
+    ワーカープロセスが異常終了してプロセスプールが使えなくなった場合は、プールを作り直してページを1回だけ変換し直します。
+    """
+    def __init__(
+        self,
+        on_result: Callable[[str, str, Optional[Fingerprint]], Awaitable[None]],
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        metrics: Optional[CrawlMetrics] = None,
+        on_failure: Optional[Callable[[str], Awaitable[None]]] = None,
+        rules: Optional[ExtractionRules] = None,
+        fingerprints: bool = False,
+    ):
+        self.on_result = on_result
+        self.on_failure = on_failure
+        self.metrics = metrics
+        self.rules = rules
+        self.fingerprints = fingerprints
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_size = queue_size or max(self.workers, 1) * 2
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.consumers = []
+        self.inline_extractor: Optional[ContentExtractor] = None
+
+    async def start(self):
+        """
+        プロセスプールと消費タスクを起動します。
+        """
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+
+        if self.workers > 0:
+            self.executor = self._create_executor()
+            consumer_count = self.workers
+        else:
+            self.inline_extractor = ContentExtractor(self.rules)
+            consumer_count = 1
+
+        self.consumers = [asyncio.create_task(self._consume()) for _ in range(consumer_count)]
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Playwrightがスレッドを使うため、fork ではなく spawn でワーカーを起動する
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.rules,),
+        )
+
+    def _restart_executor(self, broken: ProcessPoolExecutor):
+        """
+        異常終了したプロセスプールを作り直します。複数の消費タスクが同じプールの異常に気づいても、作り直すのは1回だけです。
+        """
+        if self.executor is not broken:
+            return
+        logger.warning("抽出ワーカーが異常終了したため、プロセスプールを作り直します")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._create_executor()
+        if self.metrics:
+            self.metrics.inc("extraction_pool_restarts_total")
+
+    async def submit(self, url: str, html_content: str):
+        """
+        変換対象のHTMLをキューに投入します。キューが満杯の場合は空きが出るまで待機します。
+        """
+        await self.queue.put((url, html_content))
+
+    async def _consume(self):
+        """
+        キューからHTMLを取り出して変換し、結果をコールバックへ渡します。
+        """
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is None:
+                    return
+
+                url, html_content = item
+                try:
+                    markdown, page_fingerprint, elapsed = await self._extract(url, html_content)
+                except Exception as e:
+                    await self._fail(url, e, "extract", "コンテンツ抽出エラー")
+                    continue
+
+                if self.metrics:
+                    self.metrics.observe("extract", elapsed)
+
+                try:
+                    await self.on_result(url, markdown, page_fingerprint)
+                except Exception as e:
+                    await self._fail(url, e, "output", "変換結果の出力エラー")
+            finally:
+                self.queue.task_done()
+
+    async def _extract(self, url: str, html_content: str) -> tuple:
+        """
+        HTMLをMarkdownに変換し、(変換結果, 本文の指紋, 所要時間) を返します。
+        """
+        if not self.executor:
+            return _extract(self.inline_extractor, html_content, url, self.fingerprints)
+
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, _extract_in_worker, html_content, url, self.fingerprints)
+        except BrokenProcessPool:
+            # 同時に処理していた他のページの変換でワーカーが落ちた可能性もあるため、作り直したプールで1回だけやり直す
+            self._restart_executor(executor)
+            return await loop.run_in_executor(self.executor, _extract_in_worker, html_content, url, self.fingerprints)
+
+    async def _fail(self, url: str, error: Exception, stage: str, message: str):
+        logger.error(f"{message} {url}: {error}")
+        if self.metrics:
+            self.metrics.inc("errors_total", stage=stage, type=type(error).__name__)
+        if self.on_failure:
+            try:
+                await self.on_failure(url)
+            except Exception as e:
+                logger.error(f"失敗したページの後処理に失敗しました {url}: {e}")
+
+    async def close(self):
+        """
+        キューに残った処理を全て完了させてから、消費タスクとプロセスプールを停止します。
+        """
+        if self.queue is None:
+            return
+
+        for _ in self.consumers:
+            await self.queue.put(None)
+        await asyncio.gather(*self.consumers, return_exceptions=True)
+        self.consumers = []
+
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -1,37 +1,116 @@
-from bs4 import BeautifulSoup
+from dataclasses import asdict, dataclass, replace
+from typing import Optional, Tuple
+from bs4 import BeautifulSoup, Tag
+import hashlib
+import json
 import markdownify
 import re
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# lxml があればそちらで解析する（html.parser より数倍速い）
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+# 同じHTMLから得られるMarkdownが変わる変更をしたら上げる（キャッシュ済みのMarkdownを使わなくなる）
+EXTRACTOR_VERSION = 2
+
+
+@dataclass
+class ExtractionRules:
+    """
+    本文抽出のルール。
+
+    noise_tags のタグと、class が noise_class_pattern に一致する要素（行番号など）はノイズとして除去します。
+    本文には main_tags の順で最初に見つかったタグ、なければ class が content_class_pattern に一致する最初の div、
+    それもなければ body を使います。parser を省略した場合は DEFAULT_PARSER で解析します。
+    """
+    noise_tags: Tuple[str, ...] = ("script", "style", "nav", "footer", "iframe", "noscript")
+    # select-none: Tailwindなどのユーティリティクラス（行番号によく使われる）
+    # line-number系: 一般的なシンタックスハイライターの行番号クラス
+    noise_class_pattern: Optional[str] = r"line-number|linenumber|gutter|select-none"
+    main_tags: Tuple[str, ...] = ("main", "article")
+    content_class_pattern: Optional[str] = r"content|main|body"
+    heading_style: str = "ATX"
+    parser: Optional[str] = None
+
+
+def extraction_key(rules: Optional[ExtractionRules] = None) -> str:
+    """
+    抽出器のバージョンと抽出のルールから、同じHTMLに対して同じMarkdownが得られる条件を表すキーを返します。
+    """
+    rules = rules or ExtractionRules()
+    resolved = replace(rules, parser=rules.parser or DEFAULT_PARSER)
+    payload = json.dumps([EXTRACTOR_VERSION, asdict(resolved)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
 class ContentExtractor:
     """
     HTMLからコンテンツを抽出し、クリーンアップしてMarkdownに変換するクラス。
+
+    HTMLの解析は1回だけ行い、ノイズの検出と本文の特定は木を1度たどるだけで済ませます。
+    特定した本文の部分木は文字列に戻さず、そのまま markdownify で変換します。
     """
-    def __init__(self):
-        pass
+    def __init__(self, rules: Optional[ExtractionRules] = None):
+        self.rules = rules or ExtractionRules()
+        self.parser = self.rules.parser or DEFAULT_PARSER
+        self.noise_tags = frozenset(self.rules.noise_tags)
+        self.noise_class = re.compile(self.rules.noise_class_pattern, re.I) if self.rules.noise_class_pattern else None
+        # 本文の候補 → 優先順位（小さいほど優先）。class で探す div は main_tags の後に回す
+        self.main_ranks = {name: rank for rank, name in enumerate(self.rules.main_tags)}
+        self.content_class = (re.compile(self.rules.content_class_pattern, re.I)
+                              if self.rules.content_class_pattern else None)
+        self.converter = markdownify.MarkdownConverter(heading_style=self.rules.heading_style)
+
+    def _has_class(self, tag: Tag, pattern) -> bool:
+        classes = tag.get("class")
+        if not classes:
+            return False
+        if isinstance(classes, str):
+            classes = [classes]
+        return any(pattern.search(name) for name in classes)
+
+    def _scan(self, root: Tag) -> tuple:
+        """
+        木を文書順に1度だけたどり、(ノイズ要素の一覧, 本文の要素) を返します。
+        ノイズ要素の内側はたどらないため、その中のタグが本文に選ばれることはありません。
+        """
+        noise = []
+        best, best_rank = None, len(self.main_ranks) + 1
+        div_rank = len(self.main_ranks)
+        stack = [root]
+        while stack:
+            tag = stack.pop()
+            name = tag.name
+            if name in self.noise_tags or (self.noise_class is not None and self._has_class(tag, self.noise_class)):
+                noise.append(tag)
+                continue
+            rank = self.main_ranks.get(name)
+            if rank is None and name == "div" and best_rank > div_rank and self.content_class is not None \
+                    and self._has_class(tag, self.content_class):
+                rank = div_rank
+            if rank is not None and rank < best_rank:
+                best, best_rank = tag, rank
+            stack.extend(child for child in reversed(tag.contents) if isinstance(child, Tag))
+        return noise, best
 
     def extract(self, html_content: str, source_url: str) -> str:
         """
         HTMLを解析し、ノイズを除去してMarkdownに変換します。
         冒頭にソースURLのヘッダーを追加します。
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        # ノイズとなるタグを削除
-        for tag in soup(['script', 'style', 'nav', 'footer', 'iframe', 'noscript']):
-            tag.decompose()
+        soup = BeautifulSoup(html_content, self.parser)
 
-        # 行番号や選択不可の要素（ノイズ）を削除
-        # select-none: Tailwindなどのユーティリティクラス（行番号によく使われる）
-        # line-number系: 一般的なシンタックスハイライターの行番号クラス
-        for tag in soup.find_all(class_=re.compile(r'line-number|linenumber|gutter|select-none', re.I)):
-            tag.decompose()
+        noise, main_content = self._scan(soup)
+        # 解析木は変換後に捨てるため、部分木を再帰的に破棄する decompose() ではなく切り離すだけにする
+        for tag in noise:
+            tag.extract()
 
-        # メインコンテンツの特定を試みる
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=re.compile(r'content|main|body', re.I))
-        
         # 特定のメインコンテナが見つからない場合はbodyをフォールバックとして使用
         if not main_content:
             main_content = soup.body
@@ -40,8 +119,8 @@ class ContentExtractor:
             logger.warning(f"コンテンツが見つかりませんでした: {source_url}")
             return f"Source URL: {source_url}\n\n(コンテンツが見つかりませんでした)"
 
-        # Markdownに変換
-        md = markdownify.markdownify(str(main_content), heading_style="ATX")
+        # 文字列に戻して解析し直さず、部分木をそのままMarkdownに変換する
+        md = self.converter.convert_soup(main_content)
 
         # 過剰な改行を整理
         md = re.sub(r'\n{3,}', '\n\n', md).strip()
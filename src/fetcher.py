@@ -0,0 +1,349 @@
+import asyncio
+import re
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
+from urllib.parse import urljoin, urlparse
+import httpx
+from bs4 import BeautifulSoup
+from .extractor import DEFAULT_PARSER
+from .logger import setup_logger
+from .memory_budget import mark_truncated
+from .page_cache import content_hash
+from .rate_limiter import THROTTLE_STATUSES, ThrottledError, parse_retry_after
+from .retry_policy import TransientError
+
+logger = setup_logger(__name__)
+
+FETCH_MODES = ("auto", "http", "browser")
+
+USER_AGENT = "Mozilla/5.0 (compatible; docs2notebook-crawler/0.1)"
+
+# SPAのマウントポイントとしてよく使われる要素のID
+SPA_ROOT_IDS = re.compile(r'^(root|app|__next|__nuxt|___gatsby|svelte)$', re.I)
+
+# リンクがどの領域にあったかを判定する要素（いずれにも含まれなければ "body"）
+LINK_REGIONS = ("nav", "header", "footer", "aside", "main", "article")
+
+# アンカーテキストとして保持する最大文字数
+MAX_LINK_TEXT = 200
+
+# ブラウザ上でリンクを一括で取り出すスクリプト
+# ページ内で重複除去とクロール範囲（ホスト・スキーム・ベースパス）の絞り込みを済ませ、
+# [URL, アンカーテキスト, 領域] の配列だけをPlaywright経由で受け渡す
+LINK_SCRIPT = """
+({host, basePath, foldCase}) => {
+    const regions = %s;
+    const seen = new Set();
+    const links = [];
+    for (const a of document.querySelectorAll('a[href]')) {
+        let url;
+        try {
+            url = new URL(a.href);
+        } catch (e) {
+            continue;
+        }
+        const path = foldCase ? url.pathname.toLowerCase() : url.pathname;
+        if ((url.protocol !== 'http:' && url.protocol !== 'https:') || url.host !== host
+                || !path.startsWith(basePath)) {
+            continue;
+        }
+        url.hash = '';
+        const href = url.href;
+        if (seen.has(href)) {
+            continue;
+        }
+        seen.add(href);
+        const region = a.closest(regions);
+        links.push([href, (a.textContent || '').trim().slice(0, %d), region ? region.localName : 'body']);
+    }
+    const canonical = document.querySelector('link[rel="canonical"][href]');
+    return {links, canonical: canonical ? canonical.href : null};
+}
+""" % (repr(", ".join(LINK_REGIONS)), MAX_LINK_TEXT)
+
+
+class PageLink(NamedTuple):
+    """
+    ページ内のリンク1件。region はリンクを含んでいた領域（nav / main など）です。
+    """
+    url: str
+    text: str = ""
+    region: str = "body"
+
+
+@dataclass
+class StaticPage:
+    """
+    HTTPクライアントで取得し、そのまま抽出可能と判定されたページ。
+    not_modified が True の場合は、キャッシュ済みの内容から変化がないことを示します（html は空）。
+    canonical は <link rel="canonical"> で指定された正規URLです（指定がなければ None）。
+    truncated が True の場合は、ページごとの上限を超えたため html を切り詰めたことを示します。
+    """
+    url: str
+    html: str
+    links: list = field(default_factory=list)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    not_modified: bool = False
+    canonical: Optional[str] = None
+    truncated: bool = False
+
+    @property
+    def hrefs(self) -> list:
+        return [link.url for link in self.links]
+
+
+def looks_like_js_shell(html_content: str, min_text_chars: int = 200, min_text_ratio: float = 0.01) -> bool:
+    """
+    静的HTMLがJavaScriptの実行を前提とした「空の殻」かどうかを判定します。
+
+    以下のいずれかに該当する場合に True を返します。
+    - body が存在しない、または本文テキストが min_text_chars 未満
+    - main / article 要素が存在するが中身が空
+    - SPAのマウントポイント（#root, #app など）があり、HTML全体に対する本文の割合が min_text_ratio 未満
+    """
+    return _is_js_shell(BeautifulSoup(html_content, DEFAULT_PARSER), len(html_content), min_text_chars, min_text_ratio)
+
+
+def _is_js_shell(soup: BeautifulSoup, html_length: int, min_text_chars: int = 200,
+                 min_text_ratio: float = 0.01) -> bool:
+    # 判定のために script などを取り除くため、soup は変更される
+    body = soup.body
+    if body is None:
+        return True
+
+    for tag in body(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+
+    text_length = len(body.get_text(strip=True))
+    if text_length < min_text_chars:
+        return True
+
+    for container in body.find_all(['main', 'article'], limit=2):
+        if not container.get_text(strip=True):
+            return True
+
+    has_spa_root = body.find(id=SPA_ROOT_IDS) is not None
+    if has_spa_root and text_length / max(html_length, 1) < min_text_ratio:
+        return True
+
+    return False
+
+
+def extract_links(html_content: str, page_url: str) -> tuple:
+    """
+    静的HTMLから a[href] と <link rel="canonical"> を取り出し、(リンク, 正規URL) を返します。
+    リンクはフラグメントを除いた絶対URLで重複を除き、PageLink として最初に現れた順に並べます。
+    """
+    return _links_from_soup(BeautifulSoup(html_content, DEFAULT_PARSER), page_url)
+
+
+def _links_from_soup(soup: BeautifulSoup, page_url: str) -> tuple:
+    base = soup.find('base', href=True)
+    base_url = urljoin(page_url, base['href']) if base else page_url
+    links = {}
+    for a in soup.find_all('a', href=True):
+        url = urljoin(base_url, a['href']).split('#', 1)[0]
+        if url and url not in links:
+            region = a.find_parent(LINK_REGIONS)
+            links[url] = PageLink(url, a.get_text(strip=True)[:MAX_LINK_TEXT], region.name if region else "body")
+    link = soup.find('link', rel='canonical', href=True)
+    return list(links.values()), urljoin(base_url, link['href']) if link else None
+
+
+def analyze_static_page(html_content: str, page_url: str, detect_shell: bool) -> tuple:
+    """
+    静的HTMLを1回だけ解析し、(JavaScriptが必要な「空の殻」か, リンク, 正規URL) を返します。
+    detect_shell が False の場合は殻の判定を省略します（常に False）。
+    """
+    soup = BeautifulSoup(html_content, DEFAULT_PARSER)
+    # 殻の判定は soup から script などを取り除くため、先にリンクを取り出す
+    links, canonical = _links_from_soup(soup, page_url)
+    if detect_shell and _is_js_shell(soup, len(html_content)):
+        return True, [], None
+    return False, links, canonical
+
+
+class HybridFetcher:
+    """
+    まずプール済みのHTTPクライアントで取得を試み、JavaScriptが必要なページだけを
+    Playwrightへ回すためのフェッチャー。
+
+    どちらの方式でうまくいったかをパスのプレフィックス単位で記憶し、
+    JSが必要と分かったプレフィックスでは以降HTTPでの試行を省略します。
+    max_page_bytes を指定した場合は、レスポンスの本文をそのバイト数までしか読み込まず、超えた分を切り捨てます。
+    """
+    def __init__(self, base_path: str = "/", mode: str = "auto", timeout: float = 30.0, max_connections: int = 10,
+                 max_page_bytes: Optional[int] = None):
+        if mode not in FETCH_MODES:
+            raise ValueError(f"不明な取得モードです: {mode} (指定可能: {', '.join(FETCH_MODES)})")
+
+        self.base_path = base_path
+        self.mode = mode
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_page_bytes = max_page_bytes
+
+        self.client: Optional[httpx.AsyncClient] = None
+        # プレフィックスごとに成功した方式 ("http" または "browser")
+        self.prefix_modes = {}
+
+    async def start(self):
+        """
+        HTTPクライアント（コネクションプール）を初期化します。
+        """
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=self.timeout,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+
+    async def close(self):
+        """
+        HTTPクライアントを閉じます。
+        """
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def prefix_for(self, url: str) -> str:
+        """
+        ベースパス直下の最初のパスセグメントまでを、方式を記憶する単位として返します。
+        """
+        path = urlparse(url).path
+        rest = path[len(self.base_path):] if path.startswith(self.base_path) else path
+        first_segment = rest.lstrip('/').split('/', 1)[0]
+        return self.base_path.rstrip('/') + '/' + first_segment
+
+    def should_try_http(self, url: str) -> bool:
+        """
+        このURLに対してHTTPでの取得を試みるべきかを判定します。
+        """
+        if self.mode == "http":
+            return True
+        if self.mode == "browser":
+            return False
+        return self.prefix_modes.get(self.prefix_for(url)) != "browser"
+
+    @property
+    def uses_browser(self) -> bool:
+        """
+        このモードでブラウザを使う可能性があるかどうか。
+        """
+        return self.mode != "http"
+
+    def record(self, url: str, mode: str):
+        """
+        URLのプレフィックスに対して、うまくいった取得方式を記録します。
+        """
+        prefix = self.prefix_for(url)
+        if self.prefix_modes.get(prefix) != mode:
+            logger.debug(f"取得方式を記録: {prefix} -> {mode}")
+        self.prefix_modes[prefix] = mode
+
+    async def fetch_static(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                           known_hash: Optional[str] = None, timeout: Optional[float] = None) -> Optional[StaticPage]:
+        """
+        HTTPでページを取得します。
+
+        そのまま抽出できるHTMLであれば StaticPage を返します。
+        取得に失敗した場合やJavaScriptが必要と判定した場合は None を返し、
+        呼び出し側はPlaywrightでの描画にフォールバックします（http モードを除く）。
+
+        キャッシュ済みの etag / last_modified を渡すと条件付きリクエストを送り、
+        304 が返るか本文のハッシュが known_hash と一致すれば not_modified=True の StaticPage を返します。
+
+        サーバーから 429 / 503 が返った場合は ThrottledError を、その他の 5xx や接続エラーの場合は
+        TransientError を送出します（ブラウザで描画し直しても同じサーバーに接続するため、再試行に任せる）。
+        timeout を指定した場合は、クライアントの既定値の代わりにその秒数をタイムアウトとします。
+        """
+        await self.start()
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            # 本文はストリームで読み込み、ページごとの上限を超えた分は受信しない
+            request_timeout = self.timeout if timeout is None else timeout
+            async with self.client.stream("GET", url, headers=headers, timeout=request_timeout) as response:
+                if response.status_code < 300 and "html" in response.headers.get("content-type", ""):
+                    body, truncated = await self._read_body(response)
+                else:
+                    body, truncated = b"", False
+        except httpx.TimeoutException:
+            # タイムアウトは並列数の調整に使うため呼び出し側へ伝える
+            raise
+        except (httpx.NetworkError, httpx.RemoteProtocolError) as e:
+            raise TransientError(f"{type(e).__name__}: {e}") from e
+        except httpx.HTTPError as e:
+            logger.warning(f"HTTP取得に失敗しました {url}: {e}")
+            return None
+
+        validators = {
+            "etag": response.headers.get("etag", etag),
+            "last_modified": response.headers.get("last-modified", last_modified),
+        }
+        if response.status_code == 304:
+            return StaticPage(url=str(response.url), html="", not_modified=True,
+                              content_hash=known_hash, **validators)
+
+        if response.status_code in THROTTLE_STATUSES:
+            # ブラウザにフォールバックしても同じ制限を受けるので、呼び出し側で待機させる
+            raise ThrottledError(response.status_code, parse_retry_after(response.headers.get("retry-after")))
+
+        if response.status_code >= 500:
+            raise TransientError(f"HTTP {response.status_code}")
+
+        if response.status_code >= 400:
+            logger.warning(f"HTTPステータス {response.status_code}: {url}")
+            return None
+
+        content_type = response.headers.get("content-type", "")
+        if "html" not in content_type:
+            logger.debug(f"HTML以外のコンテンツのためスキップします ({content_type}): {url}")
+            return None
+
+        body_hash = content_hash(body)
+        if known_hash and body_hash == known_hash:
+            return StaticPage(url=str(response.url), html="", not_modified=True,
+                              content_hash=body_hash, **validators)
+
+        html_content = body.decode(response.encoding or "utf-8", errors="replace")
+        if truncated:
+            logger.warning(f"ページが上限 ({self.max_page_bytes} バイト) を超えたため切り詰めます: {url}")
+            html_content = mark_truncated(html_content)
+        final_url = str(response.url)
+        # HTMLの解析はイベントループを止めないよう別スレッドで行う
+        is_shell, links, canonical = await asyncio.to_thread(
+            analyze_static_page, html_content, final_url, self.mode == "auto" and not truncated
+        )
+        if is_shell:
+            logger.info(f"JavaScriptによる描画が必要と判定しました: {url}")
+            self.record(url, "browser")
+            return None
+
+        self.record(url, "http")
+        return StaticPage(url=final_url, html=html_content, links=links, canonical=canonical,
+                          content_hash=body_hash, truncated=truncated, **validators)
+
+    async def _read_body(self, response: httpx.Response) -> tuple:
+        """
+        レスポンスの本文を読み込み、(本文, 切り詰めたかどうか) を返します。
+        max_page_bytes を超えた時点で受信をやめ、超えた分は捨てます。
+        """
+        if self.max_page_bytes is None:
+            return await response.aread(), False
+        chunks = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            received += len(chunk)
+            if received > self.max_page_bytes:
+                return b"".join(chunks)[:self.max_page_bytes], True
+        return b"".join(chunks), False
@@ -0,0 +1,92 @@
+import heapq
+from collections import deque
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# fifo: 発見順 / depth: URLの階層が浅い順 / path: URLのパス順（同じディレクトリのページをまとめて取得）
+FRONTIER_ORDERS = ("fifo", "depth", "path")
+
+# 共通のプレフィックスで始まらないURLを、そのまま保持していることを示す印
+_FULL_URL = "\0"
+
+
+class Frontier:
+    """
+    クロール待ちのURLを保持する優先度付きキュー。
+
+    priority が小さいものから取り出し、同じ priority の中では order に従って並べます。
+    優先度（と depth の場合は階層）ごとのバケットに分けて保持し、ヒープには種類の少ないバケットのキーだけを積むため、
+    URL1件あたりの保持コストは、開始URLのオリジンとベースパスからなる共通のプレフィックスを除いた文字列1つ分で済みます。
+    バケットの中身は fifo / depth では投入順のキュー、path では文字列のヒープです。
+    """
+    def __init__(self, prefix: str, order: str = "fifo"):
+        if order not in FRONTIER_ORDERS:
+            raise ValueError(f"未対応のフロンティアの順序です: {order}")
+        self.prefix = prefix
+        self.order = order
+        self.buckets = {}
+        self.keys = []
+        self.size = 0
+
+    def _compact(self, url: str) -> str:
+        if url.startswith(self.prefix):
+            return url[len(self.prefix):]
+        return _FULL_URL + url
+
+    def _expand(self, suffix: str) -> str:
+        if suffix.startswith(_FULL_URL):
+            return suffix[1:]
+        return self.prefix + suffix
+
+    def push(self, url: str, priority: float = 0.0):
+        """
+        URLを追加します。priority が小さいほど先に取り出されます。
+        """
+        suffix = self._compact(url)
+        key = (priority, suffix.split("?", 1)[0].count("/")) if self.order == "depth" else priority
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [] if self.order == "path" else deque()
+            heapq.heappush(self.keys, key)
+        if self.order == "path":
+            heapq.heappush(bucket, suffix)
+        else:
+            bucket.append(suffix)
+        self.size += 1
+
+    def push_many(self, urls: list, priority: float = 0.0):
+        """
+        同じ priority の複数のURLをまとめて追加します。
+        """
+        if self.order != "fifo":
+            for url in urls:
+                self.push(url, priority)
+            return
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = deque()
+            heapq.heappush(self.keys, priority)
+        bucket.extend(self._compact(url) for url in urls)
+        self.size += len(urls)
+
+    def pop(self) -> str:
+        """
+        次にクロールするURLを取り出します。空の場合は IndexError を送出します。
+        """
+        if not self.keys:
+            raise IndexError("フロンティアが空です")
+        key = self.keys[0]
+        bucket = self.buckets[key]
+        suffix = heapq.heappop(bucket) if self.order == "path" else bucket.popleft()
+        if not bucket:
+            heapq.heappop(self.keys)
+            del self.buckets[key]
+        self.size -= 1
+        return self._expand(suffix)
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,538 @@
+import asyncio
+import contextlib
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+from urllib.parse import urlsplit
+from .frontier import FRONTIER_ORDERS, Frontier
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:
+    # redis パッケージがない環境（互換クライアントを渡す場合）では、クライアント側の同名の例外を使う想定
+    class WatchError(Exception):
+        pass
+
+# memory: 1プロセス内のみ / sqlite: 同じマシンの複数プロセスで共有 / redis: 複数のマシンで共有
+FRONTIER_BACKENDS = ("memory", "sqlite", "redis")
+
+# 借りたURLの完了報告がこの秒数を過ぎても届かなければ、ワーカーが落ちたとみなして他のワーカーに回す
+DEFAULT_LEASE_TIMEOUT = 300.0
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class FrontierBackend:
+    """
+    クロール待ちのURL（フロンティア）と、発見済み・取得済みのURLを管理するバックエンドの共通インターフェース。
+
+    ワーカーは lease() でURLを借り、処理が終わったら complete() で完了を、制限を受けて後で取り直す場合は
+    requeue() で返却を報告します。共有バックエンドでは、借りたURLは lease_timeout 秒以内に報告がなければ
+    他のワーカーに回されます。取得ページ数の上限（max_pages）は、URLを初めて貸し出す時点で全ワーカー共通の
+    枠から差し引くため、貸し出しの期限切れや requeue() で同じURLを再び貸し出しても二重には数えません。
+    """
+    # 複数のワーカーで共有するバックエンドかどうか
+    shared = False
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def add(self, urls: List[str], priority: float = 0.0) -> List[str]:
+        """
+        発見したURLを追加し、どのワーカーもまだ発見していなかったURLだけを返します。
+        """
+        raise NotImplementedError
+
+    async def lease(self) -> Optional[str]:
+        """
+        次にクロールするURLを借ります。今すぐ処理できるURLがなければ None を返します。
+        """
+        raise NotImplementedError
+
+    async def complete(self, url: str):
+        raise NotImplementedError
+
+    async def requeue(self, url: str):
+        raise NotImplementedError
+
+    async def renew(self, urls: Iterable[str]):
+        """
+        借りているURLの貸し出しの期限を延ばします。処理中のページや、再試行を待っているURLが
+        lease_timeout を過ぎて他のワーカーに回されないよう、借りている間は定期的に呼び出します。
+        """
+
+    async def finished(self) -> bool:
+        """
+        待機中のURLも、いずれかのワーカーが処理中のURLも残っていなければ True を返します。
+        """
+        raise NotImplementedError
+
+    async def stats(self) -> dict:
+        return {}
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryFrontierBackend(FrontierBackend):
+    """
+    1プロセス内で完結するバックエンド。
+
+    発見済み・取得済みのURLは UrlManager の集合で、ページ数の上限は UrlManager.limit_reached() で管理するため、
+    ここでは Frontier をそのまま使うだけです。
+    """
+    def __init__(self, frontier: Frontier):
+        self.frontier = frontier
+
+    async def add(self, urls: List[str], priority: float = 0.0) -> List[str]:
+        self.frontier.push_many(urls, priority)
+        return list(urls)
+
+    async def lease(self) -> Optional[str]:
+        return None if self.frontier.empty() else self.frontier.pop()
+
+    async def complete(self, url: str):
+        pass
+
+    async def requeue(self, url: str):
+        self.frontier.push(url)
+
+    async def finished(self) -> bool:
+        return self.frontier.empty()
+
+    def __len__(self) -> int:
+        return len(self.frontier)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    priority REAL NOT NULL,
+    seq INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT
+);
+CREATE INDEX IF NOT EXISTS frontier_leases ON frontier (state, lease_until);
+CREATE TABLE IF NOT EXISTS frontier_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# 同じ priority の中での並び順（Frontier の order と同じ意味）
+_SQLITE_ORDER_COLUMNS = {"fifo": "seq", "depth": "depth, seq", "path": "url"}
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+
+
+class SqliteFrontierBackend(FrontierBackend):
+    """
+    同じマシン上の複数のワーカープロセスで共有する、SQLite ファイルによるバックエンド。
+
+    貸し出しや追加は BEGIN IMMEDIATE のトランザクションで行うため、同時に実行しても同じURLが
+    二重に貸し出されることはありません。貸し出し中のURLは lease_until を過ぎると再び貸し出されます。
+    SQLite の呼び出しはロックの待機でイベントループを止めないよう、このバックエンド専用のスレッドで実行します。
+    """
+    shared = True
+
+    def __init__(self, path: str, max_pages: Optional[int] = None, order: str = "fifo",
+                 lease_timeout: float = DEFAULT_LEASE_TIMEOUT, worker_id: Optional[str] = None):
+        if order not in FRONTIER_ORDERS:
+            raise ValueError(f"未対応のフロンティアの順序です: {order}")
+        self.path = path
+        self.max_pages = max_pages
+        self.order = order
+        self.lease_timeout = lease_timeout
+        self.worker_id = worker_id or default_worker_id()
+        self.conn: Optional[sqlite3.Connection] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # finished() / stats() の時点での未取得のURL数（メトリクス用）
+        self.queued = 0
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def open(self):
+        # 接続を作ったスレッドだけが接続を使う
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frontier-sqlite")
+        await self._call(self._open)
+
+    def _open(self):
+        # トランザクションは明示的に BEGIN IMMEDIATE で開始する
+        self.conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS frontier_{self.order} "
+                          f"ON frontier (state, priority, {_SQLITE_ORDER_COLUMNS[self.order]})")
+
+    async def close(self):
+        if self.executor is None:
+            return
+        await self._call(self._close)
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _get(self, conn, key: str) -> int:
+        row = conn.execute("SELECT value FROM frontier_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set(self, conn, key: str, value: int):
+        conn.execute("INSERT INTO frontier_meta (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def _exhausted(self, conn) -> bool:
+        return self.max_pages is not None and self._get(conn, "claims") >= self.max_pages
+
+    async def add(self, urls: List[str], priority: float = 0.0) -> List[str]:
+        if not urls:
+            return []
+        return await self._call(self._add, list(urls), priority)
+
+    def _add(self, urls: List[str], priority: float) -> List[str]:
+        new = []
+        with self._transaction() as conn:
+            seq = self._get(conn, "seq")
+            for url in urls:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO frontier (url, state, priority, seq, depth) VALUES (?, ?, ?, ?, ?)",
+                    (url, QUEUED, priority, seq + 1, urlsplit(url).path.count("/")),
+                )
+                if cursor.rowcount:
+                    seq += 1
+                    new.append(url)
+            self._set(conn, "seq", seq)
+        return new
+
+    async def lease(self) -> Optional[str]:
+        return await self._call(self._lease)
+
+    def _lease(self) -> Optional[str]:
+        now = time.time()
+        with self._transaction() as conn:
+            # 期限切れの貸し出しを優先して回収する（これらは上限の枠を消費済み）
+            row = conn.execute(
+                "SELECT url, claimed FROM frontier WHERE state = ? AND lease_until < ? LIMIT 1", (LEASED, now)
+            ).fetchone()
+            if row is None:
+                # 上限に達した後は、枠を消費済みのURL（requeue() されたもの）だけを貸し出す
+                claimed_only = " AND claimed = 1" if self._exhausted(conn) else ""
+                row = conn.execute(
+                    f"SELECT url, claimed FROM frontier WHERE state = ?{claimed_only} "
+                    f"ORDER BY priority, {_SQLITE_ORDER_COLUMNS[self.order]} LIMIT 1", (QUEUED,)
+                ).fetchone()
+            if row is None:
+                return None
+            url, claimed = row
+            if not claimed:
+                self._set(conn, "claims", self._get(conn, "claims") + 1)
+            conn.execute(
+                "UPDATE frontier SET state = ?, claimed = 1, lease_until = ?, worker = ? WHERE url = ?",
+                (LEASED, now + self.lease_timeout, self.worker_id, url),
+            )
+        return url
+
+    async def complete(self, url: str):
+        await self._call(self._complete, url)
+
+    def _complete(self, url: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE frontier SET state = ?, lease_until = NULL WHERE url = ?", (DONE, url))
+
+    async def requeue(self, url: str):
+        await self._call(self._requeue, url)
+
+    def _requeue(self, url: str):
+        with self._transaction() as conn:
+            seq = self._get(conn, "seq") + 1
+            self._set(conn, "seq", seq)
+            conn.execute("UPDATE frontier SET state = ?, lease_until = NULL, seq = ? WHERE url = ?",
+                         (QUEUED, seq, url))
+
+    async def renew(self, urls: Iterable[str]):
+        urls = list(urls)
+        if urls:
+            await self._call(self._renew, urls)
+
+    def _renew(self, urls: List[str]):
+        # 期限切れで他のワーカーに回されたURLは、このワーカーの貸し出しではないため延ばさない
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE frontier SET lease_until = ? WHERE url = ? AND state = ? AND worker = ?",
+                [(time.time() + self.lease_timeout, url, LEASED, self.worker_id) for url in urls],
+            )
+
+    async def finished(self) -> bool:
+        return await self._call(self._finished)
+
+    def _finished(self) -> bool:
+        self.queued = self.conn.execute("SELECT COUNT(*) FROM frontier WHERE state = ?", (QUEUED,)).fetchone()[0]
+        if self.conn.execute("SELECT 1 FROM frontier WHERE state = ? LIMIT 1", (LEASED,)).fetchone():
+            return False
+        claimed_only = " AND claimed = 1" if self._exhausted(self.conn) else ""
+        row = self.conn.execute(f"SELECT 1 FROM frontier WHERE state = ?{claimed_only} LIMIT 1", (QUEUED,))
+        return row.fetchone() is None
+
+    async def stats(self) -> dict:
+        return await self._call(self._stats)
+
+    def _stats(self) -> dict:
+        counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state"))
+        self.queued = counts.get(QUEUED, 0)
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "leased": counts.get(LEASED, 0),
+            "done": counts.get(DONE, 0),
+            "claimed": self._get(self.conn, "claims"),
+        }
+
+    def __len__(self) -> int:
+        return self.queued
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class RedisFrontierBackend(FrontierBackend):
+    """
+    複数のマシンで共有する、Redis（互換サーバー）によるバックエンド。
+
+    client には redis.asyncio.Redis と互換のクライアントを渡します。キーは namespace を接頭辞とし、
+    discovered（発見済みURLの集合）、queue（未取得のURL）、retry（上限の枠を消費済みで再取得待ちのURL）、
+    leases（貸し出し中のURL、スコアは期限）、claims（消費した上限の枠の数）を使います。
+    queue / retry の要素は "<連番> <URL>" の形で、同じ priority の中では発見順に並びます。
+    leases の要素は貸し出しごとに固有のトークンを付けた "<トークン> <連番> <URL>" の形で、期限切れで
+    他のワーカーに回されたURLを前の借り手が complete() / renew() / requeue() しても、今の貸し出しには影響しません。
+    Lua スクリプトは使わず、読み取った状態に基づく更新（枠の確認と取り出し、期限切れの回収など）は
+    WATCH / MULTI / EXEC で行い、途中で他のワーカーが変更した場合は読み取りからやり直します。
+    発見済みの集合への追加と queue への追加の間でワーカーが落ちると、そのURLはキューに入らないまま残ります
+    （発見したワーカーのジャーナルには記録されます）。
+    """
+    shared = True
+
+    def __init__(self, client, namespace: str = "docs2notebook", max_pages: Optional[int] = None,
+                 lease_timeout: float = DEFAULT_LEASE_TIMEOUT, worker_id: Optional[str] = None):
+        self.client = client
+        self.namespace = namespace
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self.worker_id = worker_id or default_worker_id()
+        # 借りているURL → leases 上の要素
+        self.leased = {}
+        self.queued = 0
+
+    def _key(self, name: str) -> str:
+        return f"{self.namespace}:{name}"
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+    async def add(self, urls: List[str], priority: float = 0.0) -> List[str]:
+        if not urls:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for url in urls:
+            pipe.sadd(self._key("discovered"), url)
+        added = await pipe.execute()
+        new = [url for url, count in zip(urls, added) if count]
+        if new:
+            last = await self.client.incrby(self._key("seq"), len(new))
+            first = last - len(new) + 1
+            await self.client.zadd(self._key("queue"),
+                                   {f"{first + i:016d} {url}": priority for i, url in enumerate(new)})
+        return new
+
+    async def _atomic(self, keys: List[str], step):
+        """
+        keys を WATCH した上で step(pipe) を実行します。step は読み取った状態から書き込むと決めた場合、
+        pipe.multi() の後にコマンドを積んで None 以外を返し、書き込まない場合は None を返します。
+        EXEC までに keys が他のワーカーに変更された場合は、step からやり直します。step の戻り値を返します。
+        """
+        while True:
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(*keys)
+                    result = await step(pipe)
+                    if result is not None:
+                        await pipe.execute()
+                    return result
+                except WatchError:
+                    continue
+
+    async def _recover_expired(self, now: float):
+        """
+        期限切れの貸し出しを retry に戻します。回収の直前に期限を確かめ直すため、その間に延長された貸し出しは
+        回収しません。複数のワーカーが同時に回収しても要素は1つにまとまります。
+        """
+        for lease in await self.client.zrangebyscore(self._key("leases"), "-inf", now):
+            lease = _text(lease)
+
+            async def recover(pipe):
+                until = await pipe.zscore(self._key("leases"), lease)
+                if until is None or float(until) > now:
+                    return None
+                pipe.multi()
+                pipe.zrem(self._key("leases"), lease)
+                pipe.zadd(self._key("retry"), {lease.split(" ", 1)[1]: now})
+                return True
+
+            await self._atomic([self._key("leases")], recover)
+
+    async def _take(self, source: str, now: float) -> Optional[str]:
+        """
+        source の先頭の要素を取り出して貸し出し中にします。queue から取り出す場合は、上限の枠の確認と消費も
+        同じトランザクションで行うため、他のワーカーから一時的に枠が多く消費されたように見えることはありません。
+        """
+        count_claim = source == "queue" and self.max_pages is not None
+        lease = None
+
+        async def take(pipe):
+            nonlocal lease
+            head = await pipe.zrange(self._key(source), 0, 0)
+            if not head:
+                return None
+            if count_claim and int(await pipe.get(self._key("claims")) or 0) >= self.max_pages:
+                return None
+            member = _text(head[0])
+            lease = f"{uuid.uuid4().hex} {member}"
+            pipe.multi()
+            pipe.zrem(self._key(source), member)
+            pipe.zadd(self._key("leases"), {lease: now + self.lease_timeout})
+            if count_claim:
+                pipe.incr(self._key("claims"))
+            return member.split(" ", 1)[1]
+
+        keys = [self._key(source)] + ([self._key("claims")] if count_claim else [])
+        url = await self._atomic(keys, take)
+        if url is not None:
+            self.leased[url] = lease
+        return url
+
+    async def lease(self) -> Optional[str]:
+        now = time.time()
+        await self._recover_expired(now)
+        # 上限の枠を消費済みの再取得待ちを先に処理する
+        return await self._take("retry", now) or await self._take("queue", now)
+
+    async def complete(self, url: str):
+        lease = self.leased.pop(url, None)
+        if lease is not None:
+            # 期限切れで他のワーカーに回された後なら、この貸し出しの要素は既になく何も消さない
+            await self.client.zrem(self._key("leases"), lease)
+
+    async def requeue(self, url: str):
+        lease = self.leased.pop(url, None)
+        if lease is None:
+            return
+
+        async def give_back(pipe):
+            # 期限切れで回収済みの貸し出しは、既に retry に戻されているか他のワーカーが借りている
+            if await pipe.zscore(self._key("leases"), lease) is None:
+                return None
+            pipe.multi()
+            pipe.zrem(self._key("leases"), lease)
+            pipe.zadd(self._key("retry"), {lease.split(" ", 1)[1]: time.time()})
+            return True
+
+        await self._atomic([self._key("leases")], give_back)
+
+    async def renew(self, urls: Iterable[str]):
+        leases = [self.leased[url] for url in urls if url in self.leased]
+        if not leases:
+            return
+        until = time.time() + self.lease_timeout
+        pipe = self.client.pipeline(transaction=False)
+        for lease in leases:
+            # 期限切れで回収された（leases にない）要素は追加し直さない
+            pipe.zadd(self._key("leases"), {lease: until}, xx=True)
+        await pipe.execute()
+
+    async def _exhausted(self) -> bool:
+        if self.max_pages is None:
+            return False
+        return int(await self.client.get(self._key("claims")) or 0) >= self.max_pages
+
+    async def finished(self) -> bool:
+        self.queued = await self.client.zcard(self._key("queue"))
+        if await self.client.zcard(self._key("leases")) or await self.client.zcard(self._key("retry")):
+            return False
+        return self.queued == 0 or await self._exhausted()
+
+    async def stats(self) -> dict:
+        return {
+            "queued": await self.client.zcard(self._key("queue")),
+            "leased": await self.client.zcard(self._key("leases")),
+            "retry": await self.client.zcard(self._key("retry")),
+            "discovered": await self.client.scard(self._key("discovered")),
+            "claimed": int(await self.client.get(self._key("claims")) or 0),
+        }
+
+    def __len__(self) -> int:
+        return self.queued
+
+
+def create_frontier_backend(spec: str, max_pages: Optional[int] = None, order: str = "fifo",
+                            lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+                            worker_id: Optional[str] = None) -> Optional[FrontierBackend]:
+    """
+    "memory"、"sqlite:<パス>"、"redis://..." の指定からバックエンドを作ります。
+    memory の場合は None を返します（クローラーが自身の Frontier で MemoryFrontierBackend を作ります）。
+    Redis を使う場合は redis パッケージが必要です。
+    """
+    if spec == "memory":
+        return None
+    if spec.startswith("sqlite:"):
+        path = spec[len("sqlite:"):]
+        if not path:
+            raise ValueError("sqlite バックエンドにはファイルのパスが必要です (例: sqlite:frontier.db)")
+        return SqliteFrontierBackend(path, max_pages=max_pages, order=order,
+                                     lease_timeout=lease_timeout, worker_id=worker_id)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        if order != "fifo":
+            raise ValueError("redis バックエンドはフロンティアの順序 fifo のみに対応しています")
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise ValueError("redis バックエンドを使うには redis パッケージが必要です (pip install redis)")
+        parsed = urlsplit(spec)
+        # URLのフラグメントを名前空間として使う（例: redis://host:6379/0#docs-python）
+        namespace = parsed.fragment or "docs2notebook"
+        client = redis.asyncio.from_url(spec.split("#", 1)[0])
+        return RedisFrontierBackend(client, namespace=namespace, max_pages=max_pages,
+                                    lease_timeout=lease_timeout, worker_id=worker_id)
+    raise ValueError(f"未対応のフロンティアのバックエンドです: {spec} (memory / sqlite:<パス> / redis://...)")
@@ -0,0 +1,190 @@
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DISCOVERED = "discovered"
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+# 他のページと同じ内容だったため出力しなかったURL（alias_of に出力済みのURLを記録）
+DUPLICATE = "duplicate"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    offset INTEGER,
+    length INTEGER,
+    shard INTEGER NOT NULL DEFAULT 0,
+    alias_of TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 以前のバージョンのジャーナルに追加する列
+MIGRATIONS = {
+    "shard": "ALTER TABLE urls ADD COLUMN shard INTEGER NOT NULL DEFAULT 0",
+    "alias_of": "ALTER TABLE urls ADD COLUMN alias_of TEXT",
+}
+
+# 完了済み（重複を含む）のURLを未完了の状態に戻さないための UPSERT
+UPSERT = """
+INSERT INTO urls (url, state, seq, offset, length, shard, alias_of) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(url) DO UPDATE SET
+    state = excluded.state,
+    offset = COALESCE(excluded.offset, urls.offset),
+    length = COALESCE(excluded.length, urls.length),
+    shard = excluded.shard,
+    alias_of = excluded.alias_of
+WHERE urls.state NOT IN ('completed', 'duplicate')
+"""
+
+
+@dataclass
+class ResumeState:
+    """
+    ジャーナルから復元したクロール状態。
+    output_shard / output_end は、最後に書き込まれたページの末尾（シャード番号とその中のオフセット）です。
+    duplicates は重複と判定されたURLから出力済みのURLへの対応です。
+    """
+    start_url: Optional[str] = None
+    completed: dict = field(default_factory=dict)
+    duplicates: dict = field(default_factory=dict)
+    pending: list = field(default_factory=list)
+    output_shard: int = 0
+    output_end: int = 0
+
+
+class CrawlJournal:
+    """
+    発見・処理中・完了したURLと出力ファイル上のオフセットを記録する追記型ジャーナル（SQLite WALモード）。
+
+    記録はメモリ上にバッファされ、batch_size 件溜まるか flush_interval 秒経過した時点で
+    1トランザクションにまとめて書き込まれるため、クロールループをほとんど遅くしません。
+    """
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.conn: Optional[sqlite3.Connection] = None
+        self.pending_rows = []
+        self.last_flush = time.monotonic()
+        self.seq = 0
+
+    def open(self, fresh: bool = False):
+        """
+        ジャーナルを開きます。fresh=True の場合は既存の内容を破棄します。
+        """
+        if fresh:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(urls)")]
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self.conn.execute(statement)
+        self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM urls").fetchone()[0]
+
+    def set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+
+    def load(self) -> ResumeState:
+        """
+        ジャーナルの内容から再開用の状態を組み立てます。
+        未完了のURLは、処理中だったものを先頭に発見順で並べます。
+        """
+        state = ResumeState()
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'start_url'").fetchone()
+        state.start_url = row[0] if row else None
+
+        rows = self.conn.execute(
+            "SELECT url, state, offset, length, shard, alias_of FROM urls "
+            "ORDER BY CASE state WHEN 'in_flight' THEN 0 ELSE 1 END, seq"
+        )
+        for url, url_state, offset, length, shard, alias_of in rows:
+            if url_state == DUPLICATE:
+                state.duplicates[url] = alias_of
+            elif url_state == COMPLETED:
+                state.completed[url] = (offset, length)
+                state.output_shard, state.output_end = max(
+                    (state.output_shard, state.output_end), (shard, offset + length)
+                )
+            else:
+                state.pending.append(url)
+        return state
+
+    def urls_by_state(self) -> dict:
+        """
+        状態ごとのURLの一覧を返します（サマリー表示用）。
+        """
+        self.flush()
+        urls = {DISCOVERED: [], IN_FLIGHT: [], COMPLETED: [], DUPLICATE: []}
+        for url, url_state in self.conn.execute("SELECT url, state FROM urls ORDER BY url"):
+            urls.setdefault(url_state, []).append(url)
+        return urls
+
+    def _record(self, url: str, state: str, offset: Optional[int] = None, length: Optional[int] = None,
+                shard: int = 0, alias_of: Optional[str] = None):
+        self.seq += 1
+        self.pending_rows.append((url, state, self.seq, offset, length, shard, alias_of))
+        if len(self.pending_rows) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def record_discovered(self, url: str):
+        self._record(url, DISCOVERED)
+
+    def record_discovered_many(self, urls: list):
+        """
+        1ページ分の新しいURLをまとめて記録します。
+        """
+        for url in urls:
+            self.seq += 1
+            self.pending_rows.append((url, DISCOVERED, self.seq, None, None, 0, None))
+        if len(self.pending_rows) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def record_in_flight(self, url: str):
+        self._record(url, IN_FLIGHT)
+
+    def record_completed(self, url: str, offset: int, length: int, shard: int = 0):
+        self._record(url, COMPLETED, offset, length, shard)
+
+    def record_duplicate(self, url: str, alias_of: str):
+        self._record(url, DUPLICATE, alias_of=alias_of)
+
+    def flush(self):
+        """
+        バッファ済みの記録を1トランザクションで書き込みます。
+        """
+        self.last_flush = time.monotonic()
+        if not self.pending_rows or self.conn is None:
+            return
+        with self.conn:
+            self.conn.executemany(UPSERT, self.pending_rows)
+        self.pending_rows = []
+
+    def close(self):
+        """
+        残りの記録を書き込んでジャーナルを閉じます。
+        """
+        if self.conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sys
+from typing import Optional
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# ページごとの上限で本文を切り詰めた位置に挿入する目印
+TRUNCATION_MARKER = "[docs2notebook: このページは大きすぎるため、以降を省略しました]"
+
+# RSS の上限を超えている間に、取得の再開を確認する間隔（秒）
+RSS_POLL_INTERVAL = 0.5
+
+# ブラウザ上で、シリアライズ（page.content()）の前に大きすぎるページを縮めるスクリプト
+# 上限を超える場合はまずノイズとなるタグ（抽出時に除去されるもの）を取り除き、
+# それでも超える場合は上限に収まらない最初の要素の中へ降りながら、それより後ろの兄弟要素を削除して目印を挿入する
+# 大きさは outerHTML の文字数で近似する
+TRIM_SCRIPT = """
+({maxChars, noiseSelector, marker}) => {
+    const root = document.documentElement;
+    const original = root.outerHTML.length;
+    if (original <= maxChars) {
+        return {original, size: original, truncated: false};
+    }
+    for (const el of document.querySelectorAll(noiseSelector)) {
+        el.remove();
+    }
+    let size = root.outerHTML.length;
+    const body = document.body;
+    if (size <= maxChars || !body) {
+        return {original, size, truncated: false};
+    }
+    let budget = maxChars - (size - body.outerHTML.length);
+    let node = body;
+    while (node) {
+        let next = null;
+        for (const child of Array.from(node.children)) {
+            if (next !== null) {
+                child.remove();
+                continue;
+            }
+            const childSize = child.outerHTML.length;
+            if (childSize <= budget) {
+                budget -= childSize;
+            } else {
+                next = child;
+            }
+        }
+        if (next === null || next.children.length === 0) {
+            if (next !== null) {
+                // 子要素のない大きな要素（巨大な <pre> など）はテキストを切り詰める
+                next.textContent = next.textContent.slice(0, Math.max(0, budget));
+            }
+            const p = document.createElement('p');
+            p.textContent = marker;
+            node.appendChild(p);
+            break;
+        }
+        node = next;
+    }
+    return {original, size: root.outerHTML.length, truncated: true};
+}
+"""
+
+
+def truncate_html(html_content: str, max_chars: int) -> str:
+    """
+    HTMLを max_chars 文字以内で切り詰め、切った位置に目印を挿入します。
+    """
+    if len(html_content) <= max_chars:
+        return html_content
+    return mark_truncated(html_content[:max_chars])
+
+
+def mark_truncated(html_prefix: str) -> str:
+    """
+    途中で切れたHTMLの末尾にある閉じていないタグを除き、目印を追加します（閉じていない要素はパーサーが補います）。
+    """
+    lt = html_prefix.rfind("<")
+    if lt > html_prefix.rfind(">"):
+        html_prefix = html_prefix[:lt]
+    return f"{html_prefix}<p>{TRUNCATION_MARKER}</p>"
+
+
+def current_rss() -> Optional[int]:
+    """
+    このプロセスの現在の RSS（バイト）を返します。取得できない環境（Linux 以外）では None を返します。
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """
+    このプロセス（children=True の場合は終了済みの子プロセスのうち最大のもの）の最大 RSS（バイト）を返します。
+    resource モジュールがない環境（Windows）では None を返します。
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss は macOS ではバイト、Linux ではキロバイト
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class MemoryBudget:
+    """
+    処理中のページ（取得を開始してから抽出が終わるまで）が保持するHTMLのおおよそのバイト数を追跡し、
+    上限を超えている間は新しいページの取得開始（admit）を待たせるクラス。
+
+    limit_bytes は処理中のHTMLの合計の上限、rss_limit_bytes はプロセスの RSS の上限です（None で無効）。
+    RSS は取得の完了では変化しないため、超えている間は一定間隔で確認し直します。
+    処理中のページが1つもなければ、上限を超えていても1ページは取得します（クロールが止まらないようにするため）。
+    """
+    def __init__(self, limit_bytes: Optional[int] = None, rss_limit_bytes: Optional[int] = None):
+        self.limit_bytes = limit_bytes
+        self.rss_limit_bytes = rss_limit_bytes
+        # 処理中のURL → 保持しているHTMLのバイト数
+        self.charges = {}
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+        self.waits = 0
+        self.condition = asyncio.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit_bytes is not None or self.rss_limit_bytes is not None
+
+    def _over_rss(self) -> bool:
+        if self.rss_limit_bytes is None:
+            return False
+        rss = current_rss()
+        return rss is not None and rss > self.rss_limit_bytes
+
+    def _has_room(self) -> bool:
+        if not self.charges:
+            return True
+        if self.limit_bytes is not None and self.in_flight_bytes >= self.limit_bytes:
+            return False
+        return not self._over_rss()
+
+    async def admit(self, url: str):
+        """
+        上限に空きができるまで待ってから、URLを処理中として登録します。
+        """
+        async with self.condition:
+            if not self._has_room():
+                self.waits += 1
+                logger.debug(f"メモリの上限に達しているため、取得の開始を待機します: {url}")
+                while not self._has_room():
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), RSS_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+            self.charges[url] = 0
+
+    def charge(self, url: str, size: int):
+        """
+        処理中のURLが保持するHTMLのバイト数を加算します。
+        """
+        if url not in self.charges:
+            return
+        self.charges[url] += size
+        self.in_flight_bytes += size
+        self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes)
+
+    async def release(self, url: str):
+        """
+        URLの処理が終わったことを記録し、待機中の取得を起こします。登録されていないURLは無視します。
+        """
+        size = self.charges.pop(url, None)
+        if size is None:
+            return
+        self.in_flight_bytes -= size
+        async with self.condition:
+            self.condition.notify_all()
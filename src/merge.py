@@ -0,0 +1,70 @@
+import json
+import os
+from typing import List
+from .logger import setup_logger
+from .output_writer import path_order_key
+
+logger = setup_logger(__name__)
+
+
+def read_manifest(output_file: str) -> List[dict]:
+    """
+    出力ファイルの <出力ファイル>.manifest.jsonl を読み込み、各ページの記録（url / file / offset / length）を返します。
+    file は出力ファイルと同じディレクトリからの絶対パスに置き換えます。
+    """
+    manifest_path = f"{output_file}.manifest.jsonl"
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"出力ファイルの対応表が見つかりません: {manifest_path}")
+    directory = os.path.dirname(os.path.abspath(output_file))
+    entries = []
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entry["file"] = os.path.join(directory, entry["file"])
+            entries.append(entry)
+    return entries
+
+
+def merge_outputs(inputs: List[str], output_file: str) -> int:
+    """
+    複数のワーカーの出力ファイルを1つのファイルにまとめ、書き込んだページ数を返します。
+
+    各ページの位置は出力ファイルの対応表から読むため、シャードに分割された出力もそのまま扱えます。
+    ワーカーごとに出力順が異なるため、ページはURLのパス階層順に並べ直します。
+    期限切れで再取得されるなどして複数のワーカーが出力したURLは、inputs で先に指定した方だけを残します。
+    まとめたファイルにも対応表（<出力ファイル>.manifest.jsonl）を作成します。
+    """
+    pages = {}
+    for path in inputs:
+        for entry in read_manifest(path):
+            pages.setdefault(entry["url"], entry)
+    ordered = sorted(pages.values(), key=lambda entry: path_order_key(entry["url"]))
+
+    handles = {}
+    offset = 0
+    written = 0
+    try:
+        with open(output_file, "wb") as out, open(f"{output_file}.manifest.jsonl", "w", encoding="utf-8") as manifest:
+            for entry in ordered:
+                source = handles.get(entry["file"])
+                if source is None:
+                    source = handles[entry["file"]] = open(entry["file"], "rb")
+                source.seek(entry["offset"])
+                data = source.read(entry["length"])
+                if len(data) != entry["length"]:
+                    logger.warning(f"出力ファイルが対応表より短いため、このページを飛ばします: {entry['url']}")
+                    continue
+                out.write(data)
+                manifest.write(json.dumps({
+                    "url": entry["url"], "shard": 0, "file": os.path.basename(output_file),
+                    "offset": offset, "length": len(data),
+                }, ensure_ascii=False) + "\n")
+                offset += len(data)
+                written += 1
+    finally:
+        for handle in handles.values():
+            handle.close()
+    logger.info(f"{len(inputs)} 個の出力から {written} ページを {output_file} にまとめました")
+    return written
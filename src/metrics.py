@@ -0,0 +1,272 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import math
+import random
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# レイテンシのヒストグラムのバケット境界（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 処理中のページのステージ別所要時間（crawl_page の中で処理中のページごとに設定される）
+_page_spans: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("page_spans", default=None)
+
+
+class Histogram:
+    """
+    Prometheus 形式のバケットを持つヒストグラム。
+
+    パーセンタイルを正確に求められるよう、最大 sample_size 件の観測値を
+    リザーバサンプリングで保持します（それを超えた場合は近似値になります）。
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, sample_size: int = 10000):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.sample_size = sample_size
+        self.samples = []
+        self.random = random.Random(0)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        if len(self.samples) < self.sample_size:
+            self.samples.append(value)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.sample_size:
+                self.samples[index] = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        q（0〜1）分位点を最近傍順位法で求めます。観測値がなければ None。
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+    def summary(self) -> dict:
+        to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum * 1000, 3),
+            "p50_ms": to_ms(self.quantile(0.5)),
+            "p95_ms": to_ms(self.quantile(0.95)),
+            "max_ms": to_ms(max(self.samples) if self.samples else None),
+        }
+
+
+class CrawlMetrics:
+    """
+    クロールパイプラインのプロセス内メトリクス。
+
+    - ステージ別の所要時間（ヒストグラム）: span() / observe() で記録
+    - カウンタ（ページ数・転送バイト数・エラー種別など）: inc() で加算
+    - ゲージ（キューの長さ・処理中のページ数など）: register_gauge() で登録した関数を読み出し時に評価
+    crawl_page の中で記録されたステージは、ページごとの所要時間としても保持し、遅いページの一覧に使います。
+    """
+    def __init__(self, slowest_pages: int = 10):
+        self.started = time.time()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Counter] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.slowest_pages = slowest_pages
+        self.slowest = []
+
+    def observe(self, stage: str, seconds: float):
+        """
+        ステージの所要時間を記録します。
+        """
+        if stage not in self.stages:
+            self.stages[stage] = Histogram()
+        self.stages[stage].observe(seconds)
+        spans = _page_spans.get()
+        if spans is not None:
+            spans[stage] = spans.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        """
+        with ブロックの所要時間をステージの時間として記録します（例外で抜けた場合も記録）。
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def page(self, url: str):
+        """
+        1ページ分の処理を囲み、その中で記録されたステージ別の所要時間をまとめます。
+        """
+        spans = {}
+        token = _page_spans.set(spans)
+        started = time.perf_counter()
+        try:
+            yield spans
+        finally:
+            _page_spans.reset(token)
+            total = time.perf_counter() - started
+            self.observe("page", total)
+            logger.debug("ページ計測: " + json.dumps(
+                {"url": url, "total_ms": round(total * 1000, 1),
+                 **{k: round(v * 1000, 1) for k, v in spans.items()}}, ensure_ascii=False))
+            self._record_slow_page(url, total, spans)
+
+    def _record_slow_page(self, url: str, total: float, spans: Dict[str, float]):
+        if len(self.slowest) >= self.slowest_pages and total <= self.slowest[-1]["total_ms"] / 1000:
+            return
+        self.slowest.append({
+            "url": url,
+            "total_ms": round(total * 1000, 3),
+            "stages_ms": {k: round(v * 1000, 3) for k, v in spans.items()},
+        })
+        self.slowest.sort(key=lambda p: p["total_ms"], reverse=True)
+        del self.slowest[self.slowest_pages:]
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """
+        カウンタを加算します。labels はPrometheusのラベルとして出力されます。
+        """
+        if name not in self.counters:
+            self.counters[name] = Counter()
+        self.counters[name][tuple(sorted(labels.items()))] += amount
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self.counters.get(name, Counter())[tuple(sorted(labels.items()))]
+
+    def register_gauge(self, name: str, read: Callable[[], float]):
+        """
+        読み出し時に read() を評価するゲージを登録します。
+        """
+        self.gauges[name] = read
+
+    def _gauge_values(self) -> Dict[str, float]:
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception:
+                # 停止済みのコンポーネントなど
+                continue
+        return values
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheus のテキスト形式でメトリクスを出力します。
+        """
+        lines = []
+        for name, value in self._gauge_values().items():
+            lines += [f"# TYPE docs2notebook_{name} gauge", f"docs2notebook_{name} {value}"]
+
+        for name, counter in self.counters.items():
+            lines.append(f"# TYPE docs2notebook_{name} counter")
+            for labels, value in counter.items():
+                lines.append(f"docs2notebook_{name}{_format_labels(labels)} {value}")
+
+        lines.append("# TYPE docs2notebook_stage_seconds histogram")
+        for stage, hist in self.stages.items():
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.bucket_counts):
+                cumulative += count
+                lines.append(f'docs2notebook_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'docs2notebook_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'docs2notebook_stage_seconds_sum{{stage="{stage}"}} {hist.sum}')
+            lines.append(f'docs2notebook_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> dict:
+        """
+        実行結果のレポートを辞書で返します（JSONとして保存する用途）。
+        """
+        elapsed = time.time() - self.started
+        pages = sum(self.counters.get("pages_total", Counter()).values())
+        return {
+            "started_at": self.started,
+            "elapsed_sec": round(elapsed, 3),
+            "pages_per_sec": round(pages / elapsed, 2) if elapsed > 0 else None,
+            "gauges": self._gauge_values(),
+            "counters": {
+                name: {_format_labels(labels) or "total": value for labels, value in counter.items()}
+                for name, counter in self.counters.items()
+            },
+            "stages": {stage: hist.summary() for stage, hist in self.stages.items()},
+            "slowest_pages": self.slowest,
+        }
+
+    def write_report(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class MetricsServer:
+    """
+    メトリクスをローカルのHTTPエンドポイントで公開する最小限のサーバー。
+    /metrics で Prometheus 形式、/metrics.json で JSON のレポートを返します。
+    """
+    def __init__(self, metrics: CrawlMetrics, port: int, host: str = "127.0.0.1"):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port=0 の場合は割り当てられたポートを使う
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"メトリクスを公開しています: http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            # リクエストヘッダーは読み捨てる
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+
+            if path == "/metrics":
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+                body = self.metrics.render_prometheus()
+            elif path == "/metrics.json":
+                status, content_type = "200 OK", "application/json; charset=utf-8"
+                body = json.dumps(self.metrics.report(), ensure_ascii=False)
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", "not found\n"
+
+            data = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
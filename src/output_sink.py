@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional, TextIO
+from .logger import setup_logger
+from .metrics import CrawlMetrics
+
+logger = setup_logger(__name__)
+
+SOURCE_PREFIX = "Source URL: "
+
+
+class ShardedOutputSink:
+    """
+    ページを出力ファイルへ書き込む専用の書き込みタスク。
+
+    submit() されたページはメモリ上に溜められ、batch_bytes に達するか flush_interval 秒ごとに
+    まとめてワーカースレッドで書き込まれるため、イベントループがファイルI/Oで止まりません。
+    fsync は fsync_interval 秒ごと、シャードの切り替え時、終了時に行います。
+    max_shard_bytes / max_shard_words を指定した場合は、ページを分割せずに
+    name_001.md, name_002.md ... へ出力先を切り替えます（1ページだけで上限を超える場合はそのページ単独のシャードになります）。
+    各ページのシャードとオフセットは <出力ファイル>.manifest.jsonl に1行ずつ記録します。
+    書き込みが完了したページは on_written(url, shard, offset, length) で通知されます（ジャーナルへの記録用）。
+    """
+    def __init__(self, output_file: str, max_shard_bytes: Optional[int] = None,
+                 max_shard_words: Optional[int] = None, batch_bytes: int = 1024 * 1024,
+                 flush_interval: float = 0.5, fsync_interval: float = 5.0,
+                 max_pending_bytes: int = 8 * 1024 * 1024, toc: bool = False,
+                 on_written: Optional[Callable[[str, int, int, int], None]] = None,
+                 metrics: Optional[CrawlMetrics] = None):
+        self.output_file = output_file
+        self.max_shard_bytes = max_shard_bytes
+        self.max_shard_words = max_shard_words
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.toc = toc
+        self.on_written = on_written
+        self.metrics = metrics
+        self.manifest_path = f"{output_file}.manifest.jsonl"
+
+        # submit() 時点で決まる書き込み位置
+        self.shard = 0
+        self.shard_bytes = 0
+        self.shard_words = 0
+
+        # 書き込み待ちの (url, shard, offset, data)
+        self.pending = []
+        self.pending_bytes = 0
+        self.flush_requested: Optional[asyncio.Event] = None
+        self.capacity: Optional[asyncio.Condition] = None
+        self.task: Optional[asyncio.Task] = None
+        self.closing = False
+
+        # ワーカースレッドからのみ触るファイルハンドル
+        self.handle: Optional[BinaryIO] = None
+        self.handle_shard = -1
+        self.manifest: Optional[TextIO] = None
+        self.last_fsync = time.monotonic()
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.max_shard_bytes or self.max_shard_words)
+
+    def shard_path(self, shard: int) -> str:
+        """
+        シャード番号に対応するファイルパスを返します。シャード分割しない場合は出力ファイルそのものです。
+        """
+        if not self.sharded:
+            return self.output_file
+        path = Path(self.output_file)
+        return str(path.with_name(f"{path.stem}_{shard + 1:03d}{path.suffix}"))
+
+    @property
+    def paths(self) -> List[str]:
+        return [self.shard_path(i) for i in range(self.shard + 1)]
+
+    def _stale_shards(self) -> List[Path]:
+        path = Path(self.output_file)
+        return sorted(path.parent.glob(f"{path.stem}_[0-9][0-9][0-9]{path.suffix}"))
+
+    def reset(self):
+        """
+        新しいクロールのために、出力ファイル・以前のシャード・マニフェストを空にします。
+        """
+        for stale in self._stale_shards():
+            stale.unlink()
+        with open(self.shard_path(0), "wb"):
+            pass
+        with open(self.manifest_path, "w", encoding="utf-8"):
+            pass
+
+    def restore(self, shard: int, end: int):
+        """
+        中断したクロールの再開時に、最後に記録されたページの末尾（shard, end）まで出力を巻き戻します。
+        """
+        for index, path in enumerate(self._stale_shards() if self.sharded else [Path(self.output_file)]):
+            if index > shard:
+                path.unlink()
+        path = self.shard_path(shard)
+        with open(path, "ab") as f:
+            f.truncate(end)
+        self.shard = shard
+        self.shard_bytes = end
+        with open(path, "rb") as f:
+            self.shard_words = sum(len(line.split()) for line in f)
+
+        # 巻き戻した位置より後ろのページをマニフェストから取り除く
+        kept = []
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if (entry["shard"], entry["offset"] + entry["length"]) <= (shard, end):
+                        kept.append(line)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+
+    async def start(self):
+        """
+        書き込みタスクを起動します。
+        """
+        self.flush_requested = asyncio.Event()
+        self.capacity = asyncio.Condition()
+        self.closing = False
+        self.task = asyncio.create_task(self._run())
+
+    def submit(self, url: str, data: bytes):
+        """
+        ページを書き込み待ちに追加します。書き込み位置（シャードとオフセット）はこの時点で決まります。
+        """
+        words = len(data.split())
+        over_bytes = self.max_shard_bytes and self.shard_bytes + len(data) > self.max_shard_bytes
+        over_words = self.max_shard_words and self.shard_words + words > self.max_shard_words
+        if self.shard_bytes and (over_bytes or over_words):
+            self.shard += 1
+            self.shard_bytes = 0
+            self.shard_words = 0
+            logger.info(f"出力先を次のファイルに切り替えます: {self.shard_path(self.shard)}")
+
+        self.pending.append((url, self.shard, self.shard_bytes, data))
+        self.shard_bytes += len(data)
+        self.shard_words += words
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.batch_bytes and self.flush_requested is not None:
+            self.flush_requested.set()
+
+    async def wait_for_capacity(self):
+        """
+        書き込み待ちが max_pending_bytes を超えている間、書き込みが進むまで待機します（バックプレッシャー）。
+        """
+        if self.pending_bytes <= self.max_pending_bytes or self.task is None:
+            return
+        self.flush_requested.set()
+        async with self.capacity:
+            await self.capacity.wait_for(lambda: self.pending_bytes <= self.max_pending_bytes or self.task.done())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_requested.clear()
+            closing = self.closing
+            await self._flush()
+            if closing and not self.pending:
+                return
+
+    async def _flush(self):
+        batch, self.pending = self.pending, []
+        if batch:
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write_batch, batch)
+            if self.metrics:
+                self.metrics.observe("write_batch", time.perf_counter() - started)
+            self.pending_bytes -= sum(len(item[3]) for item in batch)
+            if self.on_written:
+                for url, shard, offset, data in batch:
+                    self.on_written(url, shard, offset, len(data))
+        elif time.monotonic() - self.last_fsync >= self.fsync_interval:
+            await asyncio.to_thread(self._fsync)
+        async with self.capacity:
+            self.capacity.notify_all()
+
+    def _write_batch(self, batch):
+        """
+        ワーカースレッドで、まとめたページを書き込みます。
+        """
+        if self.manifest is None:
+            self.manifest = open(self.manifest_path, "a", encoding="utf-8")
+        for url, shard, offset, data in batch:
+            if shard != self.handle_shard:
+                self._close_handle()
+                self.handle = open(self.shard_path(shard), "ab")
+                self.handle_shard = shard
+            self.handle.write(data)
+            self.manifest.write(json.dumps({
+                "url": url, "shard": shard, "file": os.path.basename(self.shard_path(shard)),
+                "offset": offset, "length": len(data),
+            }, ensure_ascii=False) + "\n")
+        self.handle.flush()
+        self.manifest.flush()
+        if time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self._fsync()
+
+    def _fsync(self):
+        self.last_fsync = time.monotonic()
+        for f in (self.handle, self.manifest):
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _close_handle(self):
+        if self.handle is not None:
+            self.handle.flush()
+            os.fsync(self.handle.fileno())
+            self.handle.close()
+            self.handle = None
+            self.handle_shard = -1
+
+    async def close(self, complete: bool = True):
+        """
+        書き込み待ちのページを全て書き込んでからファイルを閉じます。
+        complete=True かつ toc=True の場合は、最後のシャードの末尾に全シャード分の目次を追加します。
+        """
+        if self.task is None:
+            return
+        self.closing = True
+        self.flush_requested.set()
+        try:
+            await self.task
+        finally:
+            self.task = None
+            await asyncio.to_thread(self._finish, complete and self.toc)
+
+    def _finish(self, write_toc: bool):
+        try:
+            self._close_handle()
+            if write_toc:
+                # 目次は再開時の切り捨て位置（最後のページの末尾）より後ろに置く
+                toc = build_table_of_contents(self.paths)
+                with open(self.shard_path(self.shard), "ab") as f:
+                    f.write(toc.encode("utf-8"))
+        finally:
+            if self.manifest is not None:
+                self.manifest.flush()
+                os.fsync(self.manifest.fileno())
+                self.manifest.close()
+                self.manifest = None
+
+
+def build_table_of_contents(paths: List[str]) -> str:
+    """
+    出力ファイルを先頭から走査し、各ページの最初の見出しとソースURLから目次を作ります。
+    """
+    entries = []
+    for path in paths:
+        in_code_block = False
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(SOURCE_PREFIX):
+                    entries.append([line[len(SOURCE_PREFIX):].strip(), None])
+                    in_code_block = False
+                    continue
+                if line.startswith("```"):
+                    in_code_block = not in_code_block
+                    continue
+                if entries and entries[-1][1] is None and not in_code_block and line.startswith("# "):
+                    entries[-1][1] = line[2:].strip()
+
+    lines = ["## 目次", ""]
+    lines += [f"- [{title or url}]({url})" for url, title in entries]
+    return "\n".join(lines) + "\n"
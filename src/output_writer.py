@@ -0,0 +1,227 @@
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional
+from urllib.parse import urlparse
+from .logger import setup_logger
+from .output_sink import ShardedOutputSink
+
+logger = setup_logger(__name__)
+
+# discovery: URLを発見した順（幅優先）、path: URLのパス階層順
+OUTPUT_ORDERS = ("discovery", "path")
+
+
+@dataclass
+class _Fragment:
+    """
+    並べ替え待ちのページ。data が None の場合は一時ファイルに退避されています。
+    """
+    url: str
+    length: int
+    data: Optional[bytes] = None
+    spill_offset: int = -1
+
+
+def path_order_key(url: str) -> tuple:
+    """
+    URLをパス階層順に並べるためのキー。親ディレクトリのページが子ページより先に来ます。
+    """
+    parsed = urlparse(url)
+    segments = tuple(s for s in parsed.path.split("/") if s)
+    return (parsed.netloc, segments, parsed.query)
+
+
+class OrderedOutputWriter:
+    """
+    ページを完了順ではなく、実行ごとに変わらない安定した順序に並べ替えて出力先（sink）へ渡すライター。
+
+    order="discovery" では、開始URLなどのルート（register_root() した順）から幅優先でたどった順に並べます。
+    並列にクロールすると発見の順序は実行ごとに変わるため、ある階層の全ページのリンク一覧
+    （record_links()）が揃った時点で、次の階層の順序を「親の順序 → ページ内のリンクの順序」で確定します。
+    順序の確定したページは先頭から連続して揃った分だけすぐに書き出すため、バッファには順番待ちのページだけが残ります。
+    order="path" では全ページが揃ってから close() 時にパス階層順で書き出します。
+    バッファ上のページの合計が buffer_bytes を超えた分は一時ファイルに退避するため、メモリ使用量は一定です。
+    """
+    def __init__(self, sink: ShardedOutputSink, order: str = "discovery", buffer_bytes: int = 16 * 1024 * 1024):
+        if order not in OUTPUT_ORDERS:
+            raise ValueError(f"未対応の出力順です: {order}")
+        self.sink = sink
+        self.order = order
+        self.buffer_bytes = buffer_bytes
+
+        # URLのハッシュ値 → 出力順の番号（-1 は出力済みとして除外したURL）
+        # 全URL分を保持するため、URLの文字列ではなくハッシュ値をキーにする
+        self.positions: Dict[int, int] = {}
+        # 出力順の番号 → 書き出し待ちのページ（None は出力なしで確定したページ）
+        self.slots: Dict[int, Optional[_Fragment]] = {}
+        # 出力順がまだ決まっていないURLのページ
+        self.unplaced: Dict[str, Optional[_Fragment]] = {}
+        self.next_position = 0
+        self.placed = 0
+
+        # 幅優先で順序を確定させている階層と、リンク一覧が未記録のURLの数
+        self.level = []
+        self.level_set = set()
+        self.level_missing = 0
+        self.links: Dict[str, list] = {}
+        # リンク一覧を記録済みのURLのハッシュ値
+        self.recorded = set()
+
+        self.buffered_bytes = 0
+        self.spill: Optional[BinaryIO] = None
+        self.spill_size = 0
+
+    @property
+    def pending_pages(self) -> int:
+        return (sum(1 for fragment in self.slots.values() if fragment is not None)
+                + sum(1 for fragment in self.unplaced.values() if fragment is not None))
+
+    def register_root(self, url: str):
+        """
+        幅優先の起点となるURL（開始URL・サイトマップのURL・再開時の未処理URL）を登録します。
+        """
+        if hash(url) in self.positions:
+            return
+        self._place(url)
+        self.level.append(url)
+        self.level_set.add(url)
+        if hash(url) not in self.recorded:
+            self.level_missing += 1
+        self._expand()
+
+    def exclude(self, url: str):
+        """
+        前回の実行で出力済みのURLを、出力順の対象から外します。
+        """
+        self.positions.setdefault(hash(url), -1)
+
+    def record_links(self, url: str, links: list):
+        """
+        クロールしたページ内のクロール対象リンクを、ページ内の順序で記録します。
+        取得できなかったページは空のリストで記録します。記録済みのURLは無視します。
+        """
+        if hash(url) in self.recorded:
+            return
+        self.recorded.add(hash(url))
+        self.links[url] = links
+        if url in self.level_set:
+            self.level_missing -= 1
+            self._expand()
+
+    def _expand(self):
+        """
+        現在の階層の全ページのリンクが揃っていれば、次の階層の出力順を確定させます。
+        """
+        while self.level and self.level_missing == 0:
+            next_level = []
+            for parent in self.level:
+                for link in self.links.pop(parent, ()):
+                    if hash(link) not in self.positions:
+                        self._place(link)
+                        next_level.append(link)
+            self.level = next_level
+            self.level_set = set(next_level)
+            self.level_missing = sum(1 for url in next_level if hash(url) not in self.recorded)
+        if self.order == "discovery":
+            self._drain()
+
+    def _place(self, url: str):
+        position = self.placed
+        self.placed += 1
+        self.positions[hash(url)] = position
+        if url in self.unplaced:
+            self.slots[position] = self.unplaced.pop(url)
+
+    def add(self, url: str, content: str):
+        """
+        ページの内容を追加し、書き出せる状態になったページを出力します。
+        """
+        data = content.encode("utf-8")
+        fragment = _Fragment(url, len(data))
+        if self.buffered_bytes + len(data) <= self.buffer_bytes:
+            fragment.data = data
+            self.buffered_bytes += len(data)
+        else:
+            self._spill(fragment, data)
+        self._settle(url, fragment)
+
+    def skip(self, url: str):
+        """
+        出力しないことが確定したページを通知し、後続のページの書き出しを進めます。
+        """
+        self._settle(url, None)
+
+    def _settle(self, url: str, fragment: Optional[_Fragment]):
+        position = self.positions.get(hash(url))
+        duplicated = (url in self.unplaced if position is None
+                      else position < self.next_position or position in self.slots)
+        if duplicated:
+            # 書き出し済み、または確定済み
+            if fragment is not None:
+                logger.warning(f"同じページが二度出力されようとしたため無視します: {url}")
+                self._release(fragment)
+            return
+        if position is None:
+            self.unplaced[url] = fragment
+            return
+        self.slots[position] = fragment
+        if self.order == "discovery":
+            self._drain()
+
+    def _drain(self):
+        """
+        出力順の先頭から連続して確定しているページを書き出します。
+        """
+        while self.next_position in self.slots:
+            fragment = self.slots.pop(self.next_position)
+            self.next_position += 1
+            if fragment is not None:
+                self._write(fragment)
+
+    def _spill(self, fragment: _Fragment, data: bytes):
+        if self.spill is None:
+            self.spill = tempfile.TemporaryFile(
+                prefix="docs2notebook-", dir=os.path.dirname(os.path.abspath(self.sink.output_file))
+            )
+            logger.info("並べ替えバッファが上限に達したため、一時ファイルへの退避を開始します")
+        self.spill.seek(self.spill_size)
+        self.spill.write(data)
+        fragment.spill_offset = self.spill_size
+        self.spill_size += len(data)
+
+    def _load(self, fragment: _Fragment) -> bytes:
+        if fragment.data is not None:
+            return fragment.data
+        self.spill.seek(fragment.spill_offset)
+        return self.spill.read(fragment.length)
+
+    def _release(self, fragment: _Fragment):
+        if fragment.data is not None:
+            self.buffered_bytes -= fragment.length
+
+    def _write(self, fragment: _Fragment):
+        data = self._load(fragment)
+        self._release(fragment)
+        self.sink.submit(fragment.url, data)
+
+    def close(self):
+        """
+        順番待ちのページを全て出力先へ渡します。
+        順番待ちのまま取得されなかったページは飛ばし、順序の確定しなかったページは最後にパス階層順で渡します
+        （抽出の完了順は実行ごとに変わるため）。
+        """
+        try:
+            remaining = [fragment for _, fragment in sorted(self.slots.items()) if fragment is not None]
+            remaining += sorted((fragment for fragment in self.unplaced.values() if fragment is not None),
+                                key=lambda fragment: (path_order_key(fragment.url), fragment.url))
+            if self.order == "path":
+                remaining.sort(key=lambda fragment: path_order_key(fragment.url))
+            self.slots = {}
+            self.unplaced = {}
+            for fragment in remaining:
+                self._write(fragment)
+        finally:
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+
+def content_hash(data) -> str:
+    """
+    文字列またはバイト列のSHA-256ハッシュを16進文字列で返します。
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """
+    正規化済みURL1件分のキャッシュメタデータ。
+    本体（HTML / Markdown）はハッシュをキーにした blob として別ファイルに保存されます。
+    """
+    url: str
+    content_hash: str
+    html_hash: Optional[str] = None
+    markdown_hash: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    hrefs: list = field(default_factory=list)
+    last_used: float = 0.0
+    # Markdownを抽出したときの抽出器のバージョンとルールのキー（extractor.extraction_key()）
+    extraction_key: Optional[str] = None
+
+    def blob_hashes(self) -> list:
+        return [h for h in (self.html_hash, self.markdown_hash) if h]
+
+
+class PageCache:
+    """
+    再クロール用のディスクキャッシュ。
+
+    URLごとのメタデータ（ETag / Last-Modified / コンテンツハッシュ / リンク）を index.json に、
+    生HTMLと抽出済みMarkdownをコンテンツアドレス方式の blob として保存します。
+    同じ内容を持つ複数のURLは blob を共有します。
+    extraction_key を渡した場合、異なる抽出器のバージョンやルールで抽出したMarkdownは再利用しません。
+    合計サイズが max_bytes を超えた場合は、最後に使われた時刻が古いエントリから削除します（LRU）。
+    エントリは使われた順に並べて保持するため、削除のたびに並べ替える必要はありません。
+    blob の読み書きはイベントループを止めないよう、スレッドで行います。
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, extraction_key: Optional[str] = None):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.objects_dir = self.cache_dir / "objects"
+        self.max_bytes = max_bytes
+        self.extraction_key = extraction_key
+
+        # 正規化済みURL → エントリ（最後に使われた時刻が古い順）
+        self.entries = OrderedDict()
+        # blobハッシュごとのサイズと参照数
+        self.blob_sizes = {}
+        self.blob_refs = {}
+        # 書き込み中の blob のハッシュ → 書き込みのタスク
+        self.writing = {}
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def _load(self):
+        """
+        index.json を読み込み、blob の参照数と合計サイズを再計算します。
+        """
+        index_path = self.cache_dir / INDEX_FILENAME
+        if not index_path.exists():
+            return
+
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                raw_entries = json.load(f).get("entries", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"キャッシュインデックスを読み込めませんでした（空のキャッシュで開始します）: {e}")
+            return
+
+        for data in sorted(raw_entries.values(), key=lambda data: data.get("last_used", 0.0)):
+            entry = CacheEntry(**data)
+            # blobが欠けているエントリは使えないので捨てる
+            if not all(self._blob_path(h).exists() for h in entry.blob_hashes()):
+                continue
+            self.entries[entry.url] = entry
+            for digest in entry.blob_hashes():
+                self._add_ref(digest, self._blob_path(digest).stat().st_size)
+
+    def _add_ref(self, digest: str, size: int):
+        if digest not in self.blob_refs:
+            self.blob_refs[digest] = 0
+            self.blob_sizes[digest] = size
+            self.total_bytes += size
+        self.blob_refs[digest] += 1
+
+    def _release_ref(self, digest: str):
+        self.blob_refs[digest] -= 1
+        if self.blob_refs[digest] > 0:
+            return
+        del self.blob_refs[digest]
+        self.total_bytes -= self.blob_sizes.pop(digest)
+        try:
+            self._blob_path(digest).unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _write_file(path: Path, encoded: bytes):
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_file(path: Path) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    async def _write_blob(self, data: str) -> str:
+        """
+        データを blob として保存し、そのハッシュを返します。同一内容の blob は再利用します。
+        書き込みの前に参照を数えておくため、書き込み中の blob が削除されることはありません。
+        """
+        encoded = data.encode("utf-8")
+        digest = content_hash(encoded)
+        shared = digest in self.blob_refs
+        self._add_ref(digest, len(encoded))
+        task = self.writing.get(digest)
+        if task is None and not shared:
+            task = asyncio.ensure_future(asyncio.to_thread(self._write_file, self._blob_path(digest), encoded))
+            self.writing[digest] = task
+            task.add_done_callback(lambda _: self.writing.pop(digest, None))
+        if task is not None:
+            try:
+                # 同じ blob を待っている他のページの書き込みを取り消さない
+                await asyncio.shield(task)
+            except BaseException:
+                self._release_ref(digest)
+                raise
+        return digest
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """
+        再利用可能な（同じ抽出の条件でMarkdownまで保存済みの）エントリを返します。
+        """
+        entry = self.entries.get(url)
+        if entry is None or entry.markdown_hash is None or entry.extraction_key != self.extraction_key:
+            self.misses += 1
+            return None
+        return entry
+
+    async def load_markdown(self, entry: CacheEntry) -> Optional[str]:
+        """
+        エントリに対応する抽出済みMarkdownを読み込み、LRU上の使用時刻を更新します。
+        """
+        try:
+            markdown = await asyncio.to_thread(self._read_file, self._blob_path(entry.markdown_hash))
+        except OSError:
+            return None
+        entry.last_used = time.time()
+        if self.entries.get(entry.url) is entry:
+            self.entries.move_to_end(entry.url)
+        self.hits += 1
+        return markdown
+
+    async def store_page(self, url: str, html_content: str, hash_value: str,
+                   etag: Optional[str] = None, last_modified: Optional[str] = None, hrefs=None):
+        """
+        取得したページの生HTMLと検証用ヘッダーを保存します。
+        Markdownは抽出完了後に store_markdown() で追加されます。
+        """
+        old = self.entries.pop(url, None)
+        if old:
+            for digest in old.blob_hashes():
+                self._release_ref(digest)
+
+        html_hash = await self._write_blob(html_content)
+        if url in self.entries:
+            # 書き込みを待つ間に同じURLが保存された場合は、新しい方を残す
+            self._release_ref(html_hash)
+            return
+        self.entries[url] = CacheEntry(
+            url=url,
+            content_hash=hash_value,
+            html_hash=html_hash,
+            etag=etag,
+            last_modified=last_modified,
+            hrefs=list(hrefs or []),
+            last_used=time.time(),
+        )
+        self._evict()
+
+    async def store_markdown(self, url: str, markdown: str):
+        """
+        抽出済みMarkdownをエントリに追加します。
+        """
+        if url not in self.entries:
+            return
+        markdown_hash = await self._write_blob(markdown)
+        entry = self.entries.get(url)
+        if entry is None:
+            # 書き込みを待つ間にエントリが削除された
+            self._release_ref(markdown_hash)
+            return
+        if entry.markdown_hash:
+            self._release_ref(entry.markdown_hash)
+        entry.markdown_hash = markdown_hash
+        entry.extraction_key = self.extraction_key
+        self._evict()
+
+    def _evict(self):
+        """
+        上限を超えた場合、最も古く使われたエントリから削除します。
+        上限付近で保存のたびに削除が起きないよう、上限の90%まで一度にまとめて削除します。
+        """
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        while self.entries and self.total_bytes > target:
+            _, entry = self.entries.popitem(last=False)
+            for digest in entry.blob_hashes():
+                self._release_ref(digest)
+
+    def save(self):
+        """
+        インデックスをアトミックにディスクへ書き出します。
+        """
+        index_path = self.cache_dir / INDEX_FILENAME
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"entries": {url: asdict(e) for url, e in self.entries.items()}}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
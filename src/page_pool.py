@@ -0,0 +1,274 @@
+import asyncio
+from collections import Counter, deque
+from typing import Awaitable, Callable, Optional
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Chromium の JavaScript ヒープ使用量（取得できない場合は0）
+JS_HEAP_SCRIPT = "() => (performance.memory ? performance.memory.usedJSHeapSize : 0)"
+
+
+class PooledPage:
+    """
+    プールが管理する1つの作業枠。専用のブラウザコンテキストとページを持ちます。
+    """
+    def __init__(self, browser_index: int, browser, context, page):
+        self.browser_index = browser_index
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.crashed = False
+
+    def mark_crashed(self, *_):
+        self.crashed = True
+
+
+class PagePool:
+    """
+    ページとブラウザコンテキストを使い回すワーカープール。
+
+    URLごとに new_page() / close() を行う代わりに、最大 size 個の作業枠を再利用します。
+    各作業枠は専用のコンテキストを持ち、context_max_pages ページを処理するか
+    JSヒープ使用量が memory_limit_mb を超えた時点でコンテキストごと作り直します。
+    ヒープ使用量の取得はブラウザとの往復が必要なため、返却のたびではなく memory_check_interval ページごとに確かめます。
+    作業枠は browsers 個のブラウザプロセスに順番に割り当てられ、
+    いずれかのプロセスがクラッシュした場合はそのプロセスだけを再起動します。
+    """
+    def __init__(self, playwright, size: int, browsers: int = 1, context_max_pages: int = 100,
+                 memory_limit_mb: Optional[int] = 512, memory_check_interval: int = 10,
+                 on_new_context: Optional[Callable[[object], Awaitable[None]]] = None):
+        self.playwright = playwright
+        self.size = max(1, size)
+        self.context_max_pages = context_max_pages
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self.memory_check_interval = max(1, memory_check_interval)
+        self.on_new_context = on_new_context
+
+        self.browsers = [None] * max(1, browsers)
+        self.next_browser = 0
+        self.browser_lock = asyncio.Lock()
+
+        self.idle = []
+        self.total = 0
+        self.condition = asyncio.Condition()
+
+        self.contexts_created = 0
+        self.browsers_launched = 0
+
+    async def acquire(self) -> PooledPage:
+        """
+        空いている作業枠を取得します。なければ上限まで新しく作り、上限に達していれば空くまで待機します。
+        """
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.idle or self.total < self.size)
+            slot = self.idle.pop() if self.idle else None
+            if slot is None:
+                self.total += 1
+
+        if slot is not None:
+            if self._is_alive(slot):
+                return slot
+            await self._dispose(slot)
+
+        try:
+            return await self._create_slot()
+        except BaseException:
+            async with self.condition:
+                self.total -= 1
+                self.condition.notify()
+            raise
+
+    async def release(self, slot: PooledPage, broken: bool = False):
+        """
+        作業枠を返却します。エラーが起きた場合や上限に達した場合はコンテキストを作り直します。
+        """
+        slot.uses += 1
+        recycle = (broken or slot.crashed or not self._is_alive(slot)
+                   or slot.uses >= self.context_max_pages or await self._over_memory(slot))
+        if recycle:
+            await self._dispose(slot)
+            async with self.condition:
+                self.total -= 1
+                self.condition.notify()
+            return
+
+        async with self.condition:
+            self.idle.append(slot)
+            self.condition.notify()
+
+    async def close(self):
+        """
+        全てのコンテキストとブラウザを閉じます。
+        """
+        for slot in self.idle:
+            await self._dispose(slot)
+        self.idle = []
+        for browser in self.browsers:
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+        self.browsers = [None] * len(self.browsers)
+
+    def _is_alive(self, slot: PooledPage) -> bool:
+        browser = self.browsers[slot.browser_index]
+        return not slot.crashed and browser is slot.browser and browser.is_connected()
+
+    async def _over_memory(self, slot: PooledPage) -> bool:
+        if self.memory_limit_bytes is None or slot.uses % self.memory_check_interval:
+            return False
+        try:
+            used = await slot.page.evaluate(JS_HEAP_SCRIPT)
+        except Exception:
+            # 評価できないページは壊れているとみなして作り直す
+            return True
+        if used > self.memory_limit_bytes:
+            logger.info(f"JSヒープが上限を超えたためコンテキストを作り直します ({used / 1024 / 1024:.0f} MB)")
+            return True
+        return False
+
+    async def _get_browser(self, index: int):
+        """
+        指定番号のブラウザプロセスを返します。未起動またはクラッシュしていれば起動します。
+        """
+        async with self.browser_lock:
+            browser = self.browsers[index]
+            if browser is None or not browser.is_connected():
+                if browser is not None:
+                    logger.warning(f"ブラウザプロセス {index} が切断されたため再起動します")
+                browser = await self.playwright.chromium.launch(headless=True)
+                self.browsers[index] = browser
+                self.browsers_launched += 1
+            return browser
+
+    async def _create_slot(self) -> PooledPage:
+        index = self.next_browser
+        self.next_browser = (self.next_browser + 1) % len(self.browsers)
+
+        browser = await self._get_browser(index)
+        context = await browser.new_context()
+        try:
+            if self.on_new_context:
+                await self.on_new_context(context)
+            page = await context.new_page()
+        except BaseException:
+            await context.close()
+            raise
+
+        self.contexts_created += 1
+        slot = PooledPage(index, browser, context, page)
+        page.on("crash", slot.mark_crashed)
+        return slot
+
+    async def _dispose(self, slot: PooledPage):
+        try:
+            await slot.context.close()
+        except Exception:
+            # ブラウザごと落ちている場合など
+            pass
+
+
+class FairPagePool:
+    """
+    1つの PagePool を複数のサイト（ホスト）で共有するためのラッパー。
+
+    作業枠が空くたびに、待機しているホストへ順番に（ラウンドロビンで）割り当てます。
+    ページ数の多いサイトが待機列を埋めても、他のサイトが作業枠を得られなくなることはありません。
+    各サイトのクローラーには lease() で得た PoolLease を PagePool の代わりに渡します。
+    """
+    def __init__(self, pool: PagePool):
+        self.pool = pool
+        self.available = pool.size
+        # ホスト → 作業枠を待っている Future の列
+        self.waiters = {}
+        # 待機中のホストの順番（先頭のホストに次の作業枠を割り当てる）
+        self.turns = deque()
+        self.granted = Counter()
+
+    def lease(self, host: str) -> "PoolLease":
+        return PoolLease(self, host)
+
+    async def acquire(self, host: str) -> PooledPage:
+        """
+        host のために作業枠を取得します。空きがなければ、自分の順番が来るまで待機します。
+        """
+        if self.available > 0 and not self.turns:
+            self.available -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            queue = self.waiters.get(host)
+            if queue is None:
+                queue = self.waiters[host] = deque()
+                self.turns.append(host)
+            queue.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                # 割り当て済みの枠を受け取る前に取り消された場合は、次の待機者に回す
+                if future.done() and not future.cancelled():
+                    self._hand_over()
+                raise
+
+        try:
+            slot = await self.pool.acquire()
+        except BaseException:
+            self._hand_over()
+            raise
+        self.granted[host] += 1
+        return slot
+
+    async def release(self, slot: PooledPage, broken: bool = False):
+        try:
+            await self.pool.release(slot, broken=broken)
+        finally:
+            self._hand_over()
+
+    def _hand_over(self):
+        """
+        空いた作業枠を、順番が来ているホストの最も古い待機者に割り当てます。
+        """
+        while self.turns:
+            host = self.turns.popleft()
+            queue = self.waiters[host]
+            future = queue.popleft()
+            if queue:
+                self.turns.append(host)
+            else:
+                del self.waiters[host]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.available += 1
+
+    async def close(self):
+        await self.pool.close()
+
+
+class PoolLease:
+    """
+    FairPagePool を1つのサイトから PagePool と同じ形で使うための窓口。
+    プール自体は共有されているため、close() では何もしません。
+    """
+    def __init__(self, shared: FairPagePool, host: str):
+        self.shared = shared
+        self.host = host
+
+    @property
+    def contexts_created(self) -> int:
+        return self.shared.pool.contexts_created
+
+    @property
+    def browsers_launched(self) -> int:
+        return self.shared.pool.browsers_launched
+
+    async def acquire(self) -> PooledPage:
+        return await self.shared.acquire(self.host)
+
+    async def release(self, slot: PooledPage, broken: bool = False):
+        await self.shared.release(slot, broken=broken)
+
+    async def close(self):
+        pass
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# サーバーが混雑・制限を示すステータスコード
+THROTTLE_STATUSES = (429, 503)
+
+
+class ThrottledError(Exception):
+    """
+    サーバーからリクエスト制限（429 / 503）を受けたことを示す例外。
+    """
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status} (Retry-After: {retry_after})")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After ヘッダー（秒数またはHTTP日付）を待機秒数に変換します。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    rate 個/秒でトークンが補充され、最大 burst 個まで貯まるトークンバケット。
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        # トークンの補充を計算した時刻（一時停止中は未来の時刻になる）
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """
+        トークンを1つ予約し、使用可能になるまでの待機秒数を返します。
+        トークンが足りない場合は負債として予約するため、待機中のリクエストは到着順に間隔を空けて実行されます。
+        """
+        now = time.monotonic()
+        if self.rate <= 0:
+            # レート無制限でも一時停止は守る
+            return max(0.0, self.updated - now)
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        self.tokens -= 1
+        deficit = max(0.0, -self.tokens) / self.rate
+        return (self.updated - now) + deficit
+
+    def pause(self, seconds: float):
+        """
+        指定秒数の間、新しいトークンの払い出しを止めます（Retry-After 対応）。
+        """
+        until = time.monotonic() + seconds
+        if until > self.updated:
+            self.updated = until
+            # 停止明けに最初の1件だけを通し、残りはレートに従って間隔を空ける
+            self.tokens = min(self.tokens, 1.0)
+
+
+class HostRateLimiter:
+    """
+    ホストごとにトークンバケットを持ち、リクエストの開始レートを制限するスケジューラ。
+    """
+    def __init__(self, rate: float = 2.0, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def acquire(self, url: str):
+        """
+        URLのホストに対してリクエストを開始してよくなるまで待機します。
+        """
+        wait = self.bucket(urlparse(url).netloc).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, url: str, seconds: float):
+        """
+        URLのホストへのリクエストを一時停止します。
+        """
+        logger.warning(f"{urlparse(url).netloc} へのリクエストを {seconds:.1f} 秒停止します")
+        self.bucket(urlparse(url).netloc).pause(seconds)
+
+    def set_rate(self, host: str, rate: float):
+        """
+        特定ホストのレートを変更します（robots.txt の Crawl-delay など）。
+        """
+        self.bucket(host).rate = rate
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD（加算的増加・乗算的減少）で同時実行数の上限を調整するコントローラ。
+
+    レイテンシが基準値（指数移動平均）の latency_tolerance 倍以内で成功が続く間は、
+    上限あたり1回分の成功ごとに上限を1ずつ増やします。
+    制限（429 / 503）やタイムアウトを受けた場合は上限に decrease_factor を掛けて減らします。
+    同時に発生した失敗で何度も減らさないよう、減少は cooldown 秒に1回までとします。
+    """
+    def __init__(self, maximum: int, minimum: int = 1, initial: Optional[int] = None,
+                 latency_tolerance: float = 3.0, decrease_factor: float = 0.5, cooldown: float = 1.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(initial if initial is not None else max(self.minimum, self.maximum // 2))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self.last_decrease = float("-inf")
+        self.condition = asyncio.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    async def acquire(self):
+        """
+        実行枠が空くまで待機し、枠を1つ確保します。
+        """
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+
+    async def release(self):
+        """
+        実行枠を返却し、待機中のタスクを起こします。
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self, latency: float):
+        """
+        成功したリクエストのレイテンシを記録し、健全であれば上限を増やします。
+        """
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+        healthy = latency <= self.baseline_latency * self.latency_tolerance
+        self.baseline_latency = 0.9 * self.baseline_latency + 0.1 * latency
+        if healthy:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_throttle(self):
+        """
+        サーバーから制限を受けたときに上限を減らします。
+        """
+        self._decrease("制限")
+
+    def on_error(self):
+        """
+        タイムアウトなどの失敗時に上限を減らします。
+        """
+        self._decrease("エラー")
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        previous = self.current_limit
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        if self.current_limit != previous:
+            logger.info(f"{reason}を検知したため並列数を {previous} → {self.current_limit} に減らします")
@@ -0,0 +1,95 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# メインコンテンツのテキスト長が stableMs の間変化しなくなるまで待つ。
+# MutationObserver で DOM の変化を監視し、timeoutMs で必ず打ち切る。
+STABILITY_SCRIPT = '''({stableMs, timeoutMs, minTextLength}) => new Promise((resolve) => {
+    const started = performance.now();
+    const pick = () => document.querySelector('main') || document.querySelector('article')
+        || document.querySelector('[role="main"]') || document.body;
+    let lastLength = -1;
+    let stableTimer = null;
+    let observer = null;
+    const finish = (reason) => {
+        if (observer) observer.disconnect();
+        clearTimeout(stableTimer);
+        clearTimeout(capTimer);
+        resolve({reason, textLength: lastLength, elapsedMs: performance.now() - started});
+    };
+    const check = () => {
+        const node = pick();
+        const length = node ? node.textContent.length : 0;
+        if (length === lastLength) return;
+        lastLength = length;
+        clearTimeout(stableTimer);
+        if (length >= minTextLength) {
+            stableTimer = setTimeout(() => finish('stable'), stableMs);
+        }
+    };
+    const capTimer = setTimeout(() => finish('timeout'), timeoutMs);
+    observer = new MutationObserver(check);
+    observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    check();
+})'''
+
+
+@dataclass
+class ReadinessResult:
+    """
+    描画完了待ちの結果。reason は "selector" / "stable" / "timeout" / "error" のいずれか。
+    """
+    reason: str
+    elapsed: float
+    text_length: int = -1
+
+
+class RenderReadiness:
+    """
+    ページの描画完了を検出する戦略。
+
+    selector を指定した場合はその要素が現れるまで待ちます。
+    指定しない場合は、メインコンテンツ（main / article / body）のテキスト長が
+    stable_ms ミリ秒の間変化しなくなった時点で描画完了とみなします。
+    いずれの場合も timeout 秒で打ち切り、その時点のDOMをそのまま使います。
+    """
+    def __init__(self, selector: Optional[str] = None, stable_ms: int = 300, timeout: float = 10.0,
+                 min_text_length: int = 1):
+        self.selector = selector
+        self.stable_ms = stable_ms
+        self.timeout = timeout
+        self.min_text_length = min_text_length
+
+    async def wait(self, page) -> ReadinessResult:
+        """
+        描画完了まで待機し、その結果を返します。
+        """
+        started = time.perf_counter()
+        if self.selector:
+            try:
+                await page.wait_for_selector(self.selector, state="attached", timeout=self.timeout * 1000)
+                reason = "selector"
+            except Exception as e:
+                logger.debug(f"セレクタ待機を打ち切りました ({self.selector}): {e}")
+                reason = "timeout"
+            return ReadinessResult(reason=reason, elapsed=time.perf_counter() - started)
+
+        try:
+            result = await page.evaluate(STABILITY_SCRIPT, {
+                "stableMs": self.stable_ms,
+                "timeoutMs": self.timeout * 1000,
+                "minTextLength": self.min_text_length,
+            })
+        except Exception as e:
+            # クライアントサイドのリダイレクトなどで実行コンテキストが破棄された場合
+            logger.debug(f"描画完了の検出に失敗しました: {e}")
+            return ReadinessResult(reason="error", elapsed=time.perf_counter() - started)
+
+        return ReadinessResult(
+            reason=result["reason"],
+            elapsed=time.perf_counter() - started,
+            text_length=result["textLength"],
+        )
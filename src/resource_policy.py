@@ -0,0 +1,156 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 本文の描画に必要なリソースタイプのみを既定で許可する
+DEFAULT_ALLOWED_TYPES = ("document", "script", "xhr", "fetch", "stylesheet")
+
+# 代表的なアクセス解析・広告・トラッキングのドメイン
+DEFAULT_DENIED_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "hotjar.com",
+    "segment.com",
+    "segment.io",
+    "mixpanel.com",
+    "amplitude.com",
+    "clarity.ms",
+    "fullstory.com",
+    "intercom.io",
+    "hs-analytics.net",
+    "plausible.io",
+)
+
+
+def _matches_domain(host: str, domains) -> bool:
+    """
+    ホストが domains のいずれか（またはそのサブドメイン）に一致するかを判定します。
+    """
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+@dataclass
+class ResourceStats:
+    """
+    1ページの描画中に発生したリクエストの統計。
+    読み込んだバイト数はレスポンスの Content-Length から求めた概算値です。
+    """
+    requests_allowed: int = 0
+    requests_blocked: int = 0
+    bytes_loaded: int = 0
+    blocked_by_type: Counter = field(default_factory=Counter)
+
+    def summary(self) -> str:
+        blocked_types = ", ".join(f"{t}={n}" for t, n in self.blocked_by_type.most_common())
+        return (f"許可 {self.requests_allowed} 件 (約 {self.bytes_loaded:,} バイト) / "
+                f"ブロック {self.requests_blocked} 件" + (f" [{blocked_types}]" if blocked_types else ""))
+
+
+class ResourcePolicy:
+    """
+    ブラウザコンテキストのリクエストをリソースタイプとドメインで振り分けるポリシー。
+
+    - deny_domains に一致するドメインへのリクエストは常にブロックします。
+    - allow_domains を指定した場合、それ以外のドメインへのリクエストはブロックします。
+    - allowed_types に含まれないリソースタイプ（画像・フォント・メディアなど）はブロックします。
+      allowed_types=None の場合はタイプによる制限を行いません。
+    """
+    def __init__(self, allowed_types=DEFAULT_ALLOWED_TYPES, allow_domains=None, deny_domains=DEFAULT_DENIED_DOMAINS):
+        self.allowed_types = frozenset(allowed_types) if allowed_types is not None else None
+        self.allow_domains = tuple(d.lower() for d in allow_domains or ())
+        self.deny_domains = tuple(d.lower() for d in deny_domains or ())
+
+        # ページごとの統計（track() で登録されたページのみ集計する）
+        self.page_stats = {}
+        self.total = ResourceStats()
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """
+        リクエストをブロックすべきかを判定します。
+        """
+        parsed = urlparse(url)
+        if parsed.scheme in ("data", "blob"):
+            return False
+
+        host = (parsed.hostname or "").lower()
+        if self.deny_domains and _matches_domain(host, self.deny_domains):
+            return True
+        if self.allow_domains and not _matches_domain(host, self.allow_domains):
+            return True
+        if self.allowed_types is not None and resource_type not in self.allowed_types:
+            return True
+        return False
+
+    @property
+    def blocks_nothing(self) -> bool:
+        """
+        何も制限しないポリシーかどうか。
+        """
+        return self.allowed_types is None and not self.allow_domains and not self.deny_domains
+
+    async def install(self, context):
+        """
+        ブラウザコンテキストにルートハンドラを登録します。
+        何も制限しないポリシーの場合は、インターセプトのオーバーヘッドを避けるため登録しません。
+        """
+        if self.blocks_nothing:
+            return
+        await context.route("**/*", self._handle_route)
+
+    def track(self, page) -> ResourceStats:
+        """
+        ページの統計を初期化し、レスポンスの受信を記録するようにします。
+        """
+        stats = ResourceStats()
+        self.page_stats[page] = stats
+        page.on("response", self._on_response)
+        return stats
+
+    def untrack(self, page) -> ResourceStats:
+        """
+        ページの統計の記録を終了し、全体の統計に加算して返します。
+        """
+        page.remove_listener("response", self._on_response)
+        stats = self.page_stats.pop(page, None) or ResourceStats()
+        self.total.requests_allowed += stats.requests_allowed
+        self.total.requests_blocked += stats.requests_blocked
+        self.total.bytes_loaded += stats.bytes_loaded
+        self.total.blocked_by_type.update(stats.blocked_by_type)
+        return stats
+
+    def _stats_for(self, request):
+        try:
+            return self.page_stats.get(request.frame.page)
+        except Exception:
+            # Service Worker などページに紐づかないリクエスト
+            return None
+
+    async def _handle_route(self, route):
+        request = route.request
+        stats = self._stats_for(request)
+        if self.should_block(request.resource_type, request.url):
+            if stats is not None:
+                stats.requests_blocked += 1
+                stats.blocked_by_type[request.resource_type] += 1
+            await route.abort("blockedbyclient")
+            return
+
+        if stats is not None:
+            stats.requests_allowed += 1
+        await route.continue_()
+
+    def _on_response(self, response):
+        stats = self._stats_for(response.request)
+        if stats is None:
+            return
+        try:
+            stats.bytes_loaded += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urlparse
+from .logger import setup_logger
+from .metrics import Histogram
+
+logger = setup_logger(__name__)
+
+# タイムアウトを観測値から決めるまでに必要な、ホストごとの成功したページの数
+MIN_TIMEOUT_SAMPLES = 10
+
+# 半開きのサーキットで回復を確かめている間、他のページを待たせる秒数
+PROBE_WAIT = 1.0
+
+
+class TransientError(Exception):
+    """
+    時間をおけば成功する可能性のある失敗（5xx・接続エラーなど）を示す例外。
+    """
+
+
+class CircuitOpenError(Exception):
+    """
+    失敗が続いているホストへのリクエストを止めている（サーキットブレーカーが開いている）ことを示す例外。
+    retry_after は、再びリクエストを試せるようになるまでの秒数です。
+    gave_up が True の場合は、回復の確認が続けて失敗したため、このホストへのリクエストを諦めたことを示します。
+    """
+    def __init__(self, host: str, retry_after: float, gave_up: bool = False):
+        message = f"{host} で失敗が続いたためリクエストを諦めました" if gave_up else \
+            f"{host} へのリクエストを停止中 (あと {retry_after:.1f} 秒)"
+        super().__init__(message)
+        self.host = host
+        self.retry_after = retry_after
+        self.gave_up = gave_up
+
+
+@dataclass
+class RetryPolicy:
+    """
+    失敗したページの再試行の方針。
+
+    max_attempts は最初の試行を含めた試行回数の上限です（1で再試行しない）。
+    n 回目の失敗の後は base_delay * 2^(n-1) 秒（最大 max_delay 秒）待ってから再試行します。
+    複数のページが同時に失敗しても再試行が重ならないよう、待ち時間は jitter の割合だけ乱数で短くします。
+    """
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    jitter: float = 0.5
+
+    def should_retry(self, failures: int) -> bool:
+        return failures < self.max_attempts
+
+    def delay(self, failures: int, rng: random.Random = random) -> float:
+        """
+        failures 回目の失敗の後、再試行までに待つ秒数を返します。
+        """
+        backoff = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        return backoff * (1.0 - self.jitter * rng.random())
+
+
+class RetryQueue:
+    """
+    再試行を待つURLのキュー。再試行できる時刻の順に取り出します。
+
+    新しいURLのキュー（フロンティア）とは分けて持つため、待機中の再試行が実行枠や新しいURLの処理を妨げません。
+    """
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def push(self, url: str, delay: float):
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), url))
+
+    def pop_due(self) -> Optional[str]:
+        """
+        再試行の時刻が来たURLを1つ取り出します。なければ None を返します。
+        """
+        if self.heap and self.heap[0][0] <= time.monotonic():
+            return heapq.heappop(self.heap)[2]
+        return None
+
+    def next_due_in(self) -> Optional[float]:
+        """
+        次のURLの再試行の時刻までの秒数を返します。キューが空なら None を返します。
+        """
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def urls(self) -> List[str]:
+        """
+        再試行を待っている全てのURLを返します。
+        """
+        return [url for _, _, url in self.heap]
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+
+class HostTimeouts:
+    """
+    ホストごとに成功したページの読み込み時間を記録し、そのp95からタイムアウトを決めるクラス。
+
+    観測値が MIN_TIMEOUT_SAMPLES 件に満たないホストは initial 秒、それ以降は p95 の multiplier 倍を
+    minimum〜maximum 秒の範囲に収めた値を使います。再試行ではタイムアウトを試行ごとに2倍にします（最大 maximum 秒）。
+    """
+    def __init__(self, initial: float = 30.0, minimum: float = 5.0, maximum: float = 120.0, multiplier: float = 3.0):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = max(maximum, initial)
+        self.multiplier = multiplier
+        self.histograms = {}
+
+    def observe(self, url: str, seconds: float):
+        host = urlparse(url).netloc
+        if host not in self.histograms:
+            # 最近の傾向に追従できるよう、保持する観測値は少なめにする
+            self.histograms[host] = Histogram(sample_size=200)
+        self.histograms[host].observe(seconds)
+
+    def p95(self, host: str) -> Optional[float]:
+        histogram = self.histograms.get(host)
+        if histogram is None or histogram.count < MIN_TIMEOUT_SAMPLES:
+            return None
+        return histogram.quantile(0.95)
+
+    def timeout_for(self, url: str, attempt: int = 1) -> float:
+        """
+        URLの attempt 回目の試行に使うタイムアウト（秒）を返します。
+        """
+        p95 = self.p95(urlparse(url).netloc)
+        base = self.initial if p95 is None else min(self.maximum, max(self.minimum, p95 * self.multiplier))
+        return min(self.maximum, base * 2 ** (attempt - 1))
+
+
+class _Circuit:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self.probing = False
+
+
+class CircuitBreaker:
+    """
+    ホストごとのサーキットブレーカー。
+
+    再試行の対象となる失敗が threshold 回続いたホストは、cooldown 秒の間リクエストを止めます（開いた状態）。
+    cooldown が過ぎたら1ページだけ試し（半開き）、成功すれば元に戻し、失敗すればまた止めます。
+    続けて開くたびに cooldown は2倍になり（最大 max_cooldown 秒）、回復の確認が max_probes 回続けて失敗した
+    ホストへのリクエストは諦めます。threshold=0 で無効です。
+    """
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0, max_probes: int = 3):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_probes = max_probes
+        self.circuits = {}
+
+    def _circuit(self, url: str) -> _Circuit:
+        host = urlparse(url).netloc
+        if host not in self.circuits:
+            self.circuits[host] = _Circuit()
+        return self.circuits[host]
+
+    def check(self, url: str):
+        """
+        URLのホストへリクエストしてよいかを判定し、止めている場合は CircuitOpenError を送出します。
+        """
+        if self.threshold <= 0:
+            return
+        circuit = self._circuit(url)
+        if circuit.failures < self.threshold:
+            return
+        host = urlparse(url).netloc
+        if circuit.trips > self.max_probes:
+            raise CircuitOpenError(host, 0.0, gave_up=True)
+        remaining = circuit.open_until - time.monotonic()
+        if remaining > 0:
+            raise CircuitOpenError(host, remaining)
+        if circuit.probing:
+            raise CircuitOpenError(host, PROBE_WAIT)
+        # 止めている時間が過ぎたので、このページで回復を確かめる
+        circuit.probing = True
+
+    def record_success(self, url: str):
+        circuit = self._circuit(url)
+        if circuit.failures >= self.threshold > 0:
+            logger.info(f"{urlparse(url).netloc} へのリクエストを再開します")
+        circuit.failures = 0
+        circuit.trips = 0
+        circuit.probing = False
+
+    def record_failure(self, url: str):
+        if self.threshold <= 0:
+            return
+        circuit = self._circuit(url)
+        circuit.failures += 1
+        if circuit.failures >= self.threshold and (circuit.probing or circuit.failures == self.threshold):
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** circuit.trips)
+            circuit.trips += 1
+            circuit.open_until = time.monotonic() + cooldown
+            circuit.probing = False
+            logger.warning(f"{urlparse(url).netloc} で失敗が続いているため、{cooldown:.0f} 秒間リクエストを止めます")
+
+    def release(self, url: str):
+        """
+        成功とも失敗ともいえない結果（制限を受けた・ページの処理中のエラーなど）で試行が終わったことを記録します。
+        回復を確かめていたページであれば、次のページで確かめ直します。
+        """
+        if self.threshold > 0:
+            self._circuit(url).probing = False
+
+    def open_hosts(self) -> List[str]:
+        """
+        現在リクエストを止めているホストの一覧を返します。
+        """
+        now = time.monotonic()
+        return [host for host, circuit in self.circuits.items()
+                if circuit.failures >= self.threshold > 0 and (circuit.open_until > now or circuit.probing)]
@@ -0,0 +1,149 @@
+import zlib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from urllib.robotparser import RobotFileParser
+import httpx
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# robots.txt の User-agent 行と照合する名前
+ROBOTS_AGENT = "docs2notebook-crawler"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass
+class SitemapEntry:
+    """
+    サイトマップの <url> 要素1件分。lastmod はUNIX時刻（秒）で、記載がなければ None。
+    """
+    url: str
+    lastmod: Optional[float] = None
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """
+    W3C Datetime 形式の lastmod をUNIX時刻に変換します。タイムゾーンがなければUTCとみなします。
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+class SitemapSeeder:
+    """
+    robots.txt とサイトマップからクロール対象のURLを事前に収集するクラス。
+
+    サイトマップインデックスは max_depth 段まで再帰的にたどり、gzip 圧縮されたサイトマップにも対応します。
+    XMLはストリーミングで解析するため、巨大なサイトマップでもメモリ使用量は一定です。
+    """
+    def __init__(self, client: httpx.AsyncClient, max_urls: int = 50000, max_depth: int = 3):
+        self.client = client
+        self.max_urls = max_urls
+        self.max_depth = max_depth
+        self.emitted = 0
+
+    async def fetch_robots(self, origin: str) -> RobotFileParser:
+        """
+        robots.txt を取得して解析します（RFC 9309）。
+        401 / 403 の場合は全てのURLを禁止するルールを返します。5xx・429 や接続エラーで取得できない場合も、
+        サーバーの状態が分からないため全て禁止として扱います。それ以外の 4xx の場合は全てのURLを許可します。
+        """
+        robots = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            response = await self.client.get(robots.url)
+        except httpx.HTTPError as e:
+            logger.warning(f"robots.txt を取得できないため、全てのURLを禁止として扱います: {e}")
+            robots.disallow_all = True
+            return robots
+
+        status = response.status_code
+        if status in (401, 403):
+            logger.warning(f"robots.txt へのアクセスが拒否されたため ({status})、全てのURLを禁止として扱います")
+            robots.disallow_all = True
+            return robots
+        if status >= 500 or status == 429:
+            logger.warning(f"robots.txt を一時的に取得できないため ({status})、全てのURLを禁止として扱います")
+            robots.disallow_all = True
+            return robots
+        if status != 200:
+            robots.allow_all = True
+            return robots
+
+        robots.parse(response.text.splitlines())
+        return robots
+
+    async def iter_entries(self, sitemap_url: str, depth: int = 0) -> AsyncIterator[SitemapEntry]:
+        """
+        サイトマップに含まれるURLを順に返します。インデックス内の子サイトマップも展開します。
+        """
+        child_sitemaps = []
+        try:
+            async with self.client.stream("GET", sitemap_url) as response:
+                if response.status_code != 200:
+                    logger.debug(f"サイトマップを取得できませんでした ({response.status_code}): {sitemap_url}")
+                    return
+
+                parser = ET.XMLPullParser(events=("start", "end"))
+                root = None
+                decompressor = None
+                first_chunk = True
+                loc = lastmod = None
+
+                async for chunk in response.aiter_bytes():
+                    if first_chunk:
+                        # Content-Encoding ではなくファイル自体が gzip の場合
+                        if chunk.startswith(GZIP_MAGIC):
+                            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                        first_chunk = False
+                    if decompressor:
+                        chunk = decompressor.decompress(chunk)
+                    parser.feed(chunk)
+
+                    for event, elem in parser.read_events():
+                        if event == "start":
+                            if root is None:
+                                root = elem
+                            continue
+                        name = _local_name(elem.tag)
+                        if name == "loc":
+                            loc = (elem.text or "").strip()
+                        elif name == "lastmod":
+                            lastmod = elem.text
+                        elif name in ("url", "sitemap"):
+                            if loc and name == "url":
+                                self.emitted += 1
+                                yield SitemapEntry(loc, parse_lastmod(lastmod))
+                                if self.emitted >= self.max_urls:
+                                    logger.warning(f"サイトマップのURL数が上限 ({self.max_urls}) に達しました")
+                                    return
+                            elif loc:
+                                child_sitemaps.append(loc)
+                            loc = lastmod = None
+                            # 処理済みの要素を破棄してメモリを一定に保つ
+                            root.clear()
+        except (httpx.HTTPError, ET.ParseError, zlib.error) as e:
+            logger.warning(f"サイトマップの解析に失敗しました {sitemap_url}: {e}")
+            return
+
+        if child_sitemaps and depth >= self.max_depth:
+            logger.warning(f"サイトマップインデックスの階層が深すぎるため展開を打ち切ります: {sitemap_url}")
+            return
+        for child in child_sitemaps:
+            async for entry in self.iter_entries(child, depth + 1):
+                yield entry
+            if self.emitted >= self.max_urls:
+                return
@@ -1,49 +1,112 @@
-from urllib.parse import urlparse
+from typing import Optional
+from urllib.parse import SplitResult, urlsplit
+from .canonicalizer import CanonicalRules, UrlCanonicalizer
 from .logger import setup_logger
+from .sitemap import ROBOTS_AGENT
 
 logger = setup_logger(__name__)
 
+
+class UrlKeySet:
+    """
+    URLの文字列ではなく、そのハッシュ値（64ビット整数）だけを保持する集合。
+
+    数十万件のURLを扱う場合でもURLの文字列をメモリに残さずに済みます。
+    ハッシュ値はプロセス内でのみ有効なため、永続化には使えません（永続化はジャーナルが担います）。
+    """
+    __slots__ = ("keys",)
+
+    def __init__(self, urls=()):
+        self.keys = {hash(url) for url in urls}
+
+    def add(self, url: str) -> bool:
+        """
+        URLを追加します。新しく追加された場合は True を返します。
+        """
+        key = hash(url)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def discard(self, url: str):
+        self.keys.discard(hash(url))
+
+    def __contains__(self, url: str) -> bool:
+        return hash(url) in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
 class UrlManager:
     """
     URLの管理（正規化、バリデーション、状態管理）を行うクラス。
     """
-    def __init__(self, start_url: str, max_pages: int = 20):
-        self.start_url = self.normalize_url(start_url)
-        self.domain = urlparse(self.start_url).netloc
-        self.base_path = urlparse(self.start_url).path if urlparse(self.start_url).path else "/"
+    def __init__(self, start_url: str, max_pages: int = 20, rules: Optional[CanonicalRules] = None,
+                 cache_size: int = 16384, scope_path: Optional[str] = None):
+        self.canonicalizer = UrlCanonicalizer(rules)
+        start = self.canonicalizer.split(start_url)
+        self.start_url = start.geturl()
+        self.domain = start.netloc
+        # scope_path を指定しない場合は、開始URLのパス配下をクロール対象とする
+        self.base_path = scope_path or start.path or "/"
         self.max_pages = max_pages
-        
-        self.visited = set()
-        self.discovered = set()
-        self.discovered.add(self.start_url)
+        # 範囲内の正規化済みURLに共通する先頭部分。パスを書き換えるルールがなければ、
+        # この先頭部分で始まりクエリもフラグメントも持たないURLは分解せずにそのまま使える
+        self.scope_prefix = f"{start.scheme}://{start.netloc}{self.base_path}"
+        rules = self.canonicalizer.rules
+        self.fast_path = rules.trailing_slash == "keep" and not rules.strip_index and not rules.lowercase_path
+
+        # 発見済み・訪問済みのURLはハッシュ値のみで管理する（URLの一覧はジャーナルに記録される）
+        self.visited = UrlKeySet()
+        self.discovered = UrlKeySet([self.start_url])
         self.limit_reached_logged = False
 
+        # robots.txt のルール（urllib.robotparser.RobotFileParser、未設定なら制限なし）
+        self.robots = None
+        self.disallowed = UrlKeySet()
+
+        # ナビゲーションなど、多くのページに共通するリンクの正規化結果を使い回す
+        self.cache_size = cache_size
+        self.cache = {}
+
     def normalize_url(self, url: str) -> str:
         """
-        URLからフラグメントを除去して正規化します。
+        URLを正規化ルール（フラグメントやトラッキング用パラメータの除去など）に従って正規化します。
+        """
+        return self.canonicalizer.canonicalize(url)
+
+    def _in_scope(self, parts: SplitResult) -> bool:
+        # 同一ドメイン・http/https・ベースパス配下のみを対象とする
+        return (parts.netloc == self.domain and parts.scheme in ('http', 'https')
+                and parts.path.startswith(self.base_path))
+
+    def _allowed_by_robots(self, url: str) -> bool:
+        return self.robots is None or self.robots.can_fetch(ROBOTS_AGENT, url)
+
+    def canonicalize(self, url: str) -> Optional[str]:
+        """
+        URLを正規化し、クロール対象の範囲内であれば正規化したURLを、範囲外であれば None を返します。
+        robots.txt のルールは add_discovered() で確認します。
         """
-        parsed = urlparse(url)
-        return parsed._replace(fragment='').geturl()
+        if (self.fast_path and url.startswith(self.scope_prefix) and "?" not in url and "#" not in url
+                and not url[-1].isspace()):
+            return url
+        if url in self.cache:
+            return self.cache[url]
+        parts = self.canonicalizer.split(url)
+        canonical = parts.geturl() if self._in_scope(parts) else None
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[url] = canonical
+        return canonical
 
     def is_valid_url(self, url: str) -> bool:
         """
-        URLがクロール対象（同一ドメインかつhttp/https、ベースパス配下）かどうかを判定します。
+        URLがクロール対象（同一ドメインかつhttp/https、ベースパス配下、robots.txt で許可）かどうかを判定します。
         """
-        parsed = urlparse(url)
-        
-        # ドメインの一致を確認
-        if parsed.netloc != self.domain:
-            return False
-            
-        # http/httpsスキームのみを対象とする
-        if parsed.scheme not in ('http', 'https'):
-            return False
-            
-        # ベースパス内にあるか確認
-        if not parsed.path.startswith(self.base_path):
-            return False
-            
-        return True
+        return self._in_scope(urlsplit(url)) and self._allowed_by_robots(url)
 
     def can_crawl(self, url: str) -> bool:
         """
@@ -54,12 +117,17 @@ class UrlManager:
             return False
 
         # ページ数制限チェック
-        if len(self.visited) >= self.max_pages:
-            if not self.limit_reached_logged:
-                logger.warning(f"最大クロールページ数 {self.max_pages} を超えました。クロールを中止します。")
-                self.limit_reached_logged = True
+        return not self.limit_reached()
+
+    def limit_reached(self) -> bool:
+        """
+        訪問済みのページ数が上限に達したかどうかを判定します。
+        """
+        if len(self.visited) < self.max_pages:
             return False
-            
+        if not self.limit_reached_logged:
+            logger.warning(f"最大クロールページ数 {self.max_pages} を超えました。クロールを中止します。")
+            self.limit_reached_logged = True
         return True
 
     def mark_visited(self, url: str):
@@ -68,18 +136,28 @@ class UrlManager:
         """
         self.visited.add(url)
 
-    def add_discovered_url(self, url: str) -> bool:
+    def unmark_visited(self, url: str):
         """
-        新しいURLを発見リストに追加します。
-        新規URLでかつ有効なURLであれば True を返します。
+        URLの訪問済みマークを外し、再度クロールできるようにします。
+        """
+        self.visited.discard(url)
+
+    def add_discovered(self, canonical: str) -> bool:
         """
-        normalized = self.normalize_url(url)
-        
-        if not self.is_valid_url(normalized):
+        正規化済みのURLを発見リストに追加します。新規でかつ robots.txt で許可されていれば True を返します。
+        """
+        if canonical in self.discovered or canonical in self.disallowed:
             return False
-            
-        if normalized in self.discovered:
+        if not self._allowed_by_robots(canonical):
+            self.disallowed.add(canonical)
             return False
-            
-        self.discovered.add(normalized)
+        self.discovered.add(canonical)
         return True
+
+    def add_discovered_url(self, url: str) -> bool:
+        """
+        新しいURLを発見リストに追加します。
+        新規URLでかつ有効なURLであれば True を返します。
+        """
+        canonical = self.canonicalize(url)
+        return canonical is not None and self.add_discovered(canonical)
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.batch import BatchRunner, load_manifest, parse_manifest
+from src.page_pool import FairPagePool
+
+SITES = {
+    "alpha": {
+        "/docs/": '<html><body><main><h1>Alpha</h1><a href="/docs/a">A</a><a href="/other/x">X</a></main></body></html>',
+        "/docs/a": "<html><body><main><h1>Alpha A</h1></main></body></html>",
+        "/other/x": "<html><body><main><h1>Alpha X</h1></main></body></html>",
+    },
+    "beta": {
+        "/guide/": '<html><body><main><h1>Beta</h1><a href="/guide/b">B</a></main></body></html>',
+        "/guide/b": "<html><body><main><h1>Beta B</h1></main></body></html>",
+    },
+}
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        html = self.server.pages.get(self.path)
+        if html is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakePool:
+    """作業枠を文字列で表す、ブラウザを使わないプール"""
+    def __init__(self, size):
+        self.size = size
+        self.created = 0
+
+    async def acquire(self):
+        self.created += 1
+        return f"slot-{self.created}"
+
+    async def release(self, slot, broken=False):
+        pass
+
+
+class TestParseManifest(unittest.TestCase):
+    def test_defaults_and_names(self):
+        manifest = parse_manifest({
+            "batch": {"output_dir": "out", "max_sites": 2},
+            "defaults": {"max_pages": 50, "fetch_mode": "http"},
+            "sites": [
+                {"url": "https://example.com/docs/"},
+                {"url": "https://example.org/guide/", "name": "guide", "max_pages": 5, "scope": "/"},
+            ],
+        })
+        first, second = manifest.sites
+        self.assertEqual((first.name, first.max_pages, first.fetch_mode), ("example.com_docs", 50, "http"))
+        self.assertEqual((second.name, second.max_pages, second.scope), ("guide", 5, "/"))
+        self.assertEqual(str(manifest.output_path(second)), os.path.join("out", "guide.md"))
+        self.assertEqual(str(manifest.report_path), os.path.join("out", "batch_report.json"))
+
+    def test_invalid_manifests(self):
+        invalid = [
+            {"sites": []},
+            {"sites": [{"url": "https://example.com/", "max_page": 1}]},
+            {"sites": [{"name": "no-url"}]},
+            {"sites": [{"url": "https://example.com/a/", "name": "x"}, {"url": "https://example.com/b/", "name": "x"}]},
+            {"batch": {"workers": 2}, "sites": [{"url": "https://example.com/"}]},
+            {"sites": [{"url": "https://example.com/", "fetch_mode": "carrier-pigeon"}]},
+        ]
+        for data in invalid:
+            with self.assertRaises(ValueError, msg=data):
+                parse_manifest(data)
+
+
+class TestFairPagePool(unittest.TestCase):
+    def test_round_robin_across_hosts(self):
+        async def scenario():
+            shared = FairPagePool(_FakePool(size=1))
+            order = []
+            first = await shared.acquire("busy")
+
+            async def worker(host):
+                slot = await shared.acquire(host)
+                order.append(host)
+                await asyncio.sleep(0)
+                await shared.release(slot)
+
+            # 多くのページを待たせているホストがあっても、他のホストの待機者に交互に割り当てられる
+            tasks = [asyncio.create_task(worker("busy")) for _ in range(3)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(worker("quiet")))
+            await asyncio.sleep(0)
+            await shared.release(first)
+            await asyncio.gather(*tasks)
+            return order, shared
+
+        order, shared = asyncio.run(scenario())
+        self.assertEqual(order, ["busy", "quiet", "busy", "busy"])
+        self.assertEqual(shared.granted, {"busy": 4, "quiet": 1})
+        self.assertEqual(shared.available, 1)
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.servers = {}
+        for name, pages in SITES.items():
+            server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+            server.pages = pages
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers[name] = server
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_runs_sites_from_toml_manifest(self):
+        alpha = f"http://127.0.0.1:{self.servers['alpha'].server_port}"
+        beta = f"http://127.0.0.1:{self.servers['beta'].server_port}"
+        out_dir = os.path.join(self.tmpdir.name, "out")
+        manifest_path = os.path.join(self.tmpdir.name, "sites.toml")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            f.write(f"""
+[batch]
+output_dir = "{out_dir}"
+max_sites = 2
+
+[defaults]
+fetch_mode = "http"
+rate_limit = 0
+use_sitemaps = false
+
+[[sites]]
+name = "alpha"
+url = "{alpha}/docs/"
+scope = "/"
+
+[[sites]]
+name = "beta"
+url = "{beta}/guide/"
+
+[[sites]]
+name = "broken"
+url = "{beta}/guide/"
+output = "{manifest_path}/broken.md"
+""")
+        runner = BatchRunner(load_manifest(manifest_path))
+        report = asyncio.run(runner.run())
+
+        with open(os.path.join(out_dir, "alpha.md"), encoding="utf-8") as f:
+            alpha_output = f.read()
+        # scope を / にしたため、開始URLのパス配下以外のページもたどる
+        for title in ("Alpha", "Alpha A", "Alpha X"):
+            self.assertIn(f"# {title}\n", alpha_output)
+        with open(os.path.join(out_dir, "beta.md"), encoding="utf-8") as f:
+            self.assertIn("# Beta B", f.read())
+
+        # 失敗したサイトがあっても他のサイトは完了し、全サイトの結果がレポートにまとめられる
+        with open(os.path.join(out_dir, "batch_report.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), report)
+        self.assertEqual(report["sites"]["alpha"]["status"], "completed")
+        self.assertEqual(report["sites"]["alpha"]["pages_crawled"], 3)
+        self.assertEqual(report["sites"]["beta"]["pages_crawled"], 2)
+        self.assertEqual(report["sites"]["broken"]["status"], "failed")
+        self.assertEqual((report["sites_total"], report["sites_failed"], report["pages_crawled"]), (3, 1, 5))
+        self.assertNotIn("browser_pool", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from benchmarks.run import bench_crawl, bench_dispatch, bench_extract, bench_frontier, percentile
+from benchmarks.synthetic_site import SyntheticSite
+from src.fetcher import looks_like_js_shell
+
+
+class TestSyntheticSite(unittest.TestCase):
+    def test_pages_are_deterministic(self):
+        a = SyntheticSite(pages=50, seed=1)
+        b = SyntheticSite(pages=50, seed=1)
+        path = SyntheticSite.path_for(42)
+        self.assertEqual(a.render(path), b.render(path))
+        self.assertNotEqual(a.render(path), SyntheticSite(pages=50, seed=2).render(path))
+
+    def test_unknown_paths(self):
+        site = SyntheticSite(pages=10)
+        self.assertIsNone(site.render("/docs/section-0/page-10"))
+        self.assertIsNone(site.render("/docs/section-1/page-5"))
+        self.assertIsNone(site.render("/other"))
+
+    def test_variants(self):
+        path = SyntheticSite.path_for(3)
+        static = SyntheticSite(pages=10).render(path)
+        js = SyntheticSite(pages=10, variant="js").render(path)
+        self.assertIn("<table>", static)
+        self.assertFalse(looks_like_js_shell(static))
+        self.assertTrue(looks_like_js_shell(js))
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertIsNone(percentile([], 50))
+
+    def test_crawl_reaches_every_page(self):
+        result = bench_crawl(SyntheticSite(pages=30, fan_out=2), "http", concurrency=4, workers=0)
+        self.assertEqual(result["pages_crawled"], 31)
+        self.assertEqual(result["stages"]["write"]["count"], 31)
+        self.assertGreater(result["output_bytes"], 0)
+        self.assertGreater(result["peak_rss_bytes"], 0)
+
+    def test_frontier(self):
+        result = bench_frontier(2000)
+        self.assertEqual(result["hrefs"], 6000)
+        # フラグメントとトラッキング用パラメータの表記揺れは同じURLとして扱われる
+        self.assertEqual(result["unique_urls"], 2000)
+        self.assertEqual(result["baseline"]["unique_urls"], 4000)
+        self.assertLess(result["bytes_per_url"], result["baseline"]["bytes_per_url"])
+        self.assertGreater(result["checks_per_sec"], 0)
+
+    def test_dispatch(self):
+        result = bench_dispatch(2000, concurrency=4, max_pages=500)
+        self.assertEqual((result["pages_crawled"], result["baseline"]["pages_crawled"]), (500, 500))
+        # ワーカーは並列数の分だけで、URLごとにタスクを作らない
+        self.assertEqual(result["tasks_created"], 4)
+        self.assertLessEqual(result["peak_tasks"], 5)
+        self.assertEqual(result["baseline"]["tasks_created"], 2000)
+
+    def test_extract(self):
+        result = bench_extract(SyntheticSite(pages=5))
+        self.assertEqual(result["latency"]["count"], 5)
+        self.assertGreater(result["output_bytes"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.canonicalizer import CanonicalRules, UrlCanonicalizer
+from src.crawler import DocsCrawler
+from src.frontier import Frontier
+from src.url_manager import UrlManager
+
+
+class TestUrlCanonicalizer(unittest.TestCase):
+    def test_defaults(self):
+        canonicalizer = UrlCanonicalizer()
+        self.assertEqual(
+            canonicalizer.canonicalize("HTTPS://Example.COM:443/Docs/a?utm_source=x&b=2&a=1#top"),
+            "https://example.com/Docs/a?a=1&b=2",
+        )
+        self.assertEqual(canonicalizer.canonicalize("https://example.com"), "https://example.com/")
+        # 値は再エンコードしない
+        self.assertEqual(canonicalizer.canonicalize("https://example.com/s?q=a%20b+c"),
+                         "https://example.com/s?q=a%20b+c")
+
+    def test_query_rules(self):
+        deny = UrlCanonicalizer(CanonicalRules(drop_params=("lang", "v*")))
+        self.assertEqual(deny.canonicalize("https://example.com/a?lang=en&version=2&page=3"),
+                         "https://example.com/a?page=3")
+        allow = UrlCanonicalizer(CanonicalRules(keep_params=("page",)))
+        self.assertEqual(allow.canonicalize("https://example.com/a?lang=en&page=3&x"),
+                         "https://example.com/a?page=3")
+        self.assertEqual(allow.canonicalize("https://example.com/a?lang=en"), "https://example.com/a")
+
+    def test_path_rules(self):
+        strip = UrlCanonicalizer(CanonicalRules(trailing_slash="strip", strip_index=True, lowercase_path=True))
+        self.assertEqual(strip.canonicalize("https://example.com/Docs/Guide/"), "https://example.com/docs/guide")
+        self.assertEqual(strip.canonicalize("https://example.com/docs/index.html"), "https://example.com/docs")
+        self.assertEqual(strip.canonicalize("https://example.com/"), "https://example.com/")
+
+        add = UrlCanonicalizer(CanonicalRules(trailing_slash="add", strip_index=True))
+        self.assertEqual(add.canonicalize("https://example.com/docs/guide"), "https://example.com/docs/guide/")
+        self.assertEqual(add.canonicalize("https://example.com/docs/file.pdf"), "https://example.com/docs/file.pdf")
+        self.assertEqual(add.canonicalize("https://example.com/docs/index.htm"), "https://example.com/docs/")
+
+        with self.assertRaises(ValueError):
+            CanonicalRules(trailing_slash="sometimes")
+
+
+class TestUrlManagerCanonicalize(unittest.TestCase):
+    def test_scope_and_fast_path(self):
+        manager = UrlManager("https://example.com/docs/", max_pages=5)
+        self.assertEqual(manager.canonicalize("https://example.com/docs/a"), "https://example.com/docs/a")
+        self.assertEqual(manager.canonicalize("https://EXAMPLE.com/docs/a#x"), "https://example.com/docs/a")
+        self.assertIsNone(manager.canonicalize("https://example.com/blog/a"))
+        self.assertIsNone(manager.canonicalize("mailto:docs@example.com"))
+
+        self.assertTrue(manager.add_discovered_url("https://example.com/docs/a?utm_medium=x"))
+        self.assertFalse(manager.add_discovered_url("https://example.com/docs/a#intro"))
+        self.assertIn("https://example.com/docs/a", manager.discovered)
+        self.assertEqual(len(manager.discovered), 2)
+
+    def test_path_rules_disable_fast_path(self):
+        manager = UrlManager("https://example.com/docs/", rules=CanonicalRules(strip_index=True))
+        self.assertEqual(manager.canonicalize("https://example.com/docs/a/index.html"),
+                         "https://example.com/docs/a/")
+
+
+class TestFrontier(unittest.TestCase):
+    def _drain(self, frontier):
+        return [frontier.pop() for _ in range(len(frontier))]
+
+    def test_orders(self):
+        urls = ["https://example.com/docs/b/c/d", "https://example.com/docs/z",
+                "https://example.com/docs/a/b", "https://example.com/docs/a"]
+        prefix = "https://example.com/docs/"
+        expected = {
+            "fifo": urls,
+            "depth": [urls[1], urls[3], urls[2], urls[0]],
+            "path": sorted(urls),
+        }
+        for order, result in expected.items():
+            frontier = Frontier(prefix, order=order)
+            for url in urls:
+                frontier.push(url)
+            self.assertEqual(self._drain(frontier), result, order)
+
+    def test_push_many_matches_push(self):
+        urls = ["https://example.com/docs/b/c", "https://other.example.com/x", "https://example.com/docs/a"]
+        for order in ("fifo", "depth", "path"):
+            single = Frontier("https://example.com/docs/", order=order)
+            batch = Frontier("https://example.com/docs/", order=order)
+            single.push("https://example.com/docs/first", priority=-1.0)
+            batch.push("https://example.com/docs/first", priority=-1.0)
+            for url in urls:
+                single.push(url)
+            batch.push_many(urls)
+            self.assertEqual(len(batch), 4)
+            self.assertEqual(self._drain(batch), self._drain(single), order)
+
+    def test_priority_and_foreign_urls(self):
+        frontier = Frontier("https://example.com/docs/")
+        frontier.push("https://example.com/docs/late")
+        frontier.push("https://other.example.com/x", priority=-2.0)
+        frontier.push("https://example.com/docs/first", priority=float("-inf"))
+        self.assertEqual(self._drain(frontier), [
+            "https://example.com/docs/first", "https://other.example.com/x", "https://example.com/docs/late",
+        ])
+        self.assertTrue(frontier.empty())
+        with self.assertRaises(IndexError):
+            frontier.pop()
+
+
+PAGES = {
+    "/docs/": '<html><body><main><h1>Top</h1><a href="/docs/guide?utm_source=nav">Guide</a>'
+              '<a href="/docs/guide-v2">Guide v2</a><a href="/docs/old">Old</a></main></body></html>',
+    "/docs/guide": "<html><body><main><h1>Guide</h1></main></body></html>",
+    # 既に発見済みのページを正規URLとして指定している
+    "/docs/guide-v2": '<html><head><link rel="canonical" href="/docs/guide"></head>'
+                      "<body><main><h1>Guide v2</h1></main></body></html>",
+    # まだ発見されていないページを正規URLとして指定している
+    "/docs/old": '<html><head><link rel="canonical" href="/docs/new"></head>'
+                 '<body><main><h1>Old</h1><a href="/docs/new">New</a></main></body></html>',
+    "/docs/new": "<html><body><main><h1>New</h1></main></body></html>",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = PAGES[self.path].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCrawlerCanonicalLink(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.hits = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def _crawl(self, **kwargs):
+        output_file = os.path.join(self.tmpdir.name, "out.md")
+        crawler = DocsCrawler(f"{self.base}/docs/", output_file, max_concurrent=1, fetch_mode="http",
+                              extraction_workers=0, rate_limit=0, use_sitemaps=False, **kwargs)
+        summary = io.StringIO()
+        with redirect_stdout(summary):
+            asyncio.run(crawler.run())
+        with open(output_file, encoding="utf-8") as f:
+            return crawler, f.read(), summary.getvalue()
+
+    def test_canonical_links_are_honored(self):
+        crawler, output, summary = self._crawl()
+
+        self.assertEqual(crawler.aliases, {f"{self.base}/docs/guide-v2": f"{self.base}/docs/guide"})
+        self.assertNotIn("# Guide v2", output)
+        self.assertIn("# Old", output)
+        # 正規URLとして扱ったページは二重に取得しない
+        self.assertNotIn("/docs/new", self.server.hits)
+        # トラッキング用パラメータは除去される
+        self.assertIn("/docs/guide", self.server.hits)
+        self.assertIn(f"  - {self.base}/docs/guide-v2 → {self.base}/docs/guide", summary)
+        self.assertIn("探索したページ総数: 5", summary)
+
+    def test_ignore_canonical(self):
+        crawler, output, _ = self._crawl(canonical_rules=CanonicalRules(honor_canonical_link=False))
+        self.assertEqual(crawler.aliases, {})
+        self.assertIn("# Guide v2", output)
+        self.assertIn("/docs/new", self.server.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
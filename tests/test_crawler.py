@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.crawler import DocsCrawler
+
+PAGES = {
+    "/docs/": '<html><body><main><h1>Top</h1><a href="/docs/a">A</a><a href="/docs/b">B</a>'
+              '<a href="/docs/c">C</a></main></body></html>',
+    "/docs/a": "<html><body><main><h1>Page A</h1></main></body></html>",
+    "/docs/b": "<html><body><main><h1>Page B</h1></main></body></html>",
+    "/docs/c": "<html><body><main><h1>Page C</h1></main></body></html>",
+}
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    """/docs/b への最初のリクエストにだけ 429 を返すサーバー"""
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path == "/docs/b" and self.server.hits.count(self.path) == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = PAGES[self.path].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCrawlerThrottling(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottlingHandler)
+        self.server.hits = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_retry_after_is_honored(self):
+        output_file = os.path.join(self.tmpdir.name, "out.md")
+        crawler = DocsCrawler(
+            f"http://127.0.0.1:{self.server.server_port}/docs/",
+            output_file,
+            max_concurrent=4,
+            fetch_mode="http",
+            extraction_workers=0,
+            rate_limit=0,
+        )
+        crawler.concurrency.limit = 4.0
+
+        started = time.monotonic()
+        asyncio.run(crawler.run())
+        elapsed = time.monotonic() - started
+
+        with open(output_file, encoding="utf-8") as f:
+            output = f.read()
+        for title in ("Top", "Page A", "Page B", "Page C"):
+            self.assertIn(f"# {title}", output)
+
+        # 制限を受けたページは Retry-After の経過後に再取得される
+        self.assertEqual(self.server.hits.count("/docs/b"), 2)
+        self.assertGreaterEqual(elapsed, 1.0)
+        # 制限を受けたことで並列数が減っている
+        self.assertLess(crawler.concurrency.current_limit, 4)
+
+
+class _CachingHandler(BaseHTTPRequestHandler):
+    """ETag を返し、一致する条件付きリクエストには 304 を返すサーバー"""
+    def do_GET(self):
+        conditional = self.headers.get("If-None-Match") == '"v1"'
+        self.server.hits.append((self.path, conditional))
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if conditional:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = PAGES[self.path].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCrawlerCache(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _CachingHandler)
+        self.server.hits = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def make_crawler(self, name):
+        return DocsCrawler(f"http://127.0.0.1:{self.server.server_port}/docs/",
+                           os.path.join(self.tmpdir.name, name), fetch_mode="http", extraction_workers=0,
+                           rate_limit=0, use_sitemaps=False, respect_robots=False, print_summary=False,
+                           cache_dir=os.path.join(self.tmpdir.name, "cache"))
+
+    def test_unreadable_cached_markdown_is_refetched(self):
+        asyncio.run(self.make_crawler("first.md").run())
+        self.server.hits = []
+
+        crawler = self.make_crawler("second.md")
+        # キャッシュを読み込んだ後で、変更のなかったページのうち1つだけMarkdownを読めなくする
+        entry = crawler.page_cache.entries[f"http://127.0.0.1:{self.server.server_port}/docs/a"]
+        crawler.page_cache._blob_path(entry.markdown_hash).unlink()
+        asyncio.run(crawler.run())
+
+        with open(crawler.output_file, encoding="utf-8") as f:
+            output = f.read()
+        for title in ("Top", "Page A", "Page B", "Page C"):
+            self.assertIn(f"# {title}", output)
+        # 304 の後、検証ヘッダーなしで取得し直して抽出する
+        self.assertEqual(self.server.hits.count(("/docs/a", True)), 1)
+        self.assertEqual(self.server.hits.count(("/docs/a", False)), 1)
+        self.assertEqual(crawler.page_cache.hits, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import os
+import random
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.crawler import DocsCrawler
+from src.dedup import DuplicateIndex, fingerprint, tokenize
+from src.journal import CrawlJournal
+
+_rng = random.Random(0)
+_WORDS = [f"term{i}" for i in range(200)]
+GUIDE_TEXT = " ".join(_rng.choice(_WORDS) for _ in range(1000))
+OTHER_TEXT = " ".join(_rng.choice(_WORDS) for _ in range(1000))
+
+PAGES = {
+    "/docs/": '<html><body><main><h1>Top</h1><a href="/docs/guide">Guide</a>'
+              '<a href="/docs/guide?lang=en">Guide (en)</a><a href="/docs/guide/print">Print</a>'
+              '<a href="/docs/other">Other</a></main></body></html>',
+    "/docs/guide": f"<html><body><main><h1>Guide</h1><p>{GUIDE_TEXT}</p></main></body></html>",
+    "/docs/guide?lang=en": f"<html><body><main><h1>Guide</h1><p>{GUIDE_TEXT}</p></main></body></html>",
+    # 印刷用ページは本文が同じで、見出しとリンクが少し違う
+    "/docs/guide/print": f'<html><body><main><h1>Guide (print)</h1><p>{GUIDE_TEXT}</p>'
+                         '<a href="/docs/print-only">More</a></main></body></html>',
+    "/docs/print-only": "<html><body><main><h1>Print only</h1></main></body></html>",
+    "/docs/other": f"<html><body><main><h1>Other</h1><p>{OTHER_TEXT}</p></main></body></html>",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = PAGES[self.path].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_ignores_source_url_and_formatting(self):
+        a = fingerprint(f"Source URL: https://example.com/a\n\n# Guide\n\n{GUIDE_TEXT}\n\n---\n\n")
+        b = fingerprint(f"Source URL: https://example.com/b\n\n# guide\n{GUIDE_TEXT.upper()}\n\n---")
+        c = fingerprint(f"Source URL: https://example.com/c\n\n## guide\n{GUIDE_TEXT.upper()}\n")
+        # 完全一致は空白と大文字・小文字の違いだけを無視し、類似判定は記号の違いも無視する
+        self.assertEqual(a.exact, b.exact)
+        self.assertNotEqual(a.exact, c.exact)
+        self.assertEqual(a.simhash, c.simhash)
+        self.assertEqual(tokenize("Source URL: x\n\nHello, World!"), ["hello", "world"])
+
+    def test_code_keeps_symbols(self):
+        self.assertEqual(tokenize("Use `a != b`:\n```\nx = Foo(1)\n```"),
+                         ["use", "a", "!", "=", "b", "x", "=", "Foo", "(", "1", ")"])
+        plus = fingerprint(f"{GUIDE_TEXT}\n```\ntotal = a + b\n```")
+        minus = fingerprint(f"{GUIDE_TEXT}\n```\ntotal = a - b\n```")
+        # 演算子だけが違うコードは同じ本文とみなさない
+        self.assertNotEqual(plus.exact, minus.exact)
+
+    def test_simhash_distance(self):
+        base = fingerprint(GUIDE_TEXT).simhash
+        edited = fingerprint(GUIDE_TEXT.replace(GUIDE_TEXT.split()[150], "changed", 1)).simhash
+        other = fingerprint(OTHER_TEXT).simhash
+        self.assertLessEqual((base ^ edited).bit_count(), 3)
+        self.assertGreater((base ^ other).bit_count(), 10)
+
+
+class TestDuplicateIndex(unittest.TestCase):
+    def test_exact_and_near(self):
+        index = DuplicateIndex()
+        self.assertIsNone(index.check("a", GUIDE_TEXT))
+        self.assertIsNone(index.check("other", OTHER_TEXT))
+
+        exact = index.check("a-copy", GUIDE_TEXT + "\n")
+        self.assertEqual((exact.canonical, exact.kind), ("a", "exact"))
+
+        near = index.check("a-print", "Print view " + GUIDE_TEXT)
+        self.assertEqual((near.canonical, near.kind), ("a", "near"))
+        self.assertEqual(index.aliases, {"a-copy": "a", "a-print": "a"})
+        self.assertEqual(index.ratio, 0.5)
+
+    def test_exact_only(self):
+        index = DuplicateIndex(max_distance=None)
+        index.check("a", GUIDE_TEXT)
+        self.assertIsNone(index.check("a-print", "Print view " + GUIDE_TEXT))
+        self.assertIsNotNone(index.check("a-copy", GUIDE_TEXT))
+
+    def test_short_pages_are_not_merged(self):
+        index = DuplicateIndex()
+        index.check("a", "# Overview")
+        self.assertIsNone(index.check("b", "# Overview"))
+        self.assertEqual(index.checked, 0)
+
+
+class TestCrawlerDedup(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.hits = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.tmpdir.name, "out.md")
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def _crawl(self, **kwargs):
+        crawler = DocsCrawler(f"{self.base}/docs/", self.output_file, max_concurrent=1, fetch_mode="http",
+                              extraction_workers=0, rate_limit=0, use_sitemaps=False, **kwargs)
+        summary = io.StringIO()
+        with redirect_stdout(summary):
+            asyncio.run(crawler.run())
+        with open(self.output_file, encoding="utf-8") as f:
+            return crawler, f.read(), summary.getvalue()
+
+    def test_duplicates_are_recorded_as_aliases(self):
+        crawler, output, summary = self._crawl()
+
+        self.assertEqual(output.count(GUIDE_TEXT.split()[0] + " " + GUIDE_TEXT.split()[1]), 1)
+        self.assertIn("# Other", output)
+        self.assertEqual(crawler.dedup.aliases, {
+            f"{self.base}/docs/guide?lang=en": f"{self.base}/docs/guide",
+            f"{self.base}/docs/guide/print": f"{self.base}/docs/guide",
+        })
+        self.assertIn("重複率 50.0%", summary)
+        # リンクの刈り込みは無効なので、重複ページのリンク先もクロールされる
+        self.assertIn("/docs/print-only", self.server.hits)
+
+        journal = CrawlJournal(f"{self.output_file}.journal")
+        journal.open()
+        state = journal.load()
+        journal.close()
+        self.assertEqual(set(state.duplicates), set(crawler.dedup.aliases))
+
+    def test_prune_links_of_duplicates(self):
+        crawler, output, _ = self._crawl(dedup_prune_links=True)
+        self.assertNotIn("/docs/print-only", self.server.hits)
+        self.assertIn("# Other", output)
+
+    def test_off(self):
+        crawler, output, _ = self._crawl(dedup="off")
+        self.assertIsNone(crawler.dedup)
+        self.assertIn("# Guide (print)", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
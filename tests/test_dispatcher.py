@@ -0,0 +1,125 @@
+import asyncio
+import os
+import random
+import tempfile
+import unittest
+from src.crawler import DocsCrawler
+
+BASE = "https://example.com/docs/"
+
+
+class TestPageDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_crawler(self, crawl, max_pages: int, max_concurrent: int = 4) -> DocsCrawler:
+        crawler = DocsCrawler(BASE, os.path.join(self.tmpdir.name, "docs.md"), max_concurrent=max_concurrent,
+                              max_pages=max_pages, extraction_workers=0, rate_limit=0, use_sitemaps=False,
+                              respect_robots=False, print_summary=False)
+        crawler.frontier.push(BASE)
+        crawler.url_manager.add_discovered(BASE)
+        crawler.calls = []
+
+        async def crawl_page(url, retry=False, reserved=False):
+            crawler.calls.append((url, retry))
+            await crawl(crawler, url, retry)
+            await crawler.frontier_backend.complete(url)
+
+        crawler.crawl_page = crawl_page
+        return crawler
+
+    def run_queue(self, crawler: DocsCrawler):
+        async def scenario():
+            await asyncio.wait_for(crawler.process_queue(), 10)
+        asyncio.run(scenario())
+        crawler.journal.close()
+
+    def test_budget_is_reserved_at_dispatch(self):
+        rng = random.Random(0)
+        running = 0
+        peak = {"running": 0, "tasks": 0}
+
+        async def crawl(crawler, url, retry):
+            nonlocal running
+            running += 1
+            peak["running"] = max(peak["running"], running)
+            peak["tasks"] = max(peak["tasks"], len(asyncio.all_tasks()))
+            await asyncio.sleep(rng.random() * 0.002)
+            # 1ページにつき5件の新しいページが見つかるサイト
+            await crawler._enqueue_links(url, [f"{url.rstrip('/')}/{n}" for n in range(5)])
+            running -= 1
+
+        crawler = self.make_crawler(crawl, max_pages=50)
+        self.run_queue(crawler)
+
+        # 上限ちょうどのページを1回ずつ取得し、それ以上は取り出さない
+        urls = [url for url, _ in crawler.calls]
+        self.assertEqual(len(urls), 50)
+        self.assertEqual(len(set(urls)), 50)
+        self.assertEqual(len(crawler.url_manager.visited), 50)
+        self.assertEqual(crawler.dispatcher.dispatched, 50)
+        self.assertGreater(len(crawler.frontier), 0)
+        # フロンティアの大きさに関わらず、タスクはワーカーの数（と実行中のテスト自身）に収まる
+        self.assertLessEqual(peak["running"], 4)
+        self.assertLessEqual(peak["tasks"], 4 + 1)
+
+    def test_requeued_page_returns_its_budget(self):
+        async def crawl(crawler, url, retry):
+            if url == f"{BASE}1" and crawler.calls.count((url, False)) == 1:
+                await crawler._requeue_throttled(url)
+                return
+            if url == BASE:
+                await crawler._enqueue_links(url, [f"{BASE}{n}" for n in range(5)])
+
+        # 上限はサイトのページ数ちょうど
+        crawler = self.make_crawler(crawl, max_pages=6, max_concurrent=2)
+        self.run_queue(crawler)
+
+        # 制限で戻されたページの枠は解放され、取り直したときに改めて確保される
+        self.assertEqual(crawler.calls.count((f"{BASE}1", False)), 2)
+        self.assertEqual(len(crawler.url_manager.visited), 6)
+        self.assertEqual(len(crawler.calls), 7)
+
+    def test_admission_wait_does_not_hold_a_slot(self):
+        crawled = asyncio.Event()
+        admitted = []
+
+        async def crawl(crawler, url, retry):
+            if url == BASE:
+                await crawler._enqueue_links(url, [f"{BASE}1", f"{BASE}2"])
+            if url == f"{BASE}2":
+                crawled.set()
+
+        crawler = self.make_crawler(crawl, max_pages=3, max_concurrent=2)
+        crawler.concurrency.limit = 1.0
+
+        async def admit(url):
+            admitted.append(url)
+            if url == f"{BASE}1":
+                # レート制限などで待っている間に、他のページが実行枠を使えること
+                await crawled.wait()
+
+        crawler._admit = admit
+        self.run_queue(crawler)
+
+        self.assertEqual(admitted, [BASE, f"{BASE}1", f"{BASE}2"])
+        self.assertEqual([url for url, _ in crawler.calls], [BASE, f"{BASE}2", f"{BASE}1"])
+
+    def test_waits_for_pending_retries(self):
+        async def crawl(crawler, url, retry):
+            if not retry:
+                crawler._schedule_retry(url, 0.05, reason="transient")
+
+        crawler = self.make_crawler(crawl, max_pages=5)
+        self.run_queue(crawler)
+
+        # フロンティアが空でも、再試行を待ってから終了する
+        self.assertEqual(crawler.calls, [(BASE, False), (BASE, True)])
+        self.assertEqual(len(crawler.retry_queue), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+from src.dedup import fingerprint
+from src.extraction_stage import ExtractionStage
+from src.metrics import CrawlMetrics
+
+PAGE_HTML = "<html><body><main><h1>Title {n}</h1><p>Body {n}</p></main></body></html>"
+
+
+class TestExtractionStage(unittest.TestCase):
+    def _run_stage(self, workers, queue_size=1, pages=4):
+        results = {}
+
+        async def on_result(url, markdown, page_fingerprint):
+            results[url] = markdown
+
+        async def scenario():
+            stage = ExtractionStage(on_result, workers=workers, queue_size=queue_size)
+            await stage.start()
+            for n in range(pages):
+                await stage.submit(f"http://example.com/p{n}", PAGE_HTML.format(n=n))
+            await stage.close()
+
+        asyncio.run(scenario())
+        return results
+
+    def test_inline_extraction(self):
+        results = self._run_stage(workers=0)
+
+        self.assertEqual(len(results), 4)
+        self.assertIn("# Title 2", results["http://example.com/p2"])
+        self.assertTrue(results["http://example.com/p2"].startswith("Source URL: http://example.com/p2"))
+
+    def test_process_pool_extraction(self):
+        # キューサイズ1でもバックプレッシャーで全ページが処理されること
+        results = self._run_stage(workers=2, queue_size=1, pages=6)
+
+        self.assertEqual(len(results), 6)
+        for n in range(6):
+            self.assertIn(f"Body {n}", results[f"http://example.com/p{n}"])
+
+    def test_fingerprints_are_computed_by_worker(self):
+        received = {}
+
+        async def on_result(url, markdown, page_fingerprint):
+            received[url] = (markdown, page_fingerprint)
+
+        async def scenario():
+            stage = ExtractionStage(on_result, workers=1, fingerprints=True)
+            await stage.start()
+            await stage.submit("http://example.com/p0", PAGE_HTML.format(n=0))
+            await stage.close()
+
+        asyncio.run(scenario())
+        markdown, page_fingerprint = received["http://example.com/p0"]
+        self.assertEqual(page_fingerprint, fingerprint(markdown))
+
+    def test_output_error_does_not_stop_consumer(self):
+        results, failed = {}, []
+
+        async def on_result(url, markdown, page_fingerprint):
+            if url.endswith("p1"):
+                raise OSError("disk full")
+            results[url] = markdown
+
+        async def on_failure(url):
+            failed.append(url)
+
+        async def scenario():
+            stage = ExtractionStage(on_result, workers=0, queue_size=1, on_failure=on_failure)
+            await stage.start()
+            for n in range(4):
+                await stage.submit(f"http://example.com/p{n}", PAGE_HTML.format(n=n))
+            # 出力に失敗したページがあっても、残りのページの処理と終了は止まらない
+            await asyncio.wait_for(stage.close(), 10)
+
+        asyncio.run(scenario())
+        self.assertEqual(failed, ["http://example.com/p1"])
+        self.assertEqual(sorted(results), [f"http://example.com/p{n}" for n in (0, 2, 3)])
+
+    def test_restarts_broken_process_pool(self):
+        results = {}
+        metrics = CrawlMetrics()
+
+        async def on_result(url, markdown, page_fingerprint):
+            results[url] = markdown
+
+        async def scenario():
+            stage = ExtractionStage(on_result, workers=1, queue_size=1, metrics=metrics)
+            await stage.start()
+            await stage.submit("http://example.com/p0", PAGE_HTML.format(n=0))
+            await stage.queue.join()
+            # ワーカープロセスが異常終了した状態にする
+            for process in list(stage.executor._processes.values()):
+                process.kill()
+                process.join()
+            for n in range(1, 4):
+                await stage.submit(f"http://example.com/p{n}", PAGE_HTML.format(n=n))
+            await asyncio.wait_for(stage.close(), 30)
+
+        asyncio.run(scenario())
+        # プールを作り直し、どのページも失敗させずに変換する
+        self.assertEqual(len(results), 4)
+        self.assertEqual(metrics.counter_value("extraction_pool_restarts_total"), 1)
+
+    def test_close_without_start(self):
+        async def on_result(url, markdown, page_fingerprint):
+            pass
+
+        # 未起動のステージを閉じてもエラーにならないこと
+        asyncio.run(ExtractionStage(on_result, workers=1).close())
+
+
+if __name__ == '__main__':
+    unittest.main()
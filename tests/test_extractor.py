@@ -0,0 +1,57 @@
+import unittest
+from src.extractor import DEFAULT_PARSER, ContentExtractor, ExtractionRules
+
+PAGE_HTML = """
+<html>
+<head><title>T</title><script>var tracking = 1;</script></head>
+<body>
+    <nav><main><p>Navigation main</p></main></nav>
+    <div class="page-content"><p>Content div</p></div>
+    <article>
+        <h2>Article title</h2>
+        <p>Article <strong>body</strong> text.</p>
+        <aside class="toc">Contents</aside>
+        <pre><code><span class="linenumber">1</span>x = 1</code></pre>
+    </article>
+    <footer>Footer</footer>
+</body>
+</html>
+"""
+
+
+class TestContentExtractor(unittest.TestCase):
+    def test_main_content_selection(self):
+        # ノイズ (nav) の中の main は本文とみなさず、article が class で探す div より優先される
+        markdown = ContentExtractor().extract(PAGE_HTML, "http://example.com/a")
+
+        self.assertTrue(markdown.startswith("Source URL: http://example.com/a\n\n## Article title"))
+        self.assertIn("Article **body** text.", markdown)
+        self.assertIn("x = 1", markdown)
+        for noise in ("Navigation main", "Content div", "Footer", "tracking", "1x"):
+            self.assertNotIn(noise, markdown)
+
+    @unittest.skipUnless(DEFAULT_PARSER == "lxml", "lxml がインストールされていません")
+    def test_parsers_produce_same_markdown(self):
+        html_parser = ContentExtractor(ExtractionRules(parser="html.parser"))
+        lxml_parser = ContentExtractor(ExtractionRules(parser="lxml"))
+        self.assertEqual(html_parser.extract(PAGE_HTML, "http://example.com/a"),
+                         lxml_parser.extract(PAGE_HTML, "http://example.com/a"))
+
+    def test_custom_rules(self):
+        rules = ExtractionRules(noise_tags=("aside",), main_tags=(), content_class_pattern=r"^page-content$")
+        markdown = ContentExtractor(rules).extract(PAGE_HTML, "http://example.com/a")
+
+        self.assertIn("Content div", markdown)
+        self.assertNotIn("Article title", markdown)
+
+        # 本文の候補が見つからなければ body 全体を使う
+        rules = ExtractionRules(noise_tags=("aside", "nav"), main_tags=(), content_class_pattern=None)
+        markdown = ContentExtractor(rules).extract(PAGE_HTML, "http://example.com/a")
+        self.assertIn("Content div", markdown)
+        self.assertIn("Article title", markdown)
+        self.assertNotIn("Contents", markdown)
+        self.assertNotIn("Navigation main", markdown)
+
+
+if __name__ == '__main__':
+    unittest.main()
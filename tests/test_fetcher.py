@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.fetcher import HybridFetcher, PageLink, analyze_static_page, extract_links, looks_like_js_shell
+
+STATIC_PAGE = """
+<html><body>
+<nav><a href="/docs/guide/intro">Intro</a><a href="other">Other</a></nav>
+<main><h1>Static Page</h1><p>{text}</p></main>
+</body></html>
+""".format(text="サーバーサイドで描画された本文です。" * 20)
+
+SHELL_PAGE = """
+<html><head><script src="/bundle.js"></script></head>
+<body><div id="root"></div><noscript>JavaScriptを有効にしてください</noscript></body></html>
+"""
+
+PAGES = {
+    "/docs/static/page": STATIC_PAGE,
+    "/docs/app/page": SHELL_PAGE,
+    "/docs/app/other": SHELL_PAGE,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = body.encode("utf-8")
+        etag = f'"{len(data)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLooksLikeJsShell(unittest.TestCase):
+    def test_static_page(self):
+        self.assertFalse(looks_like_js_shell(STATIC_PAGE))
+
+    def test_spa_shell(self):
+        self.assertTrue(looks_like_js_shell(SHELL_PAGE))
+
+    def test_empty_main(self):
+        html = "<html><body><p>" + "x" * 500 + "</p><main></main></body></html>"
+        self.assertTrue(looks_like_js_shell(html))
+
+
+class TestExtractLinks(unittest.TestCase):
+    def test_regions_and_dedupe(self):
+        html = """<html><head><link rel="canonical" href="/docs/intro"></head><body>
+            <nav><a href="/docs/a">A</a><a href="/docs/b#top">B</a></nav>
+            <main><a href="a">A again</a><a href="/docs/c">  C  </a><a href="#local">here</a></main>
+        </body></html>"""
+        links, canonical = extract_links(html, "https://example.com/docs/intro")
+        self.assertEqual(canonical, "https://example.com/docs/intro")
+        self.assertEqual(links, [
+            PageLink("https://example.com/docs/a", "A", "nav"),
+            PageLink("https://example.com/docs/b", "B", "nav"),
+            PageLink("https://example.com/docs/c", "C", "main"),
+            PageLink("https://example.com/docs/intro", "here", "main"),
+        ])
+
+
+class TestAnalyzeStaticPage(unittest.TestCase):
+    def test_links_and_shell_in_one_parse(self):
+        is_shell, links, canonical = analyze_static_page(STATIC_PAGE, "https://example.com/docs/", detect_shell=True)
+        self.assertFalse(is_shell)
+        self.assertEqual(links, extract_links(STATIC_PAGE, "https://example.com/docs/")[0])
+
+        self.assertEqual(analyze_static_page(SHELL_PAGE, "https://example.com/docs/", detect_shell=True),
+                         (True, [], None))
+        # 判定を省略した場合は殻でもリンクを返す
+        self.assertFalse(analyze_static_page(SHELL_PAGE, "https://example.com/docs/", detect_shell=False)[0])
+
+
+class TestHybridFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.server.hits = []
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _fetch(self, fetcher, paths):
+        async def scenario():
+            try:
+                return [await fetcher.fetch_static(self.base + path) for path in paths]
+            finally:
+                await fetcher.close()
+        return asyncio.run(scenario())
+
+    def test_static_page_uses_http(self):
+        fetcher = HybridFetcher("/docs/")
+        page, = self._fetch(fetcher, ["/docs/static/page"])
+
+        self.assertIsNotNone(page)
+        self.assertIn("Static Page", page.html)
+        self.assertIn(self.base + "/docs/guide/intro", page.hrefs)
+        self.assertIn(self.base + "/docs/static/other", page.hrefs)
+        self.assertTrue(fetcher.should_try_http(self.base + "/docs/static/next"))
+
+    def test_js_shell_falls_back_to_browser(self):
+        fetcher = HybridFetcher("/docs/")
+        page, = self._fetch(fetcher, ["/docs/app/page"])
+
+        self.assertIsNone(page)
+        # 同じプレフィックスでは以降HTTPを試さない
+        self.assertFalse(fetcher.should_try_http(self.base + "/docs/app/other"))
+        self.assertTrue(fetcher.should_try_http(self.base + "/docs/static/page"))
+
+    def test_http_mode_keeps_shell_page(self):
+        fetcher = HybridFetcher("/docs/", mode="http")
+        page, missing = self._fetch(fetcher, ["/docs/app/page", "/docs/missing"])
+
+        self.assertIsNotNone(page)
+        self.assertIsNone(missing)
+
+    def test_conditional_request(self):
+        fetcher = HybridFetcher("/docs/")
+        url = self.base + "/docs/static/page"
+
+        async def scenario():
+            try:
+                first = await fetcher.fetch_static(url)
+                # ETagによる304
+                by_etag = await fetcher.fetch_static(url, etag=first.etag)
+                # 検証ヘッダーがなくても本文ハッシュが一致すれば未変更扱い
+                by_hash = await fetcher.fetch_static(url, known_hash=first.content_hash)
+                return first, by_etag, by_hash
+            finally:
+                await fetcher.close()
+
+        first, by_etag, by_hash = asyncio.run(scenario())
+
+        self.assertFalse(first.not_modified)
+        self.assertIsNotNone(first.etag)
+        self.assertTrue(by_etag.not_modified)
+        self.assertTrue(by_hash.not_modified)
+
+    def test_browser_mode_never_uses_http(self):
+        fetcher = HybridFetcher("/docs/", mode="browser")
+        self.assertFalse(fetcher.should_try_http(self.base + "/docs/static/page"))
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            HybridFetcher("/docs/", mode="fast")
+
+
+if __name__ == '__main__':
+    unittest.main()
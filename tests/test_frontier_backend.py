@@ -0,0 +1,432 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.crawler import DocsCrawler
+from src.frontier_backend import RedisFrontierBackend, SqliteFrontierBackend, WatchError, create_frontier_backend
+from src.merge import merge_outputs
+
+URLS = [f"https://example.com/docs/p{n}" for n in range(5)]
+
+
+class _RedisStandIn:
+    """
+    テストで使う、Redis のコマンドの一部だけを実装したメモリ上の代替。値は文字列で返します。
+    hooks にコマンド名 → コルーチン関数を登録すると、そのコマンドの直後に一度だけ呼び出します
+    （他のワーカーの操作が割り込む状況を再現するため）。
+    """
+    def __init__(self):
+        self.sets = {}
+        self.zsets = {}
+        self.values = {}
+        # WATCH で変更を検出するための、キーごとの変更回数
+        self.versions = {}
+        self.hooks = {}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    async def _hook(self, name):
+        hook = self.hooks.pop(name, None)
+        if hook is not None:
+            await hook()
+
+    async def sadd(self, key, *members):
+        target = self.sets.setdefault(key, set())
+        added = len(set(members) - target)
+        target.update(members)
+        self._touch(key)
+        return added
+
+    async def scard(self, key):
+        return len(self.sets.get(key, ()))
+
+    async def incrby(self, key, amount):
+        self.values[key] = int(self.values.get(key, 0)) + amount
+        self._touch(key)
+        return self.values[key]
+
+    async def incr(self, key):
+        return await self.incrby(key, 1)
+
+    async def decr(self, key):
+        return await self.incrby(key, -1)
+
+    async def get(self, key):
+        value = self.values.get(key)
+        await self._hook("get")
+        return None if value is None else str(value)
+
+    async def zadd(self, key, mapping, xx=False):
+        target = self.zsets.setdefault(key, {})
+        if xx:
+            mapping = {member: score for member, score in mapping.items() if member in target}
+        added = len(set(mapping) - set(target))
+        target.update({member: float(score) for member, score in mapping.items()})
+        if mapping:
+            self._touch(key)
+        return added
+
+    async def zrem(self, key, *members):
+        target = self.zsets.get(key, {})
+        removed = sum(1 for member in members if target.pop(member, None) is not None)
+        if removed:
+            self._touch(key)
+        return removed
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, ()))
+
+    def _sorted(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    async def zrange(self, key, start, end):
+        items = self._sorted(key)
+        return [member for member, _ in items[start:None if end == -1 else end + 1]]
+
+    async def zrangebyscore(self, key, low, high):
+        members = [member for member, score in self._sorted(key) if float(low) <= score <= float(high)]
+        await self._hook("zrangebyscore")
+        return members
+
+
+class _Pipeline:
+    """
+    パイプライン。WATCH の後 multi() を呼ぶまではコマンドをすぐに実行し、それ以外はコマンドを積みます。
+    """
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+        self.watched = None
+        self.immediate = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.calls = []
+        self.watched = None
+        self.immediate = False
+
+    async def watch(self, *keys):
+        self.watched = {key: self.client.versions.get(key, 0) for key in keys}
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if self.immediate:
+            return method
+
+        def queue(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+        return queue
+
+    async def execute(self):
+        watched, self.watched = self.watched, None
+        calls, self.calls = self.calls, []
+        if watched and any(self.client.versions.get(key, 0) != version for key, version in watched.items()):
+            raise WatchError()
+        return [await method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+class _SharedBackendContract:
+    """
+    共有バックエンドの2つのワーカー（同じ保存先を使う2つのインスタンス）で確認する共通の振る舞い。
+    """
+    def make_workers(self, max_pages=None, lease_timeout=60.0):
+        raise NotImplementedError
+
+    def run_scenario(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_add_dedupes_across_workers(self):
+        async def scenario():
+            a, b = await self.make_workers()
+            self.assertEqual(await a.add(URLS[:3]), URLS[:3])
+            self.assertEqual(await b.add(URLS[1:]), URLS[3:])
+            return [await a.lease(), await b.lease(), await a.lease()]
+
+        self.assertEqual(self.run_scenario(scenario()), URLS[:3])
+
+    def test_max_pages_is_shared(self):
+        async def scenario():
+            a, b = await self.make_workers(max_pages=3)
+            await a.add(URLS)
+            leased = [await a.lease(), await b.lease(), await a.lease()]
+            self.assertIsNone(await b.lease())
+            # 制限で戻したURLは枠を消費済みなので、上限に達した後も借りられる
+            await a.requeue(leased[0])
+            self.assertEqual(await b.lease(), leased[0])
+            await b.complete(leased[0])
+            await b.complete(leased[1])
+            await a.complete(leased[2])
+            # 残りのURLは上限により取得しないため、これ以上の処理はない
+            self.assertTrue(await a.finished())
+            self.assertTrue(await b.finished())
+            return leased
+
+        self.assertEqual(self.run_scenario(scenario()), URLS[:3])
+
+    def test_expired_lease_moves_to_another_worker(self):
+        async def scenario():
+            a, b = await self.make_workers(max_pages=2, lease_timeout=0.05)
+            await a.add(URLS[:2])
+            first = await a.lease()
+            self.assertFalse(await b.finished())
+            await asyncio.sleep(0.1)
+            # a が完了を報告しないまま期限が切れたため、同じURLが b に貸し出される（上限の枠は二重に数えない）
+            self.assertEqual(await b.lease(), first)
+            self.assertEqual(await b.lease(), URLS[1])
+            await b.complete(first)
+            await b.complete(URLS[1])
+            self.assertTrue(await a.finished())
+            return first
+
+        self.assertEqual(self.run_scenario(scenario()), URLS[0])
+
+    def test_renewed_lease_is_not_handed_out(self):
+        async def scenario():
+            a, b = await self.make_workers(lease_timeout=0.1)
+            await a.add(URLS[:1])
+            first = await a.lease()
+            for _ in range(3):
+                await asyncio.sleep(0.05)
+                await a.renew([first])
+            # 期限を延ばし続けている間は、他のワーカーに回されない
+            self.assertIsNone(await b.lease())
+            await a.complete(first)
+            # 完了したURLの期限は延ばさない
+            await a.renew([first])
+            self.assertTrue(await b.finished())
+
+        self.run_scenario(scenario())
+
+
+class TestSqliteFrontierBackend(_SharedBackendContract, unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "frontier.db")
+        self.opened = []
+
+    def tearDown(self):
+        for backend in self.opened:
+            asyncio.run(backend.close())
+        self.tmpdir.cleanup()
+
+    async def make_workers(self, max_pages=None, lease_timeout=60.0):
+        workers = []
+        for name in ("a", "b"):
+            backend = SqliteFrontierBackend(self.path, max_pages=max_pages, lease_timeout=lease_timeout, worker_id=name)
+            await backend.open()
+            workers.append(backend)
+        self.opened.extend(workers)
+        return workers
+
+    def test_priority_and_path_order(self):
+        async def scenario():
+            backend = SqliteFrontierBackend(self.path, order="path")
+            await backend.open()
+            self.opened.append(backend)
+            await backend.add(["https://example.com/docs/b", "https://example.com/docs/a"])
+            await backend.add(["https://example.com/docs/z"], priority=float("-inf"))
+            return [await backend.lease() for _ in range(3)], await backend.stats()
+
+        leased, stats = self.run_scenario(scenario())
+        self.assertEqual(leased, ["https://example.com/docs/z", "https://example.com/docs/a", "https://example.com/docs/b"])
+        self.assertEqual(stats, {"queued": 0, "leased": 3, "done": 0, "claimed": 3})
+
+    def test_retry_wait_keeps_lease(self):
+        async def scenario():
+            backend = SqliteFrontierBackend(self.path, lease_timeout=0.1, worker_id="a")
+            other = SqliteFrontierBackend(self.path, lease_timeout=0.1, worker_id="b")
+            await other.open()
+            self.opened.append(other)
+            crawler = DocsCrawler(URLS[0], os.path.join(self.tmpdir.name, "docs.md"), max_pages=5,
+                                  extraction_workers=0, rate_limit=0, use_sitemaps=False, respect_robots=False,
+                                  print_summary=False, frontier_backend=backend)
+            await backend.open()
+            await backend.add([URLS[0]])
+            calls = []
+
+            async def crawl_page(url, retry=False, reserved=False):
+                calls.append(retry)
+                if not retry:
+                    # 貸し出しの期限より長く再試行を待つ
+                    crawler._schedule_retry(url, 0.4, reason="transient")
+                else:
+                    await backend.complete(url)
+
+            async def steal():
+                await asyncio.sleep(0.3)
+                return await other.lease()
+
+            crawler.crawl_page = crawl_page
+            stolen, _ = await asyncio.gather(steal(), crawler.process_queue())
+            await backend.close()
+            crawler.journal.close()
+            return stolen, calls
+
+        stolen, calls = self.run_scenario(scenario())
+        # 再試行を待っている間も期限が延ばされるため、他のワーカーには回されない
+        self.assertIsNone(stolen)
+        self.assertEqual(calls, [False, True])
+
+
+class TestRedisFrontierBackend(_SharedBackendContract, unittest.TestCase):
+    async def make_workers(self, max_pages=None, lease_timeout=60.0):
+        client = _RedisStandIn()
+        return [RedisFrontierBackend(client, namespace="test", max_pages=max_pages, lease_timeout=lease_timeout,
+                                     worker_id=name) for name in ("a", "b")]
+
+    def test_renew_during_recovery_keeps_lease(self):
+        async def scenario():
+            client = _RedisStandIn()
+            a, b = [RedisFrontierBackend(client, namespace="test", lease_timeout=0.05, worker_id=name)
+                    for name in ("a", "b")]
+            await a.add(URLS[:1])
+            first = await a.lease()
+            await asyncio.sleep(0.1)
+
+            async def renew():
+                await a.renew([first])
+
+            # b が期限切れの貸し出しを見つけた直後、回収する前に a が期限を延ばす
+            client.hooks["zrangebyscore"] = renew
+            self.assertIsNone(await b.lease())
+            self.assertEqual(await b.stats(), {"queued": 0, "leased": 1, "retry": 0, "discovered": 1, "claimed": 0})
+
+        asyncio.run(scenario())
+
+    def test_stale_holder_does_not_touch_new_lease(self):
+        async def scenario():
+            a, b = await self.make_workers(lease_timeout=0.05)
+            await a.add(URLS[:1])
+            first = await a.lease()
+            await asyncio.sleep(0.1)
+            self.assertEqual(await b.lease(), first)
+            # 期限が切れた後の a の報告は、b の貸し出しを消したり retry に戻したりしない
+            await a.renew([first])
+            await a.complete(first)
+            await a.requeue(first)
+            self.assertFalse(await b.finished())
+            self.assertEqual((await b.stats())["leased"], 1)
+            self.assertEqual((await b.stats())["retry"], 0)
+            await b.complete(first)
+            self.assertTrue(await b.finished())
+
+        asyncio.run(scenario())
+
+    def test_claims_are_checked_with_the_pop(self):
+        async def scenario():
+            client = _RedisStandIn()
+            a, b = [RedisFrontierBackend(client, namespace="test", max_pages=2, worker_id=name)
+                    for name in ("a", "b")]
+            await a.add(URLS[:3])
+            taken = []
+
+            async def other_worker():
+                taken.append(await b.lease())
+                # 途中の状態で枠を使い切ったように見えていないこと
+                self.assertFalse(await b.finished())
+
+            # a が枠を確かめた直後に b が割り込んでも、a はやり直して残りの枠を使う
+            client.hooks["get"] = other_worker
+            taken.append(await a.lease())
+            self.assertIsNone(await a.lease())
+            return taken, await a.stats()
+
+        taken, stats = asyncio.run(scenario())
+        self.assertEqual(sorted(taken), URLS[:2])
+        self.assertEqual(stats["claimed"], 2)
+        self.assertEqual(stats["queued"], 1)
+
+    def test_create_rejects_unsupported(self):
+        with self.assertRaises(ValueError):
+            create_frontier_backend("redis://localhost:6379/0", order="path")
+        with self.assertRaises(ValueError):
+            create_frontier_backend("postgres://localhost/frontier")
+        self.assertIsNone(create_frontier_backend("memory"))
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/docs/":
+            links = "".join(f'<a href="/docs/p{n}">P{n}</a>' for n in range(10))
+            html = f"<html><body><main><h1>Top</h1>{links}</main></body></html>"
+        elif self.path.startswith("/docs/p"):
+            # 並列に処理されるよう、少し時間のかかるページにする
+            time.sleep(0.02)
+            html = f"<html><body><main><h1>Page {self.path[7:]}</h1></main></body></html>"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDistributedCrawl(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_workers_share_frontier_and_page_limit(self):
+        start_url = f"http://127.0.0.1:{self.server.server_port}/docs/"
+        frontier_path = os.path.join(self.tmpdir.name, "frontier.db")
+        outputs = [os.path.join(self.tmpdir.name, f"docs.{name}.md") for name in ("a", "b")]
+        crawlers = [
+            DocsCrawler(start_url, output, max_concurrent=2, max_pages=8, fetch_mode="http",
+                        extraction_workers=0, rate_limit=0, use_sitemaps=False, respect_robots=False,
+                        print_summary=False,
+                        frontier_backend=SqliteFrontierBackend(frontier_path, max_pages=8, worker_id=name))
+            for output, name in zip(outputs, ("a", "b"))
+        ]
+
+        async def scenario():
+            await asyncio.gather(*(crawler.run() for crawler in crawlers))
+
+        asyncio.run(scenario())
+
+        # 2つのワーカーで合わせて上限ちょうどのページを、重複なく取得する
+        crawled = [crawler.frontier_stats for crawler in crawlers]
+        self.assertEqual(crawled[0]["claimed"], 8)
+        self.assertEqual(crawled[0]["done"], 8)
+        pages = sum(len(crawler.url_manager.visited) for crawler in crawlers)
+        self.assertEqual(pages, 8)
+
+        merged = os.path.join(self.tmpdir.name, "docs.md")
+        self.assertEqual(merge_outputs(outputs, merged), 8)
+        with open(merged, encoding="utf-8") as f:
+            content = f.read()
+        # パス階層順にまとめられ、開始ページが先頭に来る
+        self.assertTrue(content.startswith(f"Source URL: {start_url}\n\n# Top"))
+        self.assertEqual(content.count("Source URL: "), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.crawler import DocsCrawler
+from src.journal import CrawlJournal
+
+
+class TestCrawlJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "out.md.journal")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_batched_flush(self):
+        journal = CrawlJournal(self.path, batch_size=3, flush_interval=3600)
+        journal.open(fresh=True)
+        journal.record_discovered("https://example.com/docs/a")
+        journal.record_discovered("https://example.com/docs/b")
+
+        # バッチサイズに達するまではディスクに書き込まれない
+        count = journal.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        self.assertEqual(count, 0)
+
+        journal.record_in_flight("https://example.com/docs/a")
+        count = journal.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        self.assertEqual(count, 2)
+        journal.close()
+
+    def test_record_discovered_many(self):
+        journal = CrawlJournal(self.path, batch_size=3, flush_interval=3600)
+        journal.open(fresh=True)
+        journal.record_discovered_many([f"https://example.com/docs/{name}" for name in "ab"])
+        count = journal.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        self.assertEqual(count, 0)
+
+        # まとめて記録した件数でバッチサイズに達すれば一度に書き込まれる
+        journal.record_discovered_many([f"https://example.com/docs/{name}" for name in "cd"])
+        count = journal.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        self.assertEqual(count, 4)
+        journal.close()
+
+    def test_load_resume_state(self):
+        journal = CrawlJournal(self.path)
+        journal.open(fresh=True)
+        journal.set_meta("start_url", "https://example.com/docs/")
+        for name in ("a", "b", "c", "d"):
+            journal.record_discovered(f"https://example.com/docs/{name}")
+        journal.record_in_flight("https://example.com/docs/a")
+        journal.record_in_flight("https://example.com/docs/c")
+        journal.record_completed("https://example.com/docs/a", 0, 10)
+        # 完了済みのURLは未完了の状態に戻らない
+        journal.record_discovered("https://example.com/docs/a")
+        journal.close()
+
+        reopened = CrawlJournal(self.path)
+        reopened.open()
+        state = reopened.load()
+        reopened.close()
+
+        self.assertEqual(state.start_url, "https://example.com/docs/")
+        self.assertEqual(state.completed, {"https://example.com/docs/a": (0, 10)})
+        self.assertEqual(state.output_end, 10)
+        # 処理中だったURLが先頭、その後は発見順
+        self.assertEqual(state.pending, [
+            "https://example.com/docs/c",
+            "https://example.com/docs/b",
+            "https://example.com/docs/d",
+        ])
+
+    def test_resume_position_across_shards(self):
+        journal = CrawlJournal(self.path)
+        journal.open(fresh=True)
+        journal.record_completed("https://example.com/docs/a", 0, 100, shard=0)
+        journal.record_completed("https://example.com/docs/b", 100, 50, shard=0)
+        journal.record_completed("https://example.com/docs/c", 0, 30, shard=1)
+        journal.close()
+
+        reopened = CrawlJournal(self.path)
+        reopened.open()
+        state = reopened.load()
+        reopened.close()
+        self.assertEqual((state.output_shard, state.output_end), (1, 30))
+
+    def test_migrates_journal_without_shard_column(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE urls (url TEXT PRIMARY KEY, state TEXT NOT NULL, seq INTEGER NOT NULL, "
+                     "offset INTEGER, length INTEGER)")
+        conn.execute("INSERT INTO urls VALUES ('https://example.com/docs/a', 'completed', 1, 0, 10)")
+        conn.commit()
+        conn.close()
+
+        journal = CrawlJournal(self.path)
+        journal.open()
+        state = journal.load()
+        journal.close()
+        self.assertEqual((state.output_shard, state.output_end), (0, 10))
+
+    def test_crawler_restores_frontier(self):
+        output_file = os.path.join(self.tmpdir.name, "out.md")
+        journal = CrawlJournal(f"{output_file}.journal")
+        journal.open(fresh=True)
+        journal.set_meta("start_url", "https://example.com/docs/")
+        journal.record_completed("https://example.com/docs/", 0, 6)
+        journal.record_discovered("https://example.com/docs/next")
+        journal.close()
+        # ジャーナルに記録されていない途中までの書き込みを含む出力ファイル
+        with open(output_file, "wb") as f:
+            f.write(b"page1\npartial")
+
+        crawler = DocsCrawler("https://example.com/docs/", output_file, extraction_workers=0, resume=True)
+        asyncio.run(crawler._prepare_output())
+        crawler.journal.close()
+
+        self.assertIn("https://example.com/docs/", crawler.url_manager.visited)
+        self.assertEqual(crawler.frontier.pop(), "https://example.com/docs/next")
+        self.assertTrue(crawler.frontier.empty())
+        with open(output_file, "rb") as f:
+            self.assertEqual(f.read(), b"page1\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
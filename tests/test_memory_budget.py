@@ -0,0 +1,121 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.crawler import DocsCrawler
+from src.fetcher import HybridFetcher
+from src.memory_budget import TRUNCATION_MARKER, MemoryBudget, peak_rss, truncate_html
+
+# 1ページのHTMLの上限を超える、生成されたAPIリファレンスのようなページ
+HUGE_PAGE = ("<html><body><main><h1>API Reference</h1>"
+             + "".join(f"<h2>method_{n}</h2><p>{'説明文です。' * 20}</p>" for n in range(2000))
+             + "</main></body></html>")
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/docs/":
+            links = "".join(f'<a href="/docs/p{n}">P{n}</a>' for n in range(6))
+            html = f'<html><body><main><h1>Top</h1>{links}<a href="/docs/api">API</a></main></body></html>'
+        elif self.path == "/docs/api":
+            html = HUGE_PAGE
+        elif self.path.startswith("/docs/p"):
+            html = f"<html><body><main><h1>Page {self.path[7:]}</h1><p>{'本文' * 500}</p></main></body></html>"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTruncateHtml(unittest.TestCase):
+    def test_cuts_before_tag_and_adds_marker(self):
+        html = "<main><p>first</p><p>second</p></main>"
+        truncated = truncate_html(html, 20)
+        self.assertEqual(truncated, f"<main><p>first</p><p>{TRUNCATION_MARKER}</p>")
+        self.assertEqual(truncate_html(html, len(html)), html)
+
+    def test_peak_rss(self):
+        # Linux / macOS では取得できる
+        if os.name == "posix":
+            self.assertGreater(peak_rss(), 0)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_admission_waits_until_bytes_are_released(self):
+        async def scenario():
+            budget = MemoryBudget(limit_bytes=100)
+            await budget.admit("a")
+            budget.charge("a", 150)
+            waiting = asyncio.create_task(budget.admit("b"))
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            await budget.release("a")
+            await asyncio.wait_for(waiting, 1)
+            # 処理中のページがなければ、上限を超える大きさでも受け入れる
+            budget.charge("b", 500)
+            return budget
+
+        budget = asyncio.run(scenario())
+        self.assertEqual((budget.in_flight_bytes, budget.peak_in_flight_bytes, budget.waits), (500, 500, 1))
+        self.assertEqual(budget.charges, {"b": 500})
+
+
+class TestPageSizeCap(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_fetcher_stops_reading_at_cap(self):
+        async def fetch():
+            fetcher = HybridFetcher("/docs/", mode="http", max_page_bytes=20_000)
+            try:
+                return await fetcher.fetch_static(f"{self.base}/docs/api"), await fetcher.fetch_static(f"{self.base}/docs/p1")
+            finally:
+                await fetcher.close()
+
+        huge, small = asyncio.run(fetch())
+        self.assertTrue(huge.truncated)
+        self.assertLess(len(huge.html.encode("utf-8")), 20_000 + len(TRUNCATION_MARKER.encode("utf-8")) + 10)
+        self.assertTrue(huge.html.endswith(f"<p>{TRUNCATION_MARKER}</p>"))
+        self.assertFalse(small.truncated)
+
+    def test_crawl_with_memory_budget(self):
+        output = os.path.join(self.tmpdir.name, "docs.md")
+        crawler = DocsCrawler(f"{self.base}/docs/", output, max_concurrent=4, max_pages=20, fetch_mode="http",
+                              extraction_workers=0, rate_limit=0, use_sitemaps=False, respect_robots=False,
+                              print_summary=False, memory_budget_bytes=4_000, max_page_bytes=20_000)
+        asyncio.run(crawler.run())
+
+        with open(output, encoding="utf-8") as f:
+            content = f.read()
+        self.assertEqual(content.count("Source URL: "), 8)
+        # 上限を超えたページは、目印の位置までの本文だけが出力される
+        self.assertIn(TRUNCATION_MARKER, content)
+        self.assertNotIn("method_1999", content)
+        self.assertEqual(crawler.truncated_pages, [f"{self.base}/docs/api"])
+        self.assertEqual(crawler.metrics.counter_value("pages_truncated_total", source="http"), 1)
+        # 全ページの処理が終わると、処理中のHTMLは残らない
+        self.assertEqual((crawler.memory_budget.charges, crawler.memory_budget.in_flight_bytes), ({}, 0))
+        self.assertGreater(crawler.memory_budget.peak_in_flight_bytes, 10_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
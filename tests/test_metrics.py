@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+import httpx
+from benchmarks.synthetic_site import SyntheticSite, serve_site
+from src.crawler import DocsCrawler
+from src.metrics import CrawlMetrics, Histogram, MetricsServer
+
+
+class TestHistogram(unittest.TestCase):
+    def test_quantiles_and_buckets(self):
+        hist = Histogram(buckets=(0.1, 1.0))
+        for i in range(1, 101):
+            hist.observe(i / 100)
+        self.assertEqual(hist.count, 100)
+        self.assertEqual(hist.bucket_counts, [10, 90])
+        self.assertAlmostEqual(hist.quantile(0.5), 0.5)
+        self.assertAlmostEqual(hist.quantile(0.95), 0.95)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_reservoir_is_bounded(self):
+        hist = Histogram(sample_size=10)
+        for i in range(1000):
+            hist.observe(i)
+        self.assertEqual(len(hist.samples), 10)
+        self.assertEqual(hist.count, 1000)
+
+
+class TestCrawlMetrics(unittest.TestCase):
+    def test_page_spans(self):
+        metrics = CrawlMetrics(slowest_pages=1)
+        with metrics.page("https://example.com/a") as spans:
+            metrics.observe("navigate", 0.2)
+            metrics.observe("navigate", 0.1)
+            metrics.observe("write", 0.05)
+        self.assertAlmostEqual(spans["navigate"], 0.3)
+        self.assertEqual(metrics.stages["page"].count, 1)
+        self.assertEqual(metrics.slowest[0]["url"], "https://example.com/a")
+
+        # ページの外で記録したステージは、どのページにも加算されない
+        metrics.observe("extract", 1.0)
+        self.assertNotIn("extract", metrics.slowest[0]["stages_ms"])
+
+    def test_prometheus_rendering(self):
+        metrics = CrawlMetrics()
+        metrics.inc("errors_total", stage="crawl", type="ValueError")
+        metrics.inc("bytes_out_total", 42)
+        metrics.register_gauge("queue_depth", lambda: 3)
+        metrics.register_gauge("broken", lambda: 1 / 0)
+        metrics.observe("write", 0.002)
+
+        text = metrics.render_prometheus()
+        self.assertIn('docs2notebook_errors_total{stage="crawl",type="ValueError"} 1', text)
+        self.assertIn("docs2notebook_bytes_out_total 42", text)
+        self.assertIn("docs2notebook_queue_depth 3", text)
+        self.assertNotIn("broken", text)
+        self.assertIn('docs2notebook_stage_seconds_bucket{stage="write",le="0.005"} 1', text)
+        self.assertIn('docs2notebook_stage_seconds_count{stage="write"} 1', text)
+
+    def test_server(self):
+        metrics = CrawlMetrics()
+        metrics.inc("pages_total", result="ok")
+
+        async def scenario():
+            server = MetricsServer(metrics, port=0)
+            await server.start()
+            try:
+                async with httpx.AsyncClient() as client:
+                    base = f"http://127.0.0.1:{server.port}"
+                    return [await client.get(base + path) for path in ("/metrics", "/metrics.json", "/")]
+            finally:
+                await server.close()
+
+        text, report, missing = asyncio.run(scenario())
+        self.assertIn('docs2notebook_pages_total{result="ok"} 1', text.text)
+        self.assertEqual(report.json()["counters"]["pages_total"], {'{result="ok"}': 1})
+        self.assertEqual(missing.status_code, 404)
+
+
+class TestCrawlerReport(unittest.TestCase):
+    def test_report_written_next_to_output(self):
+        with tempfile.TemporaryDirectory() as tmpdir, serve_site(SyntheticSite(pages=10, fan_out=2)) as start_url:
+            output_file = os.path.join(tmpdir, "out.md")
+            crawler = DocsCrawler(start_url, output_file, fetch_mode="http", extraction_workers=0,
+                                  rate_limit=0, use_sitemaps=False, max_pages=50)
+            asyncio.run(crawler.run())
+
+            with open(f"{output_file}.metrics.json", encoding="utf-8") as f:
+                report = json.load(f)
+            output_size = os.path.getsize(output_file)
+
+        self.assertEqual(report["counters"]["pages_total"], {'{result="ok"}': 11})
+        self.assertEqual(report["counters"]["bytes_out_total"]["total"], output_size)
+        for stage in ("page", "http", "submit", "extract", "write"):
+            self.assertEqual(report["stages"][stage]["count"], 11)
+        self.assertEqual(report["gauges"]["queue_depth"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from benchmarks.synthetic_site import SyntheticSite, serve_site
+from src.crawler import DocsCrawler
+from src.output_sink import ShardedOutputSink, build_table_of_contents
+
+
+def page(url, title, words=3):
+    body = " ".join(["word"] * words)
+    return f"Source URL: {url}\n\n# {title}\n\n```python\n# not a title\n```\n\n{body}\n\n---\n\n".encode("utf-8")
+
+
+class TestShardedOutputSink(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.tmpdir.name, "docs.md")
+        self.written = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _run(self, sink, pages, complete=True):
+        async def scenario():
+            await sink.start()
+            for url, data in pages:
+                sink.submit(url, data)
+                await sink.wait_for_capacity()
+            await sink.close(complete=complete)
+        asyncio.run(scenario())
+
+    def _sink(self, **kwargs):
+        sink = ShardedOutputSink(self.output_file, on_written=lambda *args: self.written.append(args), **kwargs)
+        sink.reset()
+        return sink
+
+    def _manifest(self, sink):
+        with open(sink.manifest_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_single_file(self):
+        sink = self._sink()
+        pages = [(f"u{i}", page(f"u{i}", f"T{i}")) for i in range(3)]
+        self._run(sink, pages)
+
+        with open(self.output_file, "rb") as f:
+            self.assertEqual(f.read(), b"".join(data for _, data in pages))
+        length = len(pages[0][1])
+        self.assertEqual(self.written, [(f"u{i}", 0, i * length, length) for i in range(3)])
+        self.assertEqual([e["offset"] for e in self._manifest(sink)], [0, length, 2 * length])
+
+    def test_rolls_over_without_splitting_pages(self):
+        length = len(page("u0", "T0"))
+        sink = self._sink(max_shard_bytes=length * 2 + 1, batch_bytes=1)
+        pages = [(f"u{i}", page(f"u{i}", f"T{i}")) for i in range(5)]
+        self._run(sink, pages)
+
+        self.assertEqual([os.path.basename(p) for p in sink.paths], ["docs_001.md", "docs_002.md", "docs_003.md"])
+        self.assertFalse(os.path.exists(self.output_file))
+        manifest = self._manifest(sink)
+        self.assertEqual([(e["file"], e["offset"]) for e in manifest], [
+            ("docs_001.md", 0), ("docs_001.md", length), ("docs_002.md", 0),
+            ("docs_002.md", length), ("docs_003.md", 0),
+        ])
+        for entry in manifest:
+            with open(os.path.join(self.tmpdir.name, entry["file"]), "rb") as f:
+                f.seek(entry["offset"])
+                self.assertTrue(f.read(entry["length"]).startswith(f"Source URL: {entry['url']}".encode()))
+
+    def test_word_budget_and_oversized_page(self):
+        sink = self._sink(max_shard_words=20)
+        pages = [("small", page("small", "S", words=5)), ("huge", page("huge", "H", words=100)),
+                 ("after", page("after", "A", words=5))]
+        self._run(sink, pages)
+        # 上限を超える1ページはそのページ単独のシャードになる
+        self.assertEqual([w[1] for w in self.written], [0, 1, 2])
+
+    def test_table_of_contents_covers_all_shards(self):
+        length = len(page("u0", "T0"))
+        sink = self._sink(max_shard_bytes=length, toc=True)
+        self._run(sink, [("u0", page("u0", "Alpha")), ("u1", b"Source URL: u1\n\n(empty)\n\n---\n\n")])
+
+        with open(sink.paths[-1], encoding="utf-8") as f:
+            self.assertTrue(f.read().endswith("## 目次\n\n- [Alpha](u0)\n- [u1](u1)\n"))
+        self.assertIn("- [Alpha](u0)", build_table_of_contents([sink.paths[0]]))
+
+    def test_no_toc_when_interrupted(self):
+        sink = self._sink(toc=True)
+        self._run(sink, [("u0", page("u0", "Alpha"))], complete=False)
+        with open(self.output_file, encoding="utf-8") as f:
+            self.assertNotIn("目次", f.read())
+
+    def test_restore(self):
+        length = len(page("u0", "T0"))
+        sink = self._sink(max_shard_bytes=length * 2)
+        self._run(sink, [(f"u{i}", page(f"u{i}", f"T{i}")) for i in range(5)])
+
+        # 2番目のシャードの1ページ目までしか記録されていなかったものとして巻き戻す
+        resumed = ShardedOutputSink(self.output_file, max_shard_bytes=length * 2)
+        resumed.restore(1, length)
+        self.assertEqual(os.path.getsize(resumed.shard_path(1)), length)
+        self.assertFalse(os.path.exists(resumed.shard_path(2)))
+        self.assertEqual([e["url"] for e in self._manifest(resumed)], ["u0", "u1", "u2"])
+        self.assertEqual(resumed.shard_words, len(page("u2", "T2").split()))
+
+        self._run(resumed, [("u9", page("u9", "T9"))])
+        self.assertEqual([e["url"] for e in self._manifest(resumed)], ["u0", "u1", "u2", "u9"])
+        self.assertEqual(self._manifest(resumed)[-1]["shard"], 1)
+
+    def test_backpressure(self):
+        sink = self._sink(max_pending_bytes=10, flush_interval=60)
+
+        async def scenario():
+            await sink.start()
+            sink.submit("u0", b"x" * 100)
+            await asyncio.wait_for(sink.wait_for_capacity(), 5)
+            pending = sink.pending_bytes
+            await sink.close()
+            return pending
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+
+class TestCrawlerSharding(unittest.TestCase):
+    def test_crawl_into_shards(self):
+        with tempfile.TemporaryDirectory() as tmpdir, serve_site(SyntheticSite(pages=20, fan_out=3)) as start_url:
+            output_file = os.path.join(tmpdir, "docs.md")
+            crawler = DocsCrawler(start_url, output_file, max_pages=100, fetch_mode="http", extraction_workers=0,
+                                  rate_limit=0, use_sitemaps=False, shard_max_bytes=20000)
+            asyncio.run(crawler.run())
+
+            with open(f"{output_file}.manifest.jsonl", encoding="utf-8") as f:
+                manifest = [json.loads(line) for line in f]
+            shards = sorted(name for name in os.listdir(tmpdir) if name.startswith("docs_"))
+
+        self.assertEqual(len(manifest), 21)
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(shards, sorted({entry["file"] for entry in manifest}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from benchmarks.synthetic_site import SyntheticSite, serve_site
+from src.crawler import DocsCrawler
+from src.output_writer import OrderedOutputWriter, path_order_key
+
+
+class _RecordingSink:
+    """書き込み順を記録するだけの出力先"""
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.pages = []
+
+    def submit(self, url, data):
+        self.pages.append((url, data.decode("utf-8")))
+
+
+class TestOrderedOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.sink = _RecordingSink(os.path.join(self.tmpdir.name, "out.md"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _writer(self, **kwargs):
+        return OrderedOutputWriter(self.sink, **kwargs)
+
+    def _written(self):
+        return "".join(data for _, data in self.sink.pages)
+
+    def test_discovery_order(self):
+        writer = self._writer()
+        for url in ("a", "b", "c", "d"):
+            writer.register_root(url)
+        writer.add("c", "C")
+        writer.add("b", "B")
+        # a が確定するまで何も書き出さない
+        self.assertEqual(self.sink.pages, [])
+        self.assertEqual(writer.pending_pages, 2)
+        writer.skip("a")
+        self.assertEqual(self.sink.pages, [("b", "B"), ("c", "C")])
+        writer.add("d", "D")
+        writer.close()
+
+        self.assertEqual(self._written(), "BCD")
+        self.assertEqual(writer.buffered_bytes, 0)
+
+    def test_breadth_first_order_is_independent_of_completion_order(self):
+        writer = self._writer()
+        writer.register_root("top")
+        # 子ページ b が a より先に完了し、リンクも先に記録される
+        writer.record_links("b", ["b1"])
+        writer.add("b", "b ")
+        writer.add("b1", "b1 ")
+        writer.record_links("b1", [])
+        writer.add("top", "top ")
+        self.assertEqual(self._written(), "top ")
+        writer.record_links("top", ["a", "b"])
+        writer.record_links("a", ["a1", "b1"])
+        writer.add("a", "a ")
+        writer.add("a1", "a1 ")
+        writer.record_links("a1", [])
+        writer.close()
+        self.assertEqual(self._written(), "top a b a1 b1 ")
+
+    def test_excluded_pages_are_not_waited_for(self):
+        writer = self._writer()
+        writer.exclude("done")
+        writer.register_root("top")
+        writer.record_links("top", ["done", "next"])
+        writer.add("next", "next")
+        writer.add("top", "top ")
+        self.assertEqual(self._written(), "top next")
+        writer.close()
+
+    def test_spill_to_disk(self):
+        writer = self._writer(buffer_bytes=10)
+        for url in ("a", "b", "c", "d"):
+            writer.register_root(url)
+        writer.add("d", "d" * 8)
+        writer.add("c", "c" * 8)
+        writer.add("b", "b" * 8)
+        self.assertEqual(writer.buffered_bytes, 8)
+        self.assertEqual(writer.spill_size, 16)
+        writer.add("a", "a" * 8)
+        writer.close()
+        self.assertEqual(self._written(), "a" * 8 + "b" * 8 + "c" * 8 + "d" * 8)
+
+    def test_close_skips_missing_pages(self):
+        writer = self._writer()
+        for url in ("a", "b", "c"):
+            writer.register_root(url)
+        writer.add("c", "C")
+        writer.add("b", "B")
+        writer.close()
+        self.assertEqual(self._written(), "BC")
+
+    def test_unplaced_pages_are_written_in_path_order(self):
+        writer = self._writer()
+        writer.register_root("https://x/docs/")
+        # 順序の確定しないページ（どのページからもリンクされていないもの）が、抽出の完了順とは逆に届く
+        writer.add("https://x/docs/b", "b ")
+        writer.add("https://x/docs/a/z", "a/z ")
+        writer.add("https://x/docs/a", "a ")
+        writer.add("https://x/docs/", "top ")
+        writer.close()
+        self.assertEqual(self._written(), "top a a/z b ")
+
+    def test_path_order(self):
+        urls = ["https://x/docs/b", "https://x/docs/a/z", "https://x/docs/", "https://x/docs/a", "https://x/docs/a-b"]
+        writer = self._writer(order="path")
+        for url in urls:
+            writer.add(url, url + "\n")
+        self.assertEqual(self.sink.pages, [])
+        writer.close()
+        self.assertEqual(self._written().split(), sorted(urls, key=path_order_key))
+        self.assertEqual(self._written().split(), [
+            "https://x/docs/", "https://x/docs/a", "https://x/docs/a/z", "https://x/docs/a-b", "https://x/docs/b",
+        ])
+
+
+class TestCrawlerOutputOrder(unittest.TestCase):
+    def test_output_is_deterministic(self):
+        outputs = []
+        with tempfile.TemporaryDirectory() as tmpdir, serve_site(SyntheticSite(pages=40, fan_out=4)) as start_url:
+            for run in range(2):
+                output_file = os.path.join(tmpdir, f"out{run}.md")
+                crawler = DocsCrawler(start_url, output_file, max_concurrent=8, max_pages=100, fetch_mode="http",
+                                      extraction_workers=0, rate_limit=0, use_sitemaps=False,
+                                      output_buffer_bytes=2000)
+                crawler.concurrency.limit = 8.0
+                asyncio.run(crawler.run())
+                with open(output_file, encoding="utf-8") as f:
+                    outputs.append(f.read())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0].count("Source URL: "), 41)
+        self.assertTrue(outputs[0].startswith(f"Source URL: {start_url}"))
+
+
+if __name__ == '__main__':
+    unittest.main()
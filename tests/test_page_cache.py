@@ -0,0 +1,100 @@
+import asyncio
+import tempfile
+import unittest
+from src.page_cache import PageCache, content_hash
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _store(self, cache, url, html, markdown, **kwargs):
+        async def store():
+            await cache.store_page(url, html, content_hash(html), **kwargs)
+            await cache.store_markdown(url, markdown)
+        asyncio.run(store())
+
+    def test_entry_requires_markdown(self):
+        cache = PageCache(self.cache_dir)
+        asyncio.run(cache.store_page("https://example.com/docs/a", "<p>a</p>", content_hash("<p>a</p>")))
+
+        # Markdownが保存されるまでは再利用できない
+        self.assertIsNone(cache.get("https://example.com/docs/a"))
+
+        asyncio.run(cache.store_markdown("https://example.com/docs/a", "# A"))
+        entry = cache.get("https://example.com/docs/a")
+        self.assertEqual(asyncio.run(cache.load_markdown(entry)), "# A")
+
+    def test_persists_across_instances(self):
+        cache = PageCache(self.cache_dir)
+        self._store(cache, "https://example.com/docs/a", "<p>a</p>", "# A",
+                    etag='"v1"', hrefs=["https://example.com/docs/b"])
+        cache.save()
+
+        reloaded = PageCache(self.cache_dir)
+        entry = reloaded.get("https://example.com/docs/a")
+        self.assertEqual(entry.etag, '"v1"')
+        self.assertEqual(entry.hrefs, ["https://example.com/docs/b"])
+        self.assertEqual(asyncio.run(reloaded.load_markdown(entry)), "# A")
+        self.assertEqual(reloaded.total_bytes, cache.total_bytes)
+
+    def test_extraction_key_mismatch_is_miss(self):
+        cache = PageCache(self.cache_dir, extraction_key="v1")
+        self._store(cache, "https://example.com/docs/a", "<p>a</p>", "# A")
+        cache.save()
+
+        # 抽出器やルールが変わった後は、キャッシュ済みのMarkdownを使わない
+        self.assertIsNone(PageCache(self.cache_dir, extraction_key="v2").get("https://example.com/docs/a"))
+        self.assertIsNotNone(PageCache(self.cache_dir, extraction_key="v1").get("https://example.com/docs/a"))
+
+    def test_identical_content_shares_blobs(self):
+        cache = PageCache(self.cache_dir)
+        self._store(cache, "https://example.com/docs/a", "<p>same</p>", "same")
+        size_after_first = cache.total_bytes
+        self._store(cache, "https://example.com/docs/a/", "<p>same</p>", "same")
+
+        self.assertEqual(cache.total_bytes, size_after_first)
+
+    def test_lru_eviction(self):
+        cache = PageCache(self.cache_dir, max_bytes=200)
+        for name in ("a", "b", "c"):
+            self._store(cache, f"https://example.com/docs/{name}", name * 50, name.upper() * 30)
+            # 最初のページは使い続ける
+            entry = cache.get("https://example.com/docs/a")
+            asyncio.run(cache.load_markdown(entry))
+
+        self.assertLessEqual(cache.total_bytes, 200)
+        self.assertIsNotNone(cache.get("https://example.com/docs/a"))
+        self.assertIsNone(cache.get("https://example.com/docs/b"))
+
+    def test_lru_order_survives_reload(self):
+        cache = PageCache(self.cache_dir)
+        for name in ("a", "b", "c"):
+            self._store(cache, f"https://example.com/docs/{name}", name * 50, name.upper() * 30)
+        asyncio.run(cache.load_markdown(cache.get("https://example.com/docs/a")))
+        cache.save()
+
+        # 最後に使われた時刻の古い順に並び直す
+        reloaded = PageCache(self.cache_dir)
+        self.assertEqual(list(reloaded.entries), [f"https://example.com/docs/{name}" for name in ("b", "c", "a")])
+
+    def test_concurrent_stores_share_one_write(self):
+        cache = PageCache(self.cache_dir)
+        urls = [f"https://example.com/docs/{n}" for n in range(5)]
+
+        async def scenario():
+            await asyncio.gather(*(cache.store_page(url, "<p>same</p>", content_hash("<p>same</p>")) for url in urls))
+            await asyncio.gather(*(cache.store_markdown(url, "same") for url in urls))
+            return await asyncio.gather(*(cache.load_markdown(cache.get(url)) for url in urls))
+
+        self.assertEqual(asyncio.run(scenario()), ["same"] * 5)
+        self.assertEqual(cache.blob_refs[content_hash("same")], 5)
+        self.assertEqual(cache.writing, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
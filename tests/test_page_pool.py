@@ -0,0 +1,156 @@
+import asyncio
+import unittest
+from src.page_pool import PagePool
+
+
+class FakePage:
+    def __init__(self, heap=0):
+        self.heap = heap
+        self.listeners = {}
+        self.evaluations = 0
+
+    def on(self, event, callback):
+        self.listeners[event] = callback
+
+    async def evaluate(self, script):
+        self.evaluations += 1
+        return self.heap
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage(self.browser.heap)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, heap=0):
+        self.heap = heap
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self, heap=0):
+        self.heap = heap
+        self.launched = []
+
+    async def launch(self, headless=True):
+        browser = FakeBrowser(self.heap)
+        self.launched.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    def __init__(self, heap=0):
+        self.chromium = FakeChromium(heap)
+
+
+class TestPagePool(unittest.TestCase):
+    def test_pages_are_reused(self):
+        playwright = FakePlaywright()
+        pool = PagePool(playwright, size=2)
+
+        async def scenario():
+            first = await pool.acquire()
+            await pool.release(first)
+            second = await pool.acquire()
+            await pool.release(second)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertIs(first.page, second.page)
+        self.assertEqual(pool.contexts_created, 1)
+
+    def test_size_bounds_slots(self):
+        pool = PagePool(FakePlaywright(), size=2)
+
+        async def scenario():
+            a = await pool.acquire()
+            b = await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0.01)
+            # 上限に達しているので3つ目は返却を待つ
+            self.assertFalse(waiter.done())
+            await pool.release(a)
+            c = await waiter
+            return a, b, c
+
+        a, b, c = asyncio.run(scenario())
+        self.assertIs(a, c)
+        self.assertEqual(pool.contexts_created, 2)
+
+    def test_context_recycled_after_max_pages(self):
+        pool = PagePool(FakePlaywright(), size=1, context_max_pages=2)
+
+        async def scenario():
+            slots = []
+            for _ in range(3):
+                slot = await pool.acquire()
+                slots.append(slot)
+                await pool.release(slot)
+            return slots
+
+        slots = asyncio.run(scenario())
+        self.assertIs(slots[0], slots[1])
+        self.assertIsNot(slots[1], slots[2])
+        self.assertTrue(slots[1].context.closed)
+
+    def test_context_recycled_over_memory_or_broken(self):
+        pool = PagePool(FakePlaywright(heap=600 * 1024 * 1024), size=1, memory_limit_mb=512, memory_check_interval=3)
+
+        async def scenario():
+            slots = []
+            for _ in range(3):
+                slot = await pool.acquire()
+                slots.append(slot)
+                await pool.release(slot)
+            return slots
+
+        slots = asyncio.run(scenario())
+        # ヒープ使用量は memory_check_interval ページごとにだけ確かめる
+        self.assertIs(slots[0], slots[2])
+        self.assertEqual(slots[2].page.evaluations, 1)
+        self.assertTrue(slots[2].context.closed)
+        self.assertEqual(pool.total, 0)
+
+    def test_crashed_browser_is_relaunched(self):
+        playwright = FakePlaywright()
+        pool = PagePool(playwright, size=2, browsers=2)
+
+        async def scenario():
+            a = await pool.acquire()
+            b = await pool.acquire()
+            await pool.release(a)
+            await pool.release(b)
+            # 1つ目のブラウザプロセスがクラッシュ
+            playwright.chromium.launched[0].connected = False
+            slots = [await pool.acquire(), await pool.acquire()]
+            return a, b, slots
+
+        a, b, slots = asyncio.run(scenario())
+        self.assertEqual({a.browser_index, b.browser_index}, {0, 1})
+        self.assertIn(b, slots)
+        self.assertNotIn(a, slots)
+        self.assertEqual(len(playwright.chromium.launched), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
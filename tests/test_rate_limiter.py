@@ -0,0 +1,113 @@
+import asyncio
+import time
+import unittest
+from email.utils import formatdate
+from src.rate_limiter import AdaptiveConcurrency, HostRateLimiter, TokenBucket, parse_retry_after
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_spacing_after_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        # バーストを使い切った後は 1/rate 秒ずつ間隔が空く
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=10, burst=5)
+        bucket.pause(2)
+
+        self.assertAlmostEqual(bucket.reserve(), 2.0, delta=0.05)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=0)
+        self.assertEqual(sum(bucket.reserve() for _ in range(100)), 0)
+
+
+class TestHostRateLimiter(unittest.TestCase):
+    def test_hosts_are_independent(self):
+        limiter = HostRateLimiter(rate=1, burst=1)
+
+        async def scenario():
+            started = time.monotonic()
+            await asyncio.gather(
+                limiter.acquire("https://a.example.com/x"),
+                limiter.acquire("https://b.example.com/x"),
+            )
+            return time.monotonic() - started
+
+        self.assertLess(asyncio.run(scenario()), 0.5)
+
+    def test_same_host_is_spaced(self):
+        limiter = HostRateLimiter(rate=20, burst=1)
+
+        async def scenario():
+            started = time.monotonic()
+            await asyncio.gather(*(limiter.acquire("https://example.com/p") for _ in range(4)))
+            return time.monotonic() - started
+
+        self.assertGreaterEqual(asyncio.run(scenario()), 0.15 - 0.02)
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("120"), 120.0)
+
+    def test_http_date(self):
+        value = formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(value), 30, delta=2)
+
+    def test_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def test_additive_increase(self):
+        controller = AdaptiveConcurrency(maximum=8, initial=2)
+        for _ in range(20):
+            controller.on_success(0.1)
+
+        self.assertGreater(controller.current_limit, 2)
+        self.assertLessEqual(controller.current_limit, 8)
+
+    def test_slow_responses_do_not_increase(self):
+        controller = AdaptiveConcurrency(maximum=8, initial=2)
+        controller.on_success(0.1)
+        controller.on_success(5.0)
+
+        self.assertEqual(controller.current_limit, 2)
+
+    def test_multiplicative_decrease_with_cooldown(self):
+        controller = AdaptiveConcurrency(maximum=16, initial=16, cooldown=60)
+        controller.on_throttle()
+        # クールダウン中は続けて減らさない
+        controller.on_error()
+
+        self.assertEqual(controller.current_limit, 8)
+
+    def test_acquire_respects_limit(self):
+        controller = AdaptiveConcurrency(maximum=4, initial=2)
+
+        async def scenario():
+            peak = 0
+
+            async def work():
+                nonlocal peak
+                await controller.acquire()
+                try:
+                    peak = max(peak, controller.in_flight)
+                    await asyncio.sleep(0.01)
+                finally:
+                    await controller.release()
+
+            await asyncio.gather(*(work() for _ in range(10)))
+            return peak
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+from src.readiness import RenderReadiness
+
+
+class FakePage:
+    """描画完了待ちで呼ばれるメソッドだけを持つページの代用品"""
+    def __init__(self, evaluate_result=None, selector_error=None):
+        self.evaluate_result = evaluate_result
+        self.selector_error = selector_error
+        self.calls = []
+
+    async def evaluate(self, script, arg):
+        self.calls.append(("evaluate", arg))
+        if isinstance(self.evaluate_result, Exception):
+            raise self.evaluate_result
+        return self.evaluate_result
+
+    async def wait_for_selector(self, selector, state, timeout):
+        self.calls.append(("wait_for_selector", selector, timeout))
+        if self.selector_error:
+            raise self.selector_error
+
+
+class TestRenderReadiness(unittest.TestCase):
+    def test_stability_strategy(self):
+        page = FakePage({"reason": "stable", "textLength": 1200, "elapsedMs": 320})
+        result = asyncio.run(RenderReadiness(stable_ms=200, timeout=5).wait(page))
+
+        self.assertEqual(result.reason, "stable")
+        self.assertEqual(result.text_length, 1200)
+        self.assertEqual(page.calls[0][1]["stableMs"], 200)
+        self.assertEqual(page.calls[0][1]["timeoutMs"], 5000)
+
+    def test_selector_strategy(self):
+        page = FakePage()
+        result = asyncio.run(RenderReadiness(selector="main h1", timeout=2).wait(page))
+
+        self.assertEqual(result.reason, "selector")
+        self.assertEqual(page.calls, [("wait_for_selector", "main h1", 2000)])
+
+    def test_selector_timeout_is_not_fatal(self):
+        page = FakePage(selector_error=TimeoutError("timeout"))
+        result = asyncio.run(RenderReadiness(selector="#content").wait(page))
+
+        self.assertEqual(result.reason, "timeout")
+
+    def test_destroyed_context_is_not_fatal(self):
+        page = FakePage(RuntimeError("Execution context was destroyed"))
+        result = asyncio.run(RenderReadiness().wait(page))
+
+        self.assertEqual(result.reason, "error")
+
+
+if __name__ == '__main__':
+    unittest.main()
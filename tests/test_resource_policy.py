@@ -0,0 +1,38 @@
+import unittest
+from src.resource_policy import ResourcePolicy
+
+
+class TestResourcePolicy(unittest.TestCase):
+    def test_default_allows_only_rendering_resources(self):
+        policy = ResourcePolicy()
+
+        for resource_type in ("document", "script", "xhr", "fetch", "stylesheet"):
+            self.assertFalse(policy.should_block(resource_type, "https://example.com/docs/a"))
+        for resource_type in ("image", "font", "media"):
+            self.assertTrue(policy.should_block(resource_type, "https://example.com/static/x"))
+
+    def test_default_denies_trackers(self):
+        policy = ResourcePolicy()
+
+        # サブドメインも含めて遮断する
+        self.assertTrue(policy.should_block("script", "https://www.googletagmanager.com/gtm.js"))
+        self.assertTrue(policy.should_block("xhr", "https://api.segment.io/v1/t"))
+        self.assertFalse(policy.should_block("script", "https://notsegment.io/app.js"))
+
+    def test_allow_domains(self):
+        policy = ResourcePolicy(allow_domains=["example.com"])
+
+        self.assertFalse(policy.should_block("script", "https://cdn.example.com/app.js"))
+        self.assertTrue(policy.should_block("script", "https://cdn.other.com/app.js"))
+        # data: URL はドメイン制限の対象外
+        self.assertFalse(policy.should_block("stylesheet", "data:text/css,body{}"))
+
+    def test_unrestricted_policy(self):
+        policy = ResourcePolicy(allowed_types=None, deny_domains=())
+
+        self.assertTrue(policy.blocks_nothing)
+        self.assertFalse(policy.should_block("image", "https://example.com/a.png"))
+
+
+if __name__ == '__main__':
+    unittest.main()
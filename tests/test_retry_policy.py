@@ -0,0 +1,201 @@
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.crawler import DocsCrawler
+from src.retry_policy import PROBE_WAIT, CircuitBreaker, CircuitOpenError, HostTimeouts, RetryPolicy, RetryQueue
+
+URL = "https://example.com/docs/page"
+
+
+class _FlakySiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        hits = self.server.hits
+        hits[self.path] += 1
+        if self.path == "/docs/":
+            links = "".join(f'<a href="/docs/{name}">{name}</a>' for name in ("ok", "flaky", "slow", "broken"))
+            html = f"<html><body><main><h1>Top</h1>{links}</main></body></html>"
+        elif self.path == "/docs/broken" or (self.path == "/docs/flaky" and hits[self.path] <= 2):
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        elif self.path in ("/docs/ok", "/docs/flaky", "/docs/slow"):
+            if self.path == "/docs/slow" and hits[self.path] == 1:
+                # 最初の1回だけタイムアウトより長くかかる
+                time.sleep(1.0)
+            html = f"<html><body><main><h1>Page {self.path[6:]}</h1></main></body></html>"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_exponential_backoff_with_jitter(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=10.0, jitter=0.5)
+        rng = random.Random(0)
+        for failures, (low, high) in {1: (0.5, 1.0), 2: (1.0, 2.0), 3: (2.0, 4.0), 10: (5.0, 10.0)}.items():
+            delay = policy.delay(failures, rng)
+            self.assertTrue(low <= delay <= high, (failures, delay))
+        self.assertTrue(policy.should_retry(2))
+        self.assertFalse(policy.should_retry(3))
+
+    def test_retry_queue_orders_by_due_time(self):
+        queue = RetryQueue()
+        queue.push("late", 60)
+        queue.push("now", 0)
+        self.assertEqual(queue.pop_due(), "now")
+        self.assertIsNone(queue.pop_due())
+        self.assertEqual(len(queue), 1)
+        self.assertGreater(queue.next_due_in(), 50)
+
+
+class TestHostTimeouts(unittest.TestCase):
+    def test_timeout_follows_p95(self):
+        timeouts = HostTimeouts(initial=30.0, minimum=5.0, maximum=120.0, multiplier=3.0)
+        self.assertEqual(timeouts.timeout_for(URL), 30.0)
+        for _ in range(10):
+            timeouts.observe(URL, 0.2)
+        # 速いホストでも minimum より短くはしない
+        self.assertEqual(timeouts.timeout_for(URL), 5.0)
+        for _ in range(90):
+            timeouts.observe(URL, 4.0)
+        self.assertEqual(timeouts.timeout_for(URL), 12.0)
+        # 再試行では2倍ずつ延ばす（最大 maximum）
+        self.assertEqual(timeouts.timeout_for(URL, attempt=2), 24.0)
+        self.assertEqual(timeouts.timeout_for(URL, attempt=5), 120.0)
+        # 他のホストには影響しない
+        self.assertEqual(timeouts.timeout_for("https://example.org/"), 30.0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_probes_and_closes(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.check(URL)
+        breaker.record_failure(URL)
+        breaker.check(URL)
+        breaker.record_failure(URL)
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.check(URL)
+        self.assertGreater(raised.exception.retry_after, 0)
+        self.assertEqual(breaker.open_hosts(), ["example.com"])
+
+        time.sleep(0.06)
+        # 止めている時間が過ぎると1ページだけ通し、その結果が出るまで他のページは待たせる
+        breaker.check(URL)
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.check(URL)
+        self.assertEqual(raised.exception.retry_after, PROBE_WAIT)
+
+        # 確認に失敗すると、前回の2倍の時間止める
+        breaker.record_failure(URL)
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.check(URL)
+        self.assertGreater(raised.exception.retry_after, 0.06)
+
+        time.sleep(0.11)
+        breaker.check(URL)
+        breaker.record_success(URL)
+        breaker.check(URL)
+        self.assertEqual(breaker.open_hosts(), [])
+
+    def test_gives_up_after_failed_probes(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0.01, max_probes=1)
+        breaker.record_failure(URL)
+        time.sleep(0.02)
+        breaker.check(URL)
+        breaker.record_failure(URL)
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.check(URL)
+        self.assertTrue(raised.exception.gave_up)
+
+
+class TestCrawlerRetries(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakySiteHandler)
+        self.server.hits = Counter()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_transient_failures_are_retried(self):
+        output = os.path.join(self.tmpdir.name, "docs.md")
+        crawler = DocsCrawler(f"{self.base}/docs/", output, max_concurrent=4, max_pages=20, fetch_mode="http",
+                              extraction_workers=0, rate_limit=0, use_sitemaps=False, respect_robots=False,
+                              print_summary=False, page_timeout=0.3, breaker_threshold=0,
+                              retry_policy=RetryPolicy(max_attempts=3, base_delay=0.05))
+        asyncio.run(crawler.run())
+
+        with open(output, encoding="utf-8") as f:
+            content = f.read()
+        # 2回失敗したページと、1回タイムアウトしたページも再試行で取得できる
+        for title in ("Top", "Page ok", "Page flaky", "Page slow"):
+            self.assertIn(f"# {title}\n", content)
+        self.assertEqual(self.server.hits["/docs/flaky"], 3)
+        self.assertEqual(self.server.hits["/docs/slow"], 2)
+
+        # 上限まで失敗し続けたページは、理由とともに失敗として残る
+        self.assertEqual(self.server.hits["/docs/broken"], 3)
+        self.assertEqual(crawler.failed_pages, {f"{self.base}/docs/broken": "TransientError: HTTP 500 (3 回試行)"})
+        self.assertEqual(crawler.metrics.counter_value("retries_total", reason="transient"), 4)
+        self.assertEqual(crawler.metrics.counter_value("retries_total", reason="timeout"), 1)
+        self.assertEqual((len(crawler.retry_queue), crawler.failures), (0, {}))
+
+
+class TestBreakerDispatch(unittest.TestCase):
+    def test_open_circuit_holds_back_dispatch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            crawler = DocsCrawler(URL, os.path.join(tmpdir, "docs.md"), max_concurrent=4, max_pages=200,
+                                  extraction_workers=0, rate_limit=0, use_sitemaps=False, respect_robots=False,
+                                  print_summary=False, breaker_threshold=3, breaker_cooldown=0.02,
+                                  retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01))
+            crawler.breaker.max_cooldown = 0.05
+            crawler.frontier.push_many([f"{URL}/{n}" for n in range(200)])
+            fetched = []
+
+            async def fetch_page(url):
+                fetched.append(url)
+                await asyncio.sleep(0.005)
+                raise asyncio.TimeoutError()
+
+            crawler._fetch_page = fetch_page
+
+            async def scenario():
+                await asyncio.wait_for(crawler.process_queue(), 10)
+            asyncio.run(scenario())
+            crawler.journal.close()
+
+        # 止めている間はURLを取り出さないため、ページ数の枠は実際に取得を試みた分だけになる
+        self.assertEqual(len(crawler.url_manager.visited), len(set(fetched)))
+        self.assertLess(len(fetched), 20)
+        # 諦めた後に取り出したURLも、取得できなかったページとしてサマリーに載り、出力の順番待ちを止めない
+        self.assertEqual(set(crawler.failed_pages), {f"{URL}/{n}" for n in range(200)})
+        self.assertEqual(len(crawler.output.recorded), 200)
+        self.assertEqual(crawler.metrics.counter_value("pages_total", result="circuit_open"), 0)
+        self.assertEqual(crawler.metrics.counter_value("retries_total", reason="circuit_open"), 0)
+        self.assertEqual(crawler.dispatcher.abandoned_hosts, {"example.com"})
+        self.assertEqual(len(crawler.retry_queue), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from src.crawler import DocsCrawler
+from src.sitemap import ROBOTS_AGENT, SitemapSeeder, parse_lastmod
+
+ROBOTS = """User-agent: *
+Disallow: /docs/private/
+Crawl-delay: 2
+Sitemap: {base}/sitemap_index.xml
+"""
+
+SITEMAP_INDEX = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>{base}/sitemap-a.xml</loc></sitemap>
+  <sitemap><loc>{base}/sitemap-b.xml.gz</loc></sitemap>
+</sitemapindex>
+"""
+
+SITEMAP_A = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>{base}/docs/old</loc><lastmod>2020-01-01</lastmod></url>
+  <url><loc>{base}/docs/new</loc><lastmod>2024-06-01T12:00:00+00:00</lastmod></url>
+  <url><loc>{base}/docs/private/secret</loc></url>
+</urlset>
+"""
+
+SITEMAP_B = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>{base}/docs/orphan</loc></url>
+  <url><loc>{base}/blog/post</loc></url>
+</urlset>
+"""
+
+PAGES = {
+    "/docs/": "<html><body><main><h1>Top</h1><a href='/docs/private/secret'>S</a></main></body></html>",
+    "/docs/old": "<html><body><main><h1>Old</h1></main></body></html>",
+    "/docs/new": "<html><body><main><h1>New</h1></main></body></html>",
+    "/docs/orphan": "<html><body><main><h1>Orphan</h1></main></body></html>",
+    "/docs/private/secret": "<html><body><main><h1>Secret</h1></main></body></html>",
+}
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        content_type = "application/xml"
+        if self.path == "/robots.txt" and self.server.robots_status is not None:
+            self.send_response(self.server.robots_status)
+            self.end_headers()
+            return
+        if self.path == "/robots.txt":
+            data = ROBOTS.format(base=base).encode("utf-8")
+            content_type = "text/plain"
+        elif self.path == "/sitemap_index.xml":
+            data = SITEMAP_INDEX.format(base=base).encode("utf-8")
+        elif self.path == "/sitemap-a.xml":
+            data = SITEMAP_A.format(base=base).encode("utf-8")
+        elif self.path == "/sitemap-b.xml.gz":
+            # Content-Encoding なしで gzip ファイルそのものを返す
+            data = gzip.compress(SITEMAP_B.format(base=base).encode("utf-8"))
+            content_type = "application/x-gzip"
+        elif self.path in PAGES:
+            data = PAGES[self.path].encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestParseLastmod(unittest.TestCase):
+    def test_date_only(self):
+        self.assertEqual(parse_lastmod("1970-01-02"), 86400.0)
+
+    def test_with_timezone(self):
+        self.assertEqual(parse_lastmod("1970-01-01T09:00:00+09:00"), 0.0)
+
+    def test_invalid(self):
+        self.assertIsNone(parse_lastmod("yesterday"))
+        self.assertIsNone(parse_lastmod(None))
+
+
+class TestSitemapSeeding(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+        self.server.hits = []
+        self.server.robots_status = None
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_index_and_gzip_sitemaps(self):
+        async def scenario():
+            async with httpx.AsyncClient() as client:
+                seeder = SitemapSeeder(client)
+                robots = await seeder.fetch_robots(self.base)
+                entries = []
+                for sitemap_url in robots.site_maps():
+                    entries.extend([e async for e in seeder.iter_entries(sitemap_url)])
+                return robots, entries
+
+        robots, entries = asyncio.run(scenario())
+        self.assertEqual(robots.crawl_delay("docs2notebook-crawler"), 2)
+        self.assertEqual(
+            [e.url for e in entries],
+            [self.base + p for p in ("/docs/old", "/docs/new", "/docs/private/secret",
+                                     "/docs/orphan", "/blog/post")],
+        )
+        self.assertIsNone(entries[2].lastmod)
+        self.assertGreater(entries[1].lastmod, entries[0].lastmod)
+
+    def test_robots_status_codes(self):
+        async def fetch(status):
+            self.server.robots_status = status
+            async with httpx.AsyncClient() as client:
+                robots = await SitemapSeeder(client).fetch_robots(self.base)
+            return robots.can_fetch(ROBOTS_AGENT, self.base + "/docs/")
+
+        async def scenario():
+            return {status: await fetch(status) for status in (401, 403, 404, 410, 429, 500, 503)}
+
+        # 401 / 403 と、一時的に取得できない 5xx・429 は全て禁止、その他の 4xx は全て許可
+        self.assertEqual(asyncio.run(scenario()),
+                         {401: False, 403: False, 404: True, 410: True, 429: False, 500: False, 503: False})
+
+    def test_unreachable_robots_disallows_all(self):
+        async def scenario():
+            async with httpx.AsyncClient() as client:
+                # 接続を受け付けないポート
+                robots = await SitemapSeeder(client).fetch_robots("http://127.0.0.1:1")
+            return robots.can_fetch(ROBOTS_AGENT, "http://127.0.0.1:1/docs/")
+
+        self.assertFalse(asyncio.run(scenario()))
+
+    def test_max_urls(self):
+        async def scenario():
+            async with httpx.AsyncClient() as client:
+                seeder = SitemapSeeder(client, max_urls=2)
+                return [e async for e in seeder.iter_entries(self.base + "/sitemap_index.xml")]
+
+        self.assertEqual(len(asyncio.run(scenario())), 2)
+
+    def test_crawler_seeds_frontier_and_respects_robots(self):
+        output_file = os.path.join(self.tmpdir.name, "out.md")
+        crawler = DocsCrawler(
+            self.base + "/docs/",
+            output_file,
+            fetch_mode="http",
+            extraction_workers=0,
+            rate_limit=0,
+        )
+        asyncio.run(crawler.run())
+
+        with open(output_file, encoding="utf-8") as f:
+            output = f.read()
+        # リンクされていないページもサイトマップから見つかる
+        for title in ("Top", "Old", "New", "Orphan"):
+            self.assertIn(f"# {title}", output)
+        # robots.txt で禁止されたページとベースパス外のページは取得しない
+        self.assertNotIn("/docs/private/secret", self.server.hits)
+        self.assertNotIn("/blog/post", self.server.hits)
+        # lastmod が新しいページが先に取得される
+        self.assertLess(self.server.hits.index("/docs/new"), self.server.hits.index("/docs/old"))
+        # Crawl-delay: 2 がレートの上限として適用される
+        self.assertEqual(crawler.rate_limiter.bucket(f"127.0.0.1:{self.server.server_port}").rate, 0.5)
+
+    def test_sitemaps_can_be_disabled(self):
+        output_file = os.path.join(self.tmpdir.name, "out.md")
+        crawler = DocsCrawler(
+            self.base + "/docs/",
+            output_file,
+            fetch_mode="http",
+            extraction_workers=0,
+            rate_limit=0,
+            use_sitemaps=False,
+            respect_robots=False,
+        )
+        asyncio.run(crawler.run())
+        self.assertNotIn("/robots.txt", self.server.hits)
+        self.assertIn("/docs/private/secret", self.server.hits)
+        self.assertNotIn("/docs/orphan", self.server.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()